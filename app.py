@@ -1,12 +1,22 @@
 import streamlit as st
-from mlxtend.preprocessing import TransactionEncoder
-from mlxtend.frequent_patterns import apriori, association_rules
 import pandas as pd
-from io import BytesIO
-import requests
 
-from database_manager import DatabaseManager
-import datetime
+from database_manager import DatabaseManager, COLUNAS_SEGMENTACAO
+from recommender import METODOS, WORKERS_PADRAO, sincronizar_regras
+from pricing_engine import NOMES_CHAVES, PricingEngine, obter_precos, sincronizar
+from price_simulator import obter_simulador
+from inventory import (CRITICO, EXCESSO, METODOS_PREVISAO, NIVEL_SERVICO, NORMAL, PRAZO_ENTREGA, REPOR,
+                       obter_estoque)
+from sales_data import SalesDataset
+from sales_snapshot import SalesSnapshot
+from chat_context import contexto_dados
+from chat_backend import ChatBackend
+from chat_memory import MemoriaConversa, contexto_modelo
+from chat_tools import FerramentasChat, INSTRUCOES_FERRAMENTAS
+from chat_cache import ChatCache
+from jobs import CONCLUIDO, ERRO, JobManager
+from exporter import FORMATOS, arquivo_exportado
+from instrumentation import PAINEL_DESEMPENHO, finalizar_execucao, historico, iniciar_execucao, medir
  
 # Configurar o layout como "wide"
 st.set_page_config(
@@ -19,13 +29,33 @@ if "messages" not in st.session_state:
     st.session_state.messages = []  # Inicializar como lista vazia
 if "selected_model" not in st.session_state:
     st.session_state.selected_model = ""  # Inicializar como string vazia
+if "memoria" not in st.session_state:
+    st.session_state.memoria = MemoriaConversa()  # Resumo das mensagens antigas do chat
 
-# Carregar os dados do CSV (base de dados do supermercado)
-data = pd.read_csv('supermarket_sales.csv')
+@st.cache_resource
+def get_database_manager():
+    """
+    DatabaseManager compartilhado pelo processo: os reruns reutilizam o mesmo pool de conexões.
+    """
+    return DatabaseManager()
+
+
+@st.cache_resource
+def get_sales_dataset():
+    """
+    Vendas em memória compartilhadas por todas as sessões e telas; só são relidas quando a
+    tabela de vendas muda, a partir do snapshot colunar (Parquet) atualizado com as vendas novas.
+    """
+    db = get_database_manager()
+    return SalesDataset(db, snapshot=SalesSnapshot(db))
 
-# Transformar os dados em string para contexto no modelo
-data_context = data.to_string(index=False)
 
+@st.cache_resource
+def get_chat_backend():
+    """
+    Cliente do Ollama compartilhado pelo processo (conexão HTTP e lista de modelos em cache).
+    """
+    return ChatBackend()
 
 
 # Menu lateral usando a sidebar
@@ -37,85 +67,98 @@ with st.sidebar:
         ["Chat Inteligente", "Recomendador de Produtos", "Precificação Dinâmica", "Gestão de Estoque"],
         index=0
     )
-    
+
+# Medições deste rerun (tempo, linhas e memória de cada etapa), agrupadas pela tela aberta
+execucao = iniciar_execucao(f"pagina.{menu}")
+
+# Carregar as vendas (base de dados do supermercado) a partir do dataset compartilhado
+data = get_sales_dataset().get()
+
     
 ## preco
-def calcular_preco_otimizado(df, chaves=['Product_line'],months=3):
+@st.cache_resource
+def get_pricing_engine(chaves, meses):
     """
-    Função de exemplo para calcular um preço otimizado, com base nos últimos 'months' meses.
-    - Converte coluna 'Date' para datetime.
-    - Filtra as vendas nesse período (últimos 3 meses por padrão).
-    - Agrupa por Product_line e Unit_price.
-    - Calcula quantidade acumulada e custo médio (cost = Unit_price - gross_income).
-    - Cria uma nova coluna que multiplica a quantidade acumulada pelo custo médio.
-    
-    Retorna um DataFrame com as colunas:
-        [Product_line, Unit_price, qtd_acumulada, custo_medio, valor_novo]
+    PricingEngine compartilhado pelo processo para cada combinação de chaves e período.
     """
-    # Converte a coluna Date para datetime (caso não esteja ainda).
-    df['Date'] = pd.to_datetime(df['Date'])
+    return PricingEngine(list(chaves), meses)
 
-    # Define a data de corte para filtrar os últimos 'months' meses.
-    cutoff_date = df['Date'].max() - pd.DateOffset(months=months)
 
-    # Filtra somente as vendas nesse período
-    df_filtrado = df[df['Date'] >= cutoff_date]
-    
-    # Ordena por Product_line e depois por Unit_price
-    chave_order = chaves+['Unit_price']
-    df_filtrado.sort_values(by=chave_order, ascending=False, inplace=True)
+@st.cache_resource
+def get_chat_cache():
+    """
+    Cache persistente de respostas do chat (chat_cache.db), compartilhado por todas as sessões.
+    """
+    return ChatCache()
 
-    
-    
-    # Calcula a quantidade cumulativa (cumsum) por Product_line
-    df_filtrado["qtd_cumsum"] = df_filtrado.groupby(chaves)["Quantity"].cumsum()
 
-    # Agora agrupamos por Product_line e Unit_price
-    df_grouped = df_filtrado.groupby(chave_order, as_index=False).agg(
-        qtd_cumsum=("qtd_cumsum", "last"),    # Pega o último valor da coluna qtd_cumsum
-    )
+@st.cache_resource
+def get_job_manager():
+    """
+    Jobs em segundo plano compartilhados pelo processo: um cálculo pedido por várias sessões
+    roda uma única vez e sobrevive aos reruns.
+    O job "regras" persiste as regras no banco e guarda como resultado só a versão dos dados.
+    """
+    jobs = JobManager()
+    db, dataset = get_database_manager(), get_sales_dataset()
+    jobs.registrar("regras", lambda colunas, metodo, versao, progresso: sincronizar_regras(
+        db, colunas, metodo=metodo, workers=WORKERS_PADRAO, vendas=dataset.get(),
+        progresso=lambda feitos, total: progresso(feitos, total, f"Minerando regras: {feitos}/{total}"))[0])
+    return jobs
 
-    df_cost = df.groupby(chaves, as_index=False)['cost'].last()
 
-    df_grouped = df_grouped.merge(df_cost, how='left')
+@st.fragment(run_every=1.0)
+def acompanhar_job(chave):
+    """
+    Mostra o progresso de um job e recarrega a página quando ele termina.
+    """
+    job = get_job_manager().status(chave)
+    # Um job que sumiu (substituído por outra versão dos dados) é submetido de novo no rerun
+    if job is None or job["status"] in (CONCLUIDO, ERRO):
+        st.rerun()
+    st.progress(job["progresso"], text=job["mensagem"] or "Na fila...")
 
 
-    df_grouped['profit'] = df_grouped['Unit_price']-df_grouped['cost']
+def botao_exportacao(df, nome, versao, formato, rotulo, file_name, **kwargs):
+    """
+    Botão "Preparar" que gera o arquivo exportado (ou o reaproveita do cache) e, a partir daí, o
+    botão de download com o arquivo aberto. Assim o arquivo não é escrito a cada rerun, só depois
+    do primeiro clique; a escolha fica no session_state enquanto 'versao' e os parâmetros não mudam.
+    """
+    chave = f"exportacao_{nome}_{formato}"
+    atual = (versao, repr(kwargs.get("parametros")))
+    if st.session_state.get(chave) != atual:
+        if not st.button(f"Preparar {rotulo}", key=f"{chave}_preparar"):
+            return
+        st.session_state[chave] = atual
+    with arquivo_exportado(df, nome, versao, formato, **kwargs) as arquivo:
+        st.download_button(label=f"Baixar {rotulo}", data=arquivo, file_name=file_name, mime=FORMATOS[formato],
+                           key=f"{chave}_baixar")
+
+
+@st.cache_resource
+def get_chat_tools():
+    """
+    Ferramentas do chat; os preços são os pré-calculados pelo batch_cli, quando em dia, ou os dos
+    mesmos motores em cache da tela de precificação.
+    """
+    db = get_database_manager()
+    return FerramentasChat(db, precos=lambda chaves: obter_precos(db, chaves, 3, get_pricing_engine(tuple(chaves), 3)))
 
-    # Nova coluna: valor_novo = qtd_cumsum * custo_medio (exemplo)
-    df_grouped["profit_esperado"] = df_grouped["qtd_cumsum"] * df_grouped["profit"]
-    
-    # pegando as demandas normalizadas
-    df_max_demand=df_grouped.groupby(chaves, as_index=False)['qtd_cumsum'].max().rename(columns={'qtd_cumsum':'max_demand'})
-    df_grouped = df_grouped.merge(df_max_demand, how='left')
-    
-    df_grouped['% Demanda Capturada'] = (df_grouped['qtd_cumsum']*100/df_grouped['max_demand']).round(1)
-    
-    idx = df_grouped.groupby(chaves)['profit_esperado'].idxmax()
-    
-    df_last_price = df.groupby(chaves, as_index=False)['Unit_price'].last().rename(columns={'Unit_price':'Último Preço'})
-    df_grouped = df_grouped.merge(df_last_price, how='left')
-    
-    chaves_demanda = chaves + ['% Demanda Capturada']
-    df_demanda_atual = df_grouped[df_grouped["Unit_price"]==df_grouped['Último Preço']][
-                                                chaves_demanda].rename(columns={'% Demanda Capturada':'% Demanda Atual Capturada'})
-    
-    df_grouped = df_grouped.merge(df_demanda_atual, how='left')
-    df_grouped = df_grouped.loc[idx]
-    
-    
-    
-    df_grouped['Diferença % Preço'] = ((df_grouped['Unit_price'] - df_grouped['Último Preço'])*100/df_grouped['Último Preço']).round(1)
-    df_grouped['Diferença % Demanda'] = ((df_grouped['% Demanda Capturada'] - df_grouped['% Demanda Atual Capturada'])*100/df_grouped['% Demanda Atual Capturada']).round(1)
-    df_grouped.rename(columns={'Unit_price':'Melhor Preço', 'Product_line':'Produto'},inplace=True)
-    if 'City' in df_grouped.columns:
-        df_grouped.rename(columns={'City':'Cidade'},inplace=True)
-        df_returned = df_grouped[['Produto','Cidade','Melhor Preço','Último Preço', 'Diferença % Preço','% Demanda Capturada','% Demanda Atual Capturada','Diferença % Demanda']]
-    else:
-        df_returned = df_grouped[['Produto','Melhor Preço','Último Preço', 'Diferença % Preço','% Demanda Capturada','% Demanda Atual Capturada','Diferença % Demanda']]
-    
-    
-    return df_returned
+
+def exibir_desempenho():
+    """
+    Encerra as medições do rerun e, com PAINEL_DESEMPENHO=1 (ou ?debug=1 na URL), mostra na
+    barra lateral o tempo de cada etapa e o resumo do log de métricas.
+    """
+    medicoes = finalizar_execucao(execucao)
+    if not (PAINEL_DESEMPENHO or st.query_params.get("debug") == "1"):
+        return
+    with st.sidebar.expander("⏱️ Desempenho"):
+        st.dataframe(medicoes.reindex(columns=["nome", "segundos", "linhas", "memoria_delta_mb", "erro"]),
+                     hide_index=True)
+        st.caption("Histórico do log de métricas")
+        st.dataframe(historico())
 
 
 def main():
@@ -126,10 +169,7 @@ def main():
     
     options = st.sidebar.multiselect(
         "Qual Nível da Otimização de Preços",
-        [
-            "Produto",
-            "Cidade",
-        ],default='Produto'
+        list(NOMES_CHAVES.values()),default='Produto'
     )
     
     if st.sidebar.button("Atualizar Preços"):
@@ -139,61 +179,66 @@ def main():
     # TÍTULO PRINCIPAL
     st.title("Otimização de Preços")
 
-    # Instancia o gerenciador do banco de dados
-    db = DatabaseManager()
+    # Gerenciador do banco de dados compartilhado entre os reruns
+    db = get_database_manager()
 
-    # Seção para exibir todos os dados em formato de tabela
+    # Seção para exibir os dados do período usado na otimização
     st.subheader("Tabela de Vendas")
-    data = db.get_all_data()
-
-    # Nomes das colunas existentes no seu banco
-    columns_names = [
-        "Invoice_ID",
-        "Branch",
-        "City",
-        "Customer_type",
-        "Gender",
-        "Product_line",
-        "Unit_price",
-        "Quantity",
-        "Tax_5",
-        "Total",
-        "Date",
-        "Time",
-        "Payment",
-        "cogs",
-        "gross_margin_percentage",
-        "gross_income",
-        "Rating"
-    ]
-
-    # Converte em DataFrame e seleciona as colunas desejadas
-    df = pd.DataFrame(data, columns=columns_names)[
-        ["Product_line", 'City', "Date", "Unit_price", "Quantity", "gross_income"]
-    ]
-
-    # Cria coluna de custo (exemplo)
-    df['cost'] = df['Unit_price'] - df['gross_income']
+    meses = 3
+    data_corte = data['Date'].max() - pd.DateOffset(months=meses)
+
+    # Recorta do dataset compartilhado as colunas e as vendas dos últimos 'meses' meses
+    colunas = ["Product_line", "City", "Date", "Unit_price", "Quantity", "gross_income"]
+    df = data.loc[data['Date'] >= data_corte, colunas]
+
+    # Cria coluna de custo (exemplo); assign devolve um novo DataFrame, sem tocar no compartilhado
+    df = df.assign(cost=df['Unit_price'] - df['gross_income'])
 
     # CENTRALIZAÇÃO DA TABELA
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
-        st.dataframe(df, column_config={"Name": st.column_config.Column(width="large")},)
+        with medir("tela.tabela_vendas", linhas=len(df)):
+            st.dataframe(df, column_config={"Name": st.column_config.Column(width="large")},)
 
         # EXEMPLO DE USO DA FUNÇÃO DE PREÇO OTIMIZADO
         st.subheader("Cálculo de Preço Otimizado (Exemplo)")
         
-        dic = {'Produto':'Product_line', 'Cidade':'City'}
+        dic = {nome: chave for chave, nome in NOMES_CHAVES.items()}
         opcoes_normalizadas = [dic.get(n, n) for n in options]
         
         if opcoes_normalizadas != []:
         
-            df_otimizado = calcular_preco_otimizado(df, chaves=opcoes_normalizadas, months=3)
+            # O motor fica em memória entre os reruns e só lê do banco as vendas novas
+            engine = sincronizar(get_pricing_engine(tuple(opcoes_normalizadas), meses), db)
+            # Preços pré-calculados pelo batch_cli quando estão em dia; senão, os do motor
+            df_otimizado = obter_precos(db, opcoes_normalizadas, meses, engine)
+            tabela_precos = df_otimizado
             st.write("Abaixo, o resultado do agrupamento por produto e preço, considerando últimos 3 meses:")
             df_otimizado = df_otimizado.style.map(lambda x: f"background-color: {'green' if x>=0 else 'red' if x<0 else 'gray'}", 
                                                 subset=['Diferença % Preço', 'Diferença % Demanda'])
             st.dataframe(df_otimizado, column_config={"Name": st.column_config.Column(width="large")},) 
 
+            # O arquivo só é gerado depois do clique em "Preparar" e fica em cache até os dados mudarem
+            versao = db.get_data_version()
+            for formato, rotulo in (("xlsx", "Excel"), ("csv", "CSV")):
+                botao_exportacao(tabela_precos, "precos", versao, formato, f"Preços em {rotulo}",
+                                 f"precos_otimizados.{formato}", aba="Preços", parametros=opcoes_normalizadas)
+
+            # SIMULAÇÃO: demanda e lucro estimados se o preço de todos os segmentos mudar X%
+            st.subheader("Simulação de Preços")
+            simulador = obter_simulador(engine)
+            if not simulador.segmentos:
+                st.info("Não há vendas no período para simular preços.")
+                return
+            variacao = st.slider("Variação sobre o último preço (%)", -30, 30, 0)
+            st.dataframe(simulador.simular(variacao).round(2), column_config={"Name": st.column_config.Column(width="large")},)
+
+            # Curva de lucro de um segmento, interpolada entre os preços já praticados
+            nomes_segmentos = [" / ".join(map(str, s)) for s in simulador.segmentos]
+            escolhido = st.selectbox("Curva de lucro do segmento:", nomes_segmentos)
+            curva = simulador.curva_lucro(simulador.segmentos[nomes_segmentos.index(escolhido)])
+            st.line_chart(curva.set_index("Preço")["Lucro"])
+
 if menu == "Precificação Dinâmica":
     main()
 
@@ -201,8 +246,8 @@ if menu == "Precificação Dinâmica":
 # Configurar cada ferramenta
 if menu == "Chat Inteligente":
     # Importações específicas para o chat
-    import ollama
     from typing import Dict, Generator
+    backend = get_chat_backend()
   
 
  # Adicionar o seletor ao lado da barra lateral
@@ -210,44 +255,26 @@ if menu == "Chat Inteligente":
     with col1:
         st.session_state.selected_model = st.selectbox(
             "Modelo:",
-            [model.model for model in ollama.list()["models"]]
+            backend.listar_modelos()
         )
     with col2:
-        st.write("")  # Espaço vazio para o restante do conteúdo
+        # Com ferramentas, o modelo consulta o banco (vendas, preços, recomendações) para responder
+        usar_ferramentas = st.toggle("Consultar o banco de dados", value=True)
+        cache = get_chat_cache()
+        estatisticas = cache.estatisticas()
+        st.caption(f"Cache de respostas: {estatisticas['acertos']}/{estatisticas['consultas']} acertos "
+                   f"({estatisticas['taxa_acerto']:.0%}) · {estatisticas['segundos_economizados']:.1f}s economizados")
 
     # Centralizar o título "Chat Inteligente"
     st.markdown("<h1 style='text-align: center;'>🤖 Chat Inteligente</h1>", unsafe_allow_html=True)
     st.write("<p style='text-align: center;'>Converse com o agente de IA sobre o seu supermercado.</p>", unsafe_allow_html=True)
 
-    # Carregar os dados no backend
-    data = pd.read_csv('supermarket_sales.csv')  # Certifique-se de que o arquivo está no mesmo diretório ou especifique o caminho completo
-
-    # Gerar um resumo inicial para passar como contexto
-    resumo_categorias = data.groupby("Product line")["Total"].sum().sort_values(ascending=False).to_string()
-    resumo_vendas = data.groupby("Product line")["Quantity"].sum().sort_values(ascending=False).to_string()
-    resumo_faturamento_mensal = data.groupby(data['Date'].str.slice(3, 10))['Total'].sum().to_string()
-    # Formatação de valores monetários no pandas
-    # Garantir que a coluna 'Total' seja numérica
-    data['Total'] = pd.to_numeric(data['Total'], errors='coerce')
-
-    # Gerar o resumo de faturamento formatado
-    resumo_faturamento = data.groupby("Product line")["Total"]\
-        .sum()\
-        .sort_values(ascending=False)\
-        .apply(lambda x: f"R$ {x:,.2f}")\
-        .to_string()
-
-    # Prompt estratégico para o modelo
+    # Prompt estratégico para o modelo (os dados vêm do cubo de resumo, em cache por versão)
     initial_prompt = f"""
     Você é um assistente estratégico, parte da equipe do supermercado. Sua função é trabalhar junto com os gestores para melhorar a operação e aumentar o desempenho do supermercado. Seu objetivo é fornecer respostas detalhadas, baseadas nos dados fornecidos e no seu amplo conhecimento sobre o setor de supermercados.
 
     Aqui estão os principais aspectos dos dados do nosso supermercado:
-    1. Categorias de produtos disponíveis: {', '.join(data['Product line'].unique())}.
-    2. Métodos de pagamento mais utilizados: {', '.join(data['Payment'].unique())}.
-    3. Locais das vendas (cidades): {', '.join(data['City'].unique())}.
-    4. Gêneros atendidos: {', '.join(data['Gender'].unique())}.
-    5. Faturamento por categoria (5 principais):
-    {data.groupby("Product line")["Total"].sum().sort_values(ascending=False).head(5).apply(lambda x: f"R$ {x:,.2f}").to_string()}
+{contexto_dados(get_sales_dataset())}
 
     Como parte da equipe, seu tom deve ser amigável e colaborativo, sempre oferecendo insights úteis e sugestões práticas. Sempre que falar sobre valores, use o formato da moeda brasileira (R$) para manter consistência com os relatórios internos.
 
@@ -275,15 +302,27 @@ if menu == "Chat Inteligente":
 
 
     # Função para gerar respostas do Ollama
-    def ollama_generator(model_name: str, messages: Dict) -> Generator:
-        # Inserir o contexto (dados) na primeira interação
-        if len(st.session_state.messages) == 1:  # Apenas no primeiro uso
-            messages.insert(0, {"role": "system", "content": initial_prompt})
-        
-        # Chamar o modelo Ollama
-        stream = ollama.chat(model=model_name, messages=messages, stream=True)
-        for chunk in stream:
-            yield chunk['message']['content']
+    def ollama_generator(model_name: str, messages: Dict, metrica: Dict = None) -> Generator:
+        # O contexto (dados) vai como prompt de sistema em todo turno, sempre idêntico e na
+        # primeira posição: o Ollama reaproveita o prefixo já processado em vez de reavaliá-lo.
+        # Depois dele vêm o resumo das mensagens antigas e as recentes que cabem na janela do modelo
+        system = initial_prompt + INSTRUCOES_FERRAMENTAS if usar_ferramentas else initial_prompt
+
+        def gerar():
+            # Só monta o envio quando a resposta não está no cache: compactar a memória pode
+            # custar uma chamada ao modelo (o resumo) antes do primeiro trecho da resposta
+            envio = st.session_state.memoria.mensagens_para_envio(model_name, messages, system=system,
+                                                                  resumidor=backend.resumir)
+            return backend.conversar(model_name, envio, options={"num_ctx": contexto_modelo(model_name)},
+                                     metrica=metrica, ferramentas=get_chat_tools() if usar_ferramentas else None)
+
+        # Perguntas repetidas (mesmo modelo, dados e contexto) são respondidas pelo cache, sem gerar de novo
+        pergunta = messages[-1]["content"]
+        anteriores = [m["content"] for m in messages[:-1] if m["role"] == "assistant"]
+        chave = cache.chave(model_name, get_sales_dataset().versao, pergunta,
+                            contexto=anteriores[-1] if anteriores else "",
+                            modo="ferramentas" if usar_ferramentas else "")
+        yield from cache.responder(chave, gerar, modelo=model_name, pergunta=pergunta, metrica=metrica)
 
     # Evite exibir o prompt inicial no frontend
     for message in st.session_state.messages:
@@ -301,8 +340,15 @@ if menu == "Chat Inteligente":
 
         # Exibir resposta do assistente
         with st.chat_message("assistant"):
+            metrica = {}
             response = st.write_stream(ollama_generator(
-                st.session_state.selected_model, st.session_state.messages))
+                st.session_state.selected_model, st.session_state.messages, metrica))
+            if metrica.get("cache"):
+                st.caption("Resposta do cache")
+            elif metrica.get("ttft") is not None:
+                st.caption(f"Primeiro token em {metrica['ttft']:.2f}s · resposta completa em {metrica['segundos']:.2f}s")
+            if metrica.get("ferramentas"):
+                st.caption("Consultas: " + ", ".join(f["nome"] for f in metrica["ferramentas"]))
 
         # Adicionar resposta ao histórico
         st.session_state.messages.append({"role": "assistant", "content": response})
@@ -311,8 +357,6 @@ if menu == "Chat Inteligente":
 elif menu == "Recomendador de Produtos":
     st.header("📦 Recomendador de Produtos")
     st.write("Ferramenta para recomendação de produtos com base nos dados do supermercado.")
-    # Carregar os dados
-    data = pd.read_csv('supermarket_sales.csv')
 
     # Configurar o título
     #st.title("💡 Sistema Inteligente de Recomendação de Produtos")
@@ -321,57 +365,50 @@ elif menu == "Recomendador de Produtos":
     columns = ['Branch', 'Gender', 'Customer type']
     selected_columns = st.multiselect('Selecione as variáveis para segmentação:', columns, default=columns)
 
+    # "pares" conta co-ocorrências de forma vetorizada; "apriori" roda o mlxtend por segmento, em paralelo
+    metodo = st.selectbox('Algoritmo de mineração:', list(METODOS), index=0)
+
     # Verificar se o usuário selecionou as variáveis
     if selected_columns:
-        # Filtrar as combinações únicas de subclasses
-        unique_combinations = data[selected_columns].drop_duplicates()
-
-        # Lista para armazenar todas as recomendações
-        all_recommendations = []
-
-        # Loop para gerar recomendações por cada combinação de subclasses
-        for _, row in unique_combinations.iterrows():
-            filters = {col: row[col] for col in selected_columns}
-            filtered_data = data.copy()
-
-            # Aplicar filtros de subclasses
-            for col, value in filters.items():
-                filtered_data = filtered_data[filtered_data[col] == value]
-
-            # Agrupamento mais amplo
-            transactions = filtered_data.groupby(['Branch', 'Customer type', 'Date'])['Product line'].apply(list).tolist()
-            #st.write(f"### Média de itens por transação para {filters}: {sum(len(t) for t in transactions) / len(transactions):.2f}")
-
-            # Converter para formato binário
-            te = TransactionEncoder()
-            te_ary = te.fit(transactions).transform(transactions)
-            df = pd.DataFrame(te_ary, columns=te.columns_)
-
-            # Aplicar Apriori com suporte mínimo reduzido
-            frequent_itemsets = apriori(df, min_support=0.0001, use_colnames=True)
-
-            # Gerar regras de associação
-            rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=0.01, num_itemsets=len(frequent_itemsets))
-            rules = rules[(rules['antecedents'].apply(len) == 1) & (rules['consequents'].apply(len) == 1)]  # Filtrar para pares
-            rules = rules[rules['lift'] > 1.0]  # Filtrar regras com lift > 1.0
-
-            # Adicionar informações de contexto às regras
-            for col, value in filters.items():
-                rules[col] = value
-
-            # Adicionar as regras geradas ao DataFrame geral
-            all_recommendations.append(rules)
-            
-            
+        # Nomes das colunas no banco
+        colunas_db = [col.replace(' ', '_') for col in selected_columns]
+
+        # Regras pré-calculadas para a versão atual dos dados (só são mineradas se as vendas mudaram).
+        # A mineração roda em segundo plano: reruns não a interrompem e sessões que pedem as mesmas
+        # regras compartilham a mesma execução
+        jobs = get_job_manager()
+        chave_regras = jobs.submeter("regras", colunas=colunas_db, metodo=metodo, versao=get_sales_dataset().versao)
+        job = jobs.aguardar(chave_regras, timeout=1.0)
+        if job is None:
+            st.rerun()
+        if job["status"] == ERRO:
+            st.error(f"Falha ao minerar as regras: {job['erro']}")
+            exibir_desempenho()
+            st.stop()
+        if job["status"] != CONCLUIDO:
+            acompanhar_job(chave_regras)
+            exibir_desempenho()
+            st.stop()
+        # As regras são lidas das tabelas do banco, onde o job as persistiu
+        db = get_database_manager()
+        with db.snapshot():
+            all_recommendations_df = db.read_rules(colunas_db)
+            segmentos = db.get_rules_run(colunas_db)[1]
+        regras_por_segmento = dict(list(all_recommendations_df.groupby(colunas_db, sort=False)))
+
+        # Exibir as recomendações de cada combinação de subclasses
+        for segmento in segmentos:
+            filters = {col: segmento[col_db] for col, col_db in zip(selected_columns, colunas_db)}
 
             # Exibir Recomendações Humanizadas
             st.write(f"### Recomendações Personalizadas para {filters}:")
-            top_recommendations = rules.sort_values(by='confidence', ascending=False).head(5)
+            chave = tuple(segmento[col_db] for col_db in colunas_db)
+            top_recommendations = regras_por_segmento.get(chave, all_recommendations_df.iloc[0:0]).head(5)
 
             if not top_recommendations.empty:
                 for _, rule in top_recommendations.iterrows():
-                    antecedent = list(rule['antecedents'])[0]
-                    consequent = list(rule['consequents'])[0]
+                    antecedent = rule['antecedente']
+                    consequent = rule['consequente']
                     confidence = round(rule['confidence'] * 100, 2)
                     
                     # Resposta humanizada usando formatação mais natural
@@ -383,26 +420,18 @@ elif menu == "Recomendador de Produtos":
             else:
                 st.write("🤷‍♂️ Nenhuma recomendação relevante encontrada para esta combinação.")
 
-        # Combinar todas as recomendações em um único DataFrame
-        all_recommendations_df = pd.concat(all_recommendations, ignore_index=True)
-        
-
-        # Função para converter DataFrame em Excel
-        def convert_df_to_excel(df):
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Recomendações')
-            processed_data = output.getvalue()
-            return processed_data
+        # Manter no arquivo apenas as colunas de segmentação selecionadas
+        all_recommendations_df = all_recommendations_df.drop(
+            columns=[col for col in COLUNAS_SEGMENTACAO if col not in colunas_db])
 
-        # Baixar todas as recomendações
+        # Baixar todas as recomendações: o arquivo é escrito em disco, em modo de memória constante,
+        # só depois do clique em "Preparar", e reaproveitado enquanto a versão dos dados não mudar
         st.write("### 📥 Baixar Todas as Recomendações")
         if not all_recommendations_df.empty:
-            excel_data = convert_df_to_excel(all_recommendations_df)
-            st.download_button(label="Baixar Recomendações em Excel",
-                            data=excel_data,
-                            file_name='recomendacoes_subclasses.xlsx',
-                            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            for formato, rotulo in (("xlsx", "Excel"), ("csv", "CSV")):
+                botao_exportacao(all_recommendations_df, "recomendacoes", get_sales_dataset().versao, formato,
+                                 f"Recomendações em {rotulo}", f"recomendacoes_subclasses.{formato}",
+                                 aba="Recomendações", parametros=colunas_db)
     else:
         st.write("Selecione pelo menos uma variável para segmentação.")
 
@@ -415,4 +444,44 @@ elif menu == "Recomendador de Produtos":
 elif menu == "Gestão de Estoque":
     st.header("📊 Gestão de Estoque Inteligente")
     st.write("Identifique produtos com estoque crítico ou excessivo.")
-    st.info("Funcionalidade em desenvolvimento.")
+
+    # Parâmetros da previsão e da reposição
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        metodo_previsao = st.selectbox("Método de previsão", list(METODOS_PREVISAO),
+                                       format_func=METODOS_PREVISAO.get)
+    with col2:
+        prazo_entrega = st.slider("Prazo de entrega (dias)", 1, 15, PRAZO_ENTREGA)
+    with col3:
+        nivel_servico = st.slider("Nível de serviço (%)", 80, 99, int(NIVEL_SERVICO * 100))
+
+    # Previsões de todas as filiais e produtos, em cache até as vendas mudarem
+    estoque = obter_estoque(get_sales_dataset(), metodo=metodo_previsao, prazo_entrega=prazo_entrega,
+                            nivel_servico=nivel_servico / 100)
+
+    # O banco não guarda o estoque físico: ele é informado aqui e classificado contra os parâmetros
+    st.subheader("Estoque Atual")
+    # A tabela editada segue os segmentos da previsão: quando a versão dos dados ou os segmentos
+    # mudam, ela é refeita mantendo o que já foi informado, e o editor recomeça sobre ela
+    chave_estoque = (estoque.versao, tuple(estoque.segmentos.itertuples(index=False, name=None)))
+    if st.session_state.get("estoque_chave") != chave_estoque:
+        st.session_state.estoque_atual = estoque.estoque_atual(st.session_state.get("estoque_editado"))
+        st.session_state.estoque_chave = chave_estoque
+        st.session_state.estoque_geracao = st.session_state.get("estoque_geracao", 0) + 1
+    estoque_atual = st.data_editor(st.session_state.estoque_atual, disabled=["Filial", "Produto"],
+                                   hide_index=True, key=f"editor_estoque_{st.session_state.estoque_geracao}")
+    st.session_state.estoque_editado = estoque_atual
+
+    situacao = estoque.classificar(pd.to_numeric(estoque_atual["Estoque Atual"], errors="coerce"))
+    contagem = situacao["Situação"].value_counts()
+    for coluna, status in zip(st.columns(4), [CRITICO, REPOR, NORMAL, EXCESSO]):
+        coluna.metric(status, int(contagem.get(status, 0)))
+
+    st.subheader("Previsão e Reposição")
+    cores = {CRITICO: "red", REPOR: "orange", EXCESSO: "blue", NORMAL: "green"}
+    st.dataframe(situacao.style.map(lambda x: f"background-color: {cores[x]}" if x in cores else "",
+                                    subset=["Situação"]), hide_index=True)
+    st.caption(f"Previsão com {METODOS_PREVISAO[metodo_previsao].lower()} sobre os últimos "
+               f"{len(estoque.dias)} dias de vendas.")
+
+exibir_desempenho()
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+
+from database_manager import DatabaseManager
+from exporter import FORMATOS, gravar
+from pricing_engine import atualizar_precos, combinacoes_chaves, precos_calculados
+from recommender import METODOS, WORKERS_PADRAO, atualizar_regras, combinacoes_segmentacao
+
+# Combinações de chaves de preço calculadas por padrão: até 3 chaves (as combinações maiores
+# segmentam demais os dados de um supermercado e multiplicam o tempo da execução)
+MAX_CHAVES_PADRAO = 3
+
+
+def _progresso(etapa, log):
+    # Função progresso(feitos, total) que informa o andamento e o tempo decorrido da etapa
+    inicio = time.perf_counter()
+
+    def informar(feitos, total):
+        log(f"{etapa}: {feitos}/{total} ({time.perf_counter() - inicio:.1f}s)")
+    return informar
+
+
+def _gravar_arquivo(df, saida, nome, formato, aba):
+    return gravar(df, os.path.join(saida, f"{nome}.{formato}"), formato, aba=aba)
+
+
+def executar_precos(db, max_chaves=MAX_CHAVES_PADRAO, meses=3, workers=1, saida=None, formato="csv",
+                    forcar=False, log=print):
+    """
+    Calcula e persiste os melhores preços de todas as combinações de até 'max_chaves' chaves
+    que estejam desatualizadas. Com 'saida', grava também um arquivo por combinação no diretório.
+    Retorna {recalculadas, total, segundos}.
+    """
+    inicio = time.perf_counter()
+    combinacoes = combinacoes_chaves(max_chaves)
+    calculadas = atualizar_precos(db, combinacoes, meses, workers, _progresso("preços", log), forcar)
+    if saida:
+        for chaves in combinacoes:
+            tabela = calculadas.get(tuple(chaves))
+            if tabela is None:
+                tabela = precos_calculados(db, chaves, meses)
+            if tabela is not None:
+                _gravar_arquivo(tabela, saida, f"precos-{'+'.join(chaves)}-{meses}m", formato, "Preços")
+    return {"recalculadas": len(calculadas), "total": len(combinacoes),
+            "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def executar_regras(db, metodo="pares", workers=1, saida=None, formato="csv", forcar=False, log=print):
+    """
+    Minera e persiste as regras de associação de todas as segmentações que estejam
+    desatualizadas. Com 'saida', grava também um arquivo por segmentação no diretório.
+    Retorna {recalculadas, total, segundos}.
+    """
+    inicio = time.perf_counter()
+    segmentacoes = combinacoes_segmentacao()
+    recalculadas = atualizar_regras(db, segmentacoes, metodo, workers, _progresso("regras", log), forcar)
+    if saida:
+        for colunas in segmentacoes:
+            _gravar_arquivo(db.read_rules(colunas), saida, f"regras-{'+'.join(colunas)}", formato, "Regras")
+    return {"recalculadas": len(recalculadas), "total": len(segmentacoes),
+            "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def executar(db, precos=True, regras=True, max_chaves=MAX_CHAVES_PADRAO, meses=3, workers=1,
+             metodo="pares", saida=None, formato="csv", forcar=False, log=print):
+    """
+    Execução em lote (ex.: noturna, pelo cron) dos cálculos pesados, sem a interface:
+    - melhores preços de todas as combinações de chaves e regras de associação de todas as
+      segmentações, persistidos no banco, de onde as telas e o chat passam a lê-los enquanto a
+      versão dos dados não muda;
+    - só o que está desatualizado é recalculado, a não ser com 'forcar';
+    - com 'saida', os resultados também são gravados em arquivos ('formato' de FORMATOS).
+    Retorna o resumo de cada etapa, pronto para json.dump.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato!r}. Use um de {list(FORMATOS)}")
+    if saida:
+        os.makedirs(saida, exist_ok=True)
+
+    resumo = {"versao_dados": db.get_data_version()}
+    if precos:
+        resumo["precos"] = executar_precos(db, max_chaves, meses, workers, saida, formato, forcar, log)
+    if regras:
+        resumo["regras"] = executar_regras(db, metodo, workers, saida, formato, forcar, log)
+    return resumo
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cálculo em lote dos preços otimizados e das regras de recomendação.")
+    parser.add_argument("--db", default="supermarket_sales.db", help="Banco SQLite de vendas")
+    parser.add_argument("--sem-precos", action="store_true", help="Não calcula os preços")
+    parser.add_argument("--sem-regras", action="store_true", help="Não minera as regras")
+    parser.add_argument("--max-chaves", type=int, default=MAX_CHAVES_PADRAO,
+                        help="Máximo de chaves por combinação de preços")
+    parser.add_argument("--meses", type=int, default=3, help="Meses de histórico da curva de demanda")
+    parser.add_argument("--workers", type=int, default=WORKERS_PADRAO, help="Processos em paralelo")
+    parser.add_argument("--metodo", choices=list(METODOS), default="pares", help="Algoritmo das regras")
+    parser.add_argument("--saida", help="Diretório onde gravar também os resultados em arquivos")
+    parser.add_argument("--formato", choices=list(FORMATOS), default="csv")
+    parser.add_argument("--forcar", action="store_true", help="Recalcula mesmo o que está em dia")
+    args = parser.parse_args()
+
+    resumo = executar(DatabaseManager(args.db), not args.sem_precos, not args.sem_regras, args.max_chaves,
+                      args.meses, args.workers, args.metodo, args.saida, args.formato, args.forcar)
+    print(json.dumps(resumo, indent=2, ensure_ascii=False))
@@ -0,0 +1,225 @@
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from database_manager import COLUNAS_SEGMENTACAO, DatabaseManager
+from inventory import InventoryEngine
+from pricing_engine import PricingEngine, calcular_preco_otimizado, sincronizar
+from recommender import COLUNAS_RECOMENDADOR, minerar_regras, minerar_regras_pares
+from sales_data import SalesDataset
+from sales_snapshot import SalesSnapshot
+from synthetic_data import criar_banco
+
+ESCALAS_PADRAO = [1_000, 100_000, 1_000_000]
+
+# Acima destas quantidades de linhas o cenário só roda com --sem-limites (memória ou tempo proibitivos)
+LIMITES_CENARIOS = {
+    "get_all_data": 5_000_000,
+    "recomendador_apriori": 1_000_000,
+}
+
+
+class _Contexto:
+    """
+    Banco sintético de uma escala e os DataFrames preparados para os cenários, lidos uma única
+    vez e fora da medição.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._frames = {}
+
+    def frame(self, nome, carregar):
+        if nome not in self._frames:
+            self._frames[nome] = carregar()
+        return self._frames[nome]
+
+    def snapshot(self):
+        def carregar():
+            snapshot = SalesSnapshot(self.db, os.path.splitext(self.db.db_name)[0] + "-snapshot")
+            snapshot.atualizar()
+            return snapshot
+        return self.frame("snapshot", carregar)
+
+    def vendas(self):
+        return self.frame("vendas", lambda: SalesDataset(self.db).get())
+
+    def vendas_precos(self):
+        def carregar():
+            df = self.db.read_frame(["Product_line", "City", "Date_iso", "Unit_price", "Quantity", "gross_income"])
+            df = df.rename(columns={"Date_iso": "Date"})
+            df["cost"] = df["Unit_price"] - df["gross_income"]
+            return df
+        return self.frame("vendas_precos", carregar)
+
+    def vendas_recomendador(self):
+        return self.frame("vendas_recomendador", lambda: self.db.read_frame(COLUNAS_RECOMENDADOR))
+
+
+# Cada cenário recebe o contexto e devolve a função (sem argumentos) que é medida
+CENARIOS = {
+    "get_all_data": lambda ctx: ctx.db.get_all_data,
+    "sales_dataset": lambda ctx: lambda: SalesDataset(ctx.db).get(),
+    "sales_dataset_snapshot": lambda ctx: lambda snapshot=ctx.snapshot(): SalesDataset(ctx.db, snapshot).get(),
+    "snapshot_leitura_precos": lambda ctx: lambda snapshot=ctx.snapshot(): snapshot.ler(
+        ["Product_line", "City", "Date_iso", "Unit_price", "Quantity", "gross_income"], data_inicio="2019-02-01"),
+    "sqlite_leitura_precos": lambda ctx: lambda: ctx.db.read_frame(
+        ["Product_line", "City", "Date_iso", "Unit_price", "Quantity", "gross_income"], data_inicio="2019-02-01"),
+    "aggregate_sales": lambda ctx: lambda: ctx.db.aggregate_sales(["Product_line", "Month"], limite=200),
+    "calcular_preco_otimizado": lambda ctx: (
+        lambda df=ctx.vendas_precos(): calcular_preco_otimizado(df, chaves=["Product_line", "City"])),
+    "sincronizar_precos": lambda ctx: lambda: sincronizar(PricingEngine(["Product_line", "City"]), ctx.db),
+    "recomendador_pares": lambda ctx: (
+        lambda df=ctx.vendas_recomendador(): minerar_regras_pares(df, COLUNAS_SEGMENTACAO)),
+    "recomendador_apriori": lambda ctx: (
+        lambda df=ctx.vendas_recomendador(): minerar_regras(df, COLUNAS_SEGMENTACAO)),
+    "estoque": lambda ctx: lambda df=ctx.vendas(): InventoryEngine(df),
+}
+
+
+def medir(funcao, repeticoes=3):
+    """
+    Executa 'funcao' 'repeticoes' vezes medindo o tempo de cada execução e, em uma execução
+    extra sob tracemalloc, o pico de memória alocada pelo Python e pelo NumPy/pandas.
+    A memória interna do SQLite e a do Arrow não passam pelo alocador do Python e não entram no pico.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "repeticoes": repeticoes,
+        "segundos": [round(t, 6) for t in tempos],
+        "segundos_min": round(min(tempos), 6),
+        "segundos_mediana": round(statistics.median(tempos), 6),
+        "pico_memoria_mb": round(pico / 2**20, 3),
+    }
+
+
+def preparar_banco(linhas, seed=0, diretorio=None):
+    """
+    Retorna (DatabaseManager, estatísticas de carga) do banco sintético com 'linhas' vendas.
+    O banco é reaproveitado entre execuções (mesma escala e seed geram os mesmos dados);
+    a carga só é feita, e as estatísticas só são devolvidas, quando ele ainda não existe.
+    """
+    diretorio = diretorio or os.path.join(tempfile.gettempdir(), "sistema_mercado_benchmark")
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"sintetico-{linhas}-{seed}.db")
+    if os.path.exists(caminho) and DatabaseManager(caminho).get_fingerprint()[0] == linhas:
+        return DatabaseManager(caminho), None
+
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+    shutil.rmtree(os.path.splitext(caminho)[0] + "-snapshot", ignore_errors=True)
+    carga = criar_banco(caminho, linhas, seed)
+    return DatabaseManager(caminho), carga
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(escalas=ESCALAS_PADRAO, cenarios=None, repeticoes=3, seed=0, diretorio=None,
+             sem_limites=False, log=print):
+    """
+    Roda os 'cenarios' (todos de CENARIOS, por padrão) em cada escala e retorna o relatório
+    (metadados e uma lista de resultados por cenário e escala), pronto para json.dump.
+    """
+    cenarios = list(cenarios or CENARIOS)
+    resultados = []
+    for linhas in escalas:
+        db, carga = preparar_banco(linhas, seed, diretorio)
+        if carga is not None:
+            resultados.append({"cenario": "carga", "linhas": linhas, **carga})
+            log(f"[{linhas}] carga: {carga['segundos']}s ({carga['linhas_por_segundo']} linhas/s)")
+        ctx = _Contexto(db)
+        for nome in cenarios:
+            if not sem_limites and linhas > LIMITES_CENARIOS.get(nome, float("inf")):
+                resultados.append({"cenario": nome, "linhas": linhas, "ignorado": True})
+                log(f"[{linhas}] {nome}: ignorado (acima de {LIMITES_CENARIOS[nome]} linhas)")
+                continue
+            resultado = medir(CENARIOS[nome](ctx), repeticoes)
+            resultados.append({"cenario": nome, "linhas": linhas, **resultado})
+            log(f"[{linhas}] {nome}: {resultado['segundos_mediana']:.4f}s, pico {resultado['pico_memoria_mb']} MB")
+
+    return {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "seed": seed,
+        "resultados": resultados,
+    }
+
+
+def comparar(anterior, atual):
+    """
+    Tabela com a mediana de tempo e o pico de memória de cada cenário e escala presentes nos
+    dois relatórios, e a razão atual / anterior (abaixo de 1 = mais rápido ou mais econômico).
+    """
+    def indexar(relatorio):
+        return {(r["cenario"], r["linhas"]): r for r in relatorio["resultados"] if "segundos_mediana" in r}
+
+    antes, depois = indexar(anterior), indexar(atual)
+    linhas = []
+    for chave in [c for c in depois if c in antes]:
+        a, d = antes[chave], depois[chave]
+        linhas.append({
+            "cenario": chave[0],
+            "linhas": chave[1],
+            "segundos_anterior": a["segundos_mediana"],
+            "segundos_atual": d["segundos_mediana"],
+            "razao_tempo": round(d["segundos_mediana"] / a["segundos_mediana"], 3) if a["segundos_mediana"] else None,
+            "razao_memoria": round(d["pico_memoria_mb"] / a["pico_memoria_mb"], 3) if a["pico_memoria_mb"] else None,
+        })
+    return pd.DataFrame(linhas)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark dos caminhos críticos com dados sintéticos.")
+    parser.add_argument("--escalas", type=int, nargs="+", default=ESCALAS_PADRAO, help="Quantidades de linhas")
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), help="Padrão: todos")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", help="Onde guardar os bancos sintéticos (padrão: diretório temporário)")
+    parser.add_argument("--saida", default="benchmark.json", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--sem-limites", action="store_true", help="Ignora LIMITES_CENARIOS")
+    args = parser.parse_args()
+
+    relatorio = executar(args.escalas, args.cenarios, args.repeticoes, args.seed, args.dir, args.sem_limites)
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+    print(f"Resultados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            print(comparar(json.load(arquivo), relatorio).to_string(index=False))
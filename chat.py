@@ -1,13 +1,24 @@
 import streamlit as st
-import ollama
 from typing import Dict, Generator
 
+from chat_backend import ChatBackend
+from chat_memory import MemoriaConversa, contexto_modelo
+
+
+@st.cache_resource
+def get_chat_backend():
+    return ChatBackend()
+
 
 def ollama_generator(model_name: str, messages: Dict) -> Generator:
-    stream = ollama.chat(
-        model=model_name, messages=messages, stream=True)
-    for chunk in stream:
-        yield chunk['message']['content']
+    def gerar():
+        # Só as mensagens recentes que cabem na janela do modelo; as antigas vão resumidas pelo
+        # próprio modelo, o que só acontece quando a resposta é de fato gerada
+        envio = st.session_state.memoria.mensagens_para_envio(model_name, messages,
+                                                              resumidor=get_chat_backend().resumir)
+        return get_chat_backend().conversar(model_name, envio, options={"num_ctx": contexto_modelo(model_name)})
+
+    yield from gerar()
 
 
 st.title("Ollama with Streamlit demo")
@@ -16,13 +27,14 @@ if "selected_model" not in st.session_state:
     st.session_state.selected_model = ""
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "memoria" not in st.session_state:
+    st.session_state.memoria = MemoriaConversa()
 
-# Obter a lista de modelos
-models = ollama.list()["models"]
+# Obter a lista de modelos (em cache no backend)
+models = get_chat_backend().listar_modelos()
 
-# Ajustar para acessar o atributo `model` diretamente
 st.session_state.selected_model = st.selectbox(
-    "Please select the model:", [model.model for model in models])
+    "Please select the model:", models)
 
 # Exibir histórico de mensagens
 for message in st.session_state.messages:
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+import ollama
+
+from chat_memory import PAPEIS, contexto_modelo
+from instrumentation import instrumentar
+
+# Servidor do Ollama (ex.: um stub local em testes); None usa o padrão da biblioteca / OLLAMA_HOST
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST")
+
+# Por quanto tempo o Ollama mantém o modelo (e o cache do prefixo do prompt) carregado após cada chamada
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+# Validade, em segundos, da lista de modelos em cache
+TTL_MODELOS = 60
+
+# Rodadas de chamadas de ferramentas permitidas antes de exigir a resposta final
+MAX_RODADAS_FERRAMENTAS = 3
+
+# Instrução para o modelo ao incorporar mensagens antigas ao resumo da conversa (chat_memory)
+PROMPT_RESUMO = (
+    "Você mantém o resumo de uma conversa entre um usuário e um assistente de dados de um "
+    "supermercado. Reescreva o resumo anterior incorporando as novas mensagens. Preserve todos os "
+    "fatos, números, nomes, filtros e decisões mencionados; descarte apenas cumprimentos e "
+    "repetições. Escreva em português, em tópicos curtos, com no máximo {palavras} palavras, e "
+    "responda somente com o resumo."
+)
+
+# Palavras por token (aproximado), para pedir o resumo em palavras dentro do limite de tokens
+PALAVRAS_POR_TOKEN = 0.7
+
+
+class ChatBackend:
+    """
+    Camada de acesso ao Ollama usada pelas telas de chat.
+    - Um único ollama.Client (e sua conexão HTTP) é reutilizado por todas as chamadas.
+    - A lista de modelos fica em cache por 'ttl_modelos' segundos.
+    - Toda chamada envia 'keep_alive', mantendo o modelo carregado entre as mensagens. Como o
+      prompt de sistema é sempre a primeira mensagem e não muda entre os turnos, o Ollama
+      reaproveita o cache do prefixo já processado e só avalia as mensagens novas.
+    - Cada resposta registra o tempo até o primeiro token (TTFT) e as contagens do Ollama.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, keep_alive=KEEP_ALIVE, ttl_modelos=TTL_MODELOS, client=None):
+        self.client = client or ollama.Client(host=host)
+        self.keep_alive = keep_alive
+        self.ttl_modelos = ttl_modelos
+        self.metricas = deque(maxlen=100)
+        self._modelos = None
+        self._modelos_em = 0.0
+        self._lock = threading.Lock()
+
+    @instrumentar("llm.listar_modelos")
+    def listar_modelos(self, forcar=False):
+        """
+        Retorna os nomes dos modelos disponíveis, consultando o servidor no máximo uma vez a
+        cada 'ttl_modelos' segundos (ou sempre, com 'forcar').
+        """
+        with self._lock:
+            if forcar or self._modelos is None or time.monotonic() - self._modelos_em > self.ttl_modelos:
+                self._modelos = [model.model for model in self.client.list()["models"]]
+                self._modelos_em = time.monotonic()
+            return list(self._modelos)
+
+    @instrumentar("llm.conversar")
+    def conversar(self, model_name, messages, system=None, options=None, metrica=None, ferramentas=None):
+        """
+        Gera a resposta do modelo em streaming (um gerador de trechos de texto).
+        - 'system' (opcional) é enviado como primeira mensagem, sem alterar 'messages'.
+        - 'ferramentas' (opcional, ex.: chat_tools.FerramentasChat) ativa o uso de ferramentas:
+          as chamadas pedidas pelo modelo são executadas e seus resultados devolvidos a ele, por
+          até MAX_RODADAS_FERRAMENTAS rodadas, antes da resposta final. Se o modelo não suportar
+          ferramentas, a conversa segue sem elas.
+        - Ao final, as métricas da chamada (TTFT, duração, tokens, ferramentas chamadas) são
+          gravadas no dicionário 'metrica', se informado, e acrescentadas a self.metricas.
+        """
+        messages = list(messages)
+        if system is not None:
+            messages.insert(0, {"role": "system", "content": system})
+
+        inicio = time.perf_counter()
+        metrica = {} if metrica is None else metrica
+        metrica.update(modelo=model_name, ttft=None, segundos=None, ferramentas=[])
+        for rodada in range(MAX_RODADAS_FERRAMENTAS + 1):
+            usar_ferramentas = ferramentas is not None and rodada < MAX_RODADAS_FERRAMENTAS
+            chamadas = []
+            try:
+                for conteudo, chamadas_chunk in self._stream(model_name, messages, options,
+                                                             ferramentas.definicoes if usar_ferramentas else None,
+                                                             metrica):
+                    chamadas.extend(chamadas_chunk)
+                    if conteudo and metrica["ttft"] is None:
+                        metrica["ttft"] = time.perf_counter() - inicio
+                    yield conteudo
+            except ollama.ResponseError as erro:
+                if not usar_ferramentas or "does not support tools" not in str(erro):
+                    raise
+                ferramentas = None
+                continue
+            if not chamadas:
+                break
+
+            messages.append({"role": "assistant", "content": "", "tool_calls": chamadas})
+            for chamada in chamadas:
+                nome, argumentos = chamada.function.name, chamada.function.arguments
+                metrica["ferramentas"].append({"nome": nome, "argumentos": dict(argumentos or {})})
+                # O ollama 0.4.x só envia role e content: os resultados seguem a ordem das chamadas
+                messages.append({"role": "tool", "content": ferramentas.executar(nome, argumentos)})
+
+        metrica["segundos"] = time.perf_counter() - inicio
+        self.metricas.append(metrica)
+
+    @instrumentar("llm.resumir")
+    def resumir(self, model_name, resumo, mensagens, limite_tokens):
+        """
+        Pede ao modelo o 'resumo' anterior atualizado com 'mensagens', em até 'limite_tokens'
+        tokens (uma chamada sem streaming e sem ferramentas). É o resumidor usado por
+        chat_memory.MemoriaConversa; retorna None se o servidor falhar.
+        """
+        conversa = "\n".join(f"{PAPEIS.get(m['role'], m['role'])}: {m['content']}" for m in mensagens)
+        messages = [
+            {"role": "system", "content": PROMPT_RESUMO.format(palavras=int(limite_tokens * PALAVRAS_POR_TOKEN))},
+            {"role": "user", "content": f"Resumo anterior:\n{resumo or '(vazio)'}\n\nNovas mensagens:\n{conversa}"},
+        ]
+        try:
+            resposta = self.client.chat(model=model_name, messages=messages, keep_alive=self.keep_alive,
+                                        options={"num_ctx": contexto_modelo(model_name), "num_predict": limite_tokens})
+        except (ollama.ResponseError, ConnectionError, httpx.HTTPError):
+            return None
+        return (resposta["message"]["content"] or "").strip() or None
+
+    def _stream(self, model_name, messages, options, tools, metrica):
+        # Gera (texto, chamadas de ferramenta) de cada trecho da resposta
+        stream = self.client.chat(model=model_name, messages=messages, stream=True, tools=tools,
+                                  keep_alive=self.keep_alive, options=options)
+        for chunk in stream:
+            if chunk.get("done"):
+                metrica["tokens_prompt"] = (metrica.get("tokens_prompt") or 0) + (chunk.get("prompt_eval_count") or 0)
+                metrica["tokens_resposta"] = (metrica.get("tokens_resposta") or 0) + (chunk.get("eval_count") or 0)
+            yield chunk["message"]["content"] or "", chunk["message"].get("tool_calls") or []
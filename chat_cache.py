@@ -0,0 +1,141 @@
+import hashlib
+import re
+import time
+import unicodedata
+
+from database_manager import get_pool
+
+# Validade das respostas em cache, em segundos
+TTL_RESPOSTAS = 24 * 3600
+
+# Máximo de respostas guardadas; acima disso as menos usadas recentemente são descartadas
+MAX_RESPOSTAS = 500
+
+# Tamanho dos trechos em que uma resposta do cache é reenviada ao st.write_stream
+CARACTERES_POR_TRECHO = 24
+
+
+def normalizar_pergunta(texto):
+    """
+    Forma canônica da pergunta: sem acentos, pontuação, maiúsculas e espaços repetidos, para que
+    "Qual a categoria com maior faturamento?" e "qual a categoria com maior faturamento" coincidam.
+    """
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", texto)).strip()
+
+
+class ChatCache:
+    """
+    Cache persistente (SQLite) de respostas do chat.
+    - A chave combina modelo, versão dos dados, modo (com ou sem ferramentas), a pergunta
+      normalizada e a resposta anterior da conversa: perguntas iguais em conversas novas
+      coincidem, mas uma continuação ("e a segunda?") só reaproveita a resposta no mesmo contexto.
+    - Respostas vencem após 'ttl' segundos; acima de 'max_respostas' as menos usadas
+      recentemente são descartadas (LRU).
+    - Acertos, consultas e o tempo de geração economizado ficam gravados no próprio banco.
+    """
+
+    def __init__(self, db_name="chat_cache.db", ttl=TTL_RESPOSTAS, max_respostas=MAX_RESPOSTAS):
+        self.pool = get_pool(db_name)
+        self.ttl = ttl
+        self.max_respostas = max_respostas
+        with self.pool.escrita() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS respostas (
+                    chave TEXT PRIMARY KEY,
+                    modelo TEXT,
+                    pergunta TEXT,
+                    resposta TEXT,
+                    segundos_geracao REAL,
+                    criado_em REAL,
+                    usado_em REAL,
+                    acessos INTEGER DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_respostas_usado_em ON respostas (usado_em);
+                CREATE TABLE IF NOT EXISTS estatisticas (
+                    chave TEXT PRIMARY KEY,
+                    valor REAL
+                );
+                INSERT OR IGNORE INTO estatisticas VALUES ('consultas', 0), ('acertos', 0),
+                                                         ('segundos_economizados', 0);
+            """)
+
+    @staticmethod
+    def chave(modelo, versao, pergunta, contexto="", modo=""):
+        """
+        Chave da resposta: hash de modelo, versão dos dados, modo, pergunta normalizada e contexto.
+        """
+        partes = [modelo, str(versao), modo, normalizar_pergunta(pergunta), normalizar_pergunta(contexto)]
+        return hashlib.sha256("\x1f".join(partes).encode()).hexdigest()
+
+    def get(self, chave):
+        """
+        Retorna a resposta em cache (ou None) e contabiliza a consulta nas estatísticas.
+        """
+        agora = time.time()
+        with self.pool.escrita() as conn:
+            linha = conn.execute("SELECT resposta, segundos_geracao FROM respostas WHERE chave = ? AND criado_em >= ?;",
+                                 (chave, agora - self.ttl)).fetchone()
+            conn.execute("UPDATE estatisticas SET valor = valor + 1 WHERE chave = 'consultas';")
+            if linha is None:
+                return None
+            conn.execute("UPDATE respostas SET usado_em = ?, acessos = acessos + 1 WHERE chave = ?;", (agora, chave))
+            conn.execute("UPDATE estatisticas SET valor = valor + 1 WHERE chave = 'acertos';")
+            conn.execute("UPDATE estatisticas SET valor = valor + ? WHERE chave = 'segundos_economizados';",
+                         (linha[1] or 0,))
+        return linha[0]
+
+    def put(self, chave, resposta, modelo=None, pergunta=None, segundos_geracao=None):
+        """
+        Guarda a resposta e descarta as vencidas e as que passam de 'max_respostas' (LRU).
+        """
+        agora = time.time()
+        with self.pool.escrita() as conn:
+            conn.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?, ?, ?, 0);",
+                         (chave, modelo, pergunta, resposta, segundos_geracao, agora, agora))
+            conn.execute("DELETE FROM respostas WHERE criado_em < ?;", (agora - self.ttl,))
+            conn.execute("""
+                DELETE FROM respostas WHERE chave IN (
+                    SELECT chave FROM respostas ORDER BY usado_em DESC LIMIT -1 OFFSET ?
+                );
+            """, (self.max_respostas,))
+
+    def responder(self, chave, gerar, modelo=None, pergunta=None, metrica=None):
+        """
+        Gerador de trechos de texto: devolve a resposta do cache, em trechos e sem espera, ou
+        consome 'gerar()' (o gerador do modelo) repassando os trechos e guarda a resposta ao final.
+        'metrica["cache"]' indica se a resposta veio do cache.
+        """
+        metrica = {} if metrica is None else metrica
+        resposta = self.get(chave)
+        metrica["cache"] = resposta is not None
+        if resposta is not None:
+            for inicio in range(0, len(resposta), CARACTERES_POR_TRECHO):
+                yield resposta[inicio:inicio + CARACTERES_POR_TRECHO]
+            return
+
+        inicio = time.perf_counter()
+        partes = []
+        for trecho in gerar():
+            partes.append(trecho)
+            yield trecho
+        if "".join(partes).strip():
+            self.put(chave, "".join(partes), modelo, pergunta, time.perf_counter() - inicio)
+
+    def estatisticas(self):
+        """
+        Retorna {consultas, acertos, taxa_acerto, segundos_economizados, respostas}.
+        """
+        with self.pool.leitura() as conn:
+            valores = dict(conn.execute("SELECT chave, valor FROM estatisticas;").fetchall())
+            respostas = conn.execute("SELECT COUNT(*) FROM respostas;").fetchone()[0]
+        consultas = int(valores.get("consultas", 0))
+        acertos = int(valores.get("acertos", 0))
+        return {
+            "consultas": consultas,
+            "acertos": acertos,
+            "taxa_acerto": acertos / consultas if consultas else 0.0,
+            "segundos_economizados": valores.get("segundos_economizados", 0.0),
+            "respostas": respostas,
+        }
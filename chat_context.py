@@ -0,0 +1,82 @@
+import math
+import threading
+
+from summary_cube import obter_cubo
+from instrumentation import instrumentar
+
+# Orçamento padrão, em tokens, do bloco de dados inserido no prompt do chat
+LIMITE_TOKENS_CONTEXTO = 400
+
+# Aproximação usual para modelos com tokenizer BPE: ~4 caracteres por token
+CARACTERES_POR_TOKEN = 4
+
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def estimar_tokens(texto):
+    """
+    Estimativa barata da quantidade de tokens de 'texto' (sem depender do tokenizer do modelo).
+    """
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _secoes(cubo):
+    """
+    Agregados usados no prompt inicial, em ordem de prioridade: (título, itens).
+    """
+    faturamento = cubo.rollup(["Product_line"], ordenar_por="Total")["Total"]
+    return [
+        ("Categorias de produtos disponíveis", list(faturamento.index)),
+        ("Métodos de pagamento mais utilizados", list(cubo.rollup(["Payment"], ordenar_por="vendas").index)),
+        ("Locais das vendas (cidades)", list(cubo.rollup(["City"], ordenar_por="vendas").index)),
+        ("Gêneros atendidos", list(cubo.rollup(["Gender"], ordenar_por="vendas").index)),
+        ("Faturamento por categoria (5 principais)",
+         [f"{categoria}: R$ {total:,.2f}" for categoria, total in faturamento.head(5).items()]),
+    ]
+
+
+def _renderizar(secoes):
+    linhas = []
+    for n, (titulo, itens, omitidos) in enumerate(secoes, start=1):
+        texto = ", ".join(str(item) for item in itens)
+        if omitidos:
+            texto += f" (e mais {omitidos})"
+        linhas.append(f"{n}. {titulo}: {texto}.")
+    return "\n".join(linhas)
+
+
+def construir_contexto(cubo, limite_tokens=LIMITE_TOKENS_CONTEXTO):
+    """
+    Monta o bloco compacto de dados do prompt do chat a partir de um SummaryCube.
+    Só os agregados citados no prompt são renderizados; se o texto passar de 'limite_tokens',
+    a lista mais longa perde itens (indicando quantos foram omitidos) até caber no orçamento.
+    """
+    secoes = [[titulo, itens, 0] for titulo, itens in _secoes(cubo)]
+    texto = _renderizar(secoes)
+    while estimar_tokens(texto) > limite_tokens:
+        maior = max(secoes, key=lambda secao: len(secao[1]))
+        if len(maior[1]) <= 1:
+            break
+        maior[1] = maior[1][:-1]
+        maior[2] += 1
+        texto = _renderizar(secoes)
+    return texto
+
+
+@instrumentar("chat.contexto_dados")
+def contexto_dados(dataset, limite_tokens=LIMITE_TOKENS_CONTEXTO):
+    """
+    Versão em cache de construir_contexto para um SalesDataset: o texto só é refeito quando a
+    versão dos dados de vendas (e, com ela, o cubo de resumo) muda.
+    """
+    cubo = obter_cubo(dataset)
+    versao = cubo.versao
+    chave = (id(dataset), versao, limite_tokens)
+    with _CACHE_LOCK:
+        if chave not in _CACHE:
+            # Mantém apenas a versão mais recente de cada dataset
+            for antiga in [c for c in _CACHE if c[0] == id(dataset) and c[1] != versao]:
+                del _CACHE[antiga]
+            _CACHE[chave] = construir_contexto(cubo, limite_tokens)
+        return _CACHE[chave]
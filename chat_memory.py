@@ -0,0 +1,131 @@
+import re
+
+from chat_context import CARACTERES_POR_TOKEN, estimar_tokens
+
+# Janela de contexto (num_ctx), em tokens, usada para cada família de modelo no Ollama
+CONTEXTO_MODELOS = {
+    "llama3.2": 8192,
+    "llama3.1": 8192,
+    "llama3": 8192,
+    "mistral": 8192,
+    "qwen2.5": 8192,
+    "gemma2": 8192,
+    "phi3": 4096,
+}
+CONTEXTO_PADRAO = 4096
+
+# Parte da janela reservada para a resposta do modelo
+FRACAO_RESPOSTA = 0.25
+
+# Parte da janela que o resumo das mensagens antigas pode ocupar
+FRACAO_RESUMO = 0.15
+
+# Ao compactar, mensagens antigas suficientes são resumidas de uma vez para o prompt voltar a
+# esta fração do orçamento: o resumo pelo modelo acontece a cada alguns turnos, não a cada turno
+FRACAO_APOS_COMPACTACAO = 0.6
+
+# Tamanho máximo, em caracteres, de cada mensagem no resumo truncado (sem o modelo)
+CARACTERES_POR_LINHA_RESUMO = 160
+
+PAPEIS = {"user": "Usuário", "assistant": "Assistente"}
+
+
+def contexto_modelo(model_name):
+    """
+    Janela de contexto (num_ctx) do modelo, pela família do nome (ex.: "llama3.2:3b" -> "llama3.2").
+    """
+    familia = (model_name or "").split(":")[0].split("/")[-1]
+    return CONTEXTO_MODELOS.get(familia, CONTEXTO_PADRAO)
+
+
+def linha_truncada(mensagem):
+    """
+    Linha do resumo truncado para uma mensagem: o papel e o começo do texto, em uma linha só.
+    """
+    texto = re.sub(r"\s+", " ", mensagem["content"]).strip()
+    if len(texto) > CARACTERES_POR_LINHA_RESUMO:
+        texto = texto[:CARACTERES_POR_LINHA_RESUMO - 3].rstrip() + "..."
+    return f"- {PAPEIS.get(mensagem['role'], mensagem['role'])}: {texto}"
+
+
+def resumo_truncado(resumo, mensagens, limite_tokens):
+    """
+    Resumo sem o modelo, usado quando não há resumidor ou ele falha: acrescenta a 'resumo' uma
+    linha por mensagem (linha_truncada) e, passando de 'limite_tokens', descarta as linhas mais
+    antigas. Não é um resumo de fato: o que passa de CARACTERES_POR_LINHA_RESUMO em cada mensagem
+    e, em conversas longas, as primeiras mensagens se perdem.
+    """
+    linhas = [linha for linha in resumo.split("\n") if linha] + [linha_truncada(m) for m in mensagens]
+    while len(linhas) > 1 and estimar_tokens("\n".join(linhas)) > limite_tokens:
+        linhas.pop(0)
+    return "\n".join(linhas)
+
+
+class MemoriaConversa:
+    """
+    Mantém o que é enviado ao modelo dentro do orçamento de tokens da janela de contexto.
+    - As mensagens recentes vão na íntegra.
+    - Quando o total passa do orçamento, as mais antigas saem do histórico enviado e são
+      incorporadas, pelo próprio modelo (o 'resumidor', ex.: ChatBackend.resumir), a um resumo
+      contínuo enviado logo após o prompt de sistema. Saem mensagens suficientes para o prompt
+      voltar a FRACAO_APOS_COMPACTACAO do orçamento, então o resumo não é refeito a cada turno.
+    - O resumo é limitado a FRACAO_RESUMO da janela (o modelo é instruído a respeitar o limite e
+      o texto é cortado se passar). Sem resumidor, ou se ele falhar, usa resumo_truncado, que
+      perde informação das mensagens antigas.
+    Assim o tamanho do prompt (e a latência por turno) fica estável em conversas longas.
+    Guardada no st.session_state; 'compactadas' conta as mensagens do histórico já resumidas.
+    """
+
+    def __init__(self):
+        self.resumo = ""
+        self.compactadas = 0
+
+    def orcamento(self, model_name):
+        """
+        Tokens disponíveis para prompt de sistema, resumo e histórico.
+        """
+        return int(contexto_modelo(model_name) * (1 - FRACAO_RESPOSTA))
+
+    def _mensagem_resumo(self):
+        if not self.resumo:
+            return []
+        return [{"role": "system", "content": "Resumo da conversa até aqui:\n" + self.resumo}]
+
+    def _tokens(self, mensagens):
+        return sum(estimar_tokens(m["content"]) for m in mensagens)
+
+    def _resumir(self, model_name, mensagens, limite_tokens, resumidor):
+        # O resumidor devolve None se o modelo falhar: a conversa segue com o resumo truncado
+        resumo = resumidor(model_name, self.resumo, mensagens, limite_tokens) if resumidor else None
+        if resumo:
+            return resumo[:limite_tokens * CARACTERES_POR_TOKEN]
+        return resumo_truncado(self.resumo, mensagens, limite_tokens)
+
+    def mensagens_para_envio(self, model_name, historico, system=None, resumidor=None):
+        """
+        Retorna a lista de mensagens a enviar: prompt de sistema, resumo e as mensagens recentes
+        de 'historico' (sem mensagens de sistema) que cabem no orçamento do modelo.
+        A última mensagem (a pergunta atual) é sempre enviada na íntegra.
+        'resumidor(model_name, resumo, mensagens, limite_tokens)' devolve o resumo anterior
+        atualizado com as mensagens que saem do histórico enviado, ou None se falhar.
+        """
+        historico = [m for m in historico if m["role"] != "system"]
+        if self.compactadas > len(historico):
+            # Histórico foi limpo ou substituído: recomeça a memória
+            self.resumo, self.compactadas = "", 0
+
+        orcamento = self.orcamento(model_name)
+        limite_resumo = int(contexto_modelo(model_name) * FRACAO_RESUMO)
+        fixas = [{"role": "system", "content": system}] if system else []
+        recentes = historico[self.compactadas:]
+
+        if len(recentes) > 1 and self._tokens(fixas + self._mensagem_resumo() + recentes) > orcamento:
+            alvo = int(orcamento * FRACAO_APOS_COMPACTACAO) - limite_resumo
+            saem = 1
+            while len(recentes) - saem > 1 and self._tokens(fixas + recentes[saem:]) > alvo:
+                saem += 1
+            self.resumo = self._resumir(model_name, recentes[:saem], limite_resumo, resumidor)
+            self.compactadas += saem
+            recentes = recentes[saem:]
+
+        return fixas + self._mensagem_resumo() + recentes
@@ -0,0 +1,160 @@
+import json
+
+from database_manager import AGREGACOES, COLUNAS_SEGMENTACAO, DIMENSOES_DERIVADAS
+from pricing_engine import obter_precos
+from recommender import obter_regras
+
+# Máximo de linhas devolvidas ao modelo por chamada de ferramenta
+LIMITE_LINHAS_RESULTADO = 30
+
+# Tempo máximo, em segundos, de cada consulta feita por uma ferramenta
+TIMEOUT_CONSULTA = 2.0
+
+DIMENSOES_FERRAMENTA = ["Branch", "City", "Customer_type", "Gender", "Product_line", "Payment"]
+MEDIDAS_FERRAMENTA = ["Total", "Quantity", "gross_income", "Unit_price", "cogs", "Tax_5", "Rating"]
+
+# Níveis de otimização de preço oferecidos ao modelo -> chaves do PricingEngine
+NIVEIS_PRECO = {"Produto": ["Product_line"], "Produto e Cidade": ["Product_line", "City"]}
+
+# Complemento do prompt de sistema quando as ferramentas estão ativas
+INSTRUCOES_FERRAMENTAS = """
+    Você tem acesso a ferramentas que consultam o banco de dados do supermercado. Sempre que a pergunta
+    envolver números (faturamento, quantidades, médias, preços, recomendações), chame a ferramenta
+    adequada e responda com base no resultado, sem inventar valores.
+    """
+
+FERRAMENTAS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "consultar_vendas",
+            "description": "Agrega as vendas do supermercado (soma, média, mínimo, máximo ou contagem) "
+                           "agrupando por dimensões e aplicando filtros. Month é o mês (YYYY-MM) e "
+                           "Weekday o dia da semana (0 = domingo).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "agrupar_por": {"type": "array", "items": {
+                        "type": "string", "enum": DIMENSOES_FERRAMENTA + list(DIMENSOES_DERIVADAS)}},
+                    "medida": {"type": "string", "enum": MEDIDAS_FERRAMENTA},
+                    "agregacao": {"type": "string", "enum": list(AGREGACOES)},
+                    "filtros": {"type": "object", "description": "Valores exatos por dimensão, ex.: {\"City\": \"Yangon\"}",
+                                "properties": {d: {"type": "string"} for d in DIMENSOES_FERRAMENTA}},
+                    "data_inicio": {"type": "string", "description": "YYYY-MM-DD"},
+                    "data_fim": {"type": "string", "description": "YYYY-MM-DD"},
+                    "ordem": {"type": "string", "enum": ["desc", "asc"]},
+                    "limite": {"type": "integer"},
+                },
+                "required": ["medida", "agregacao"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "melhores_precos",
+            "description": "Preço que maximiza o lucro em cada segmento (últimos 3 meses), com o último "
+                           "preço praticado e a demanda capturada.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "nivel": {"type": "string", "enum": list(NIVEIS_PRECO)},
+                    "produto": {"type": "string", "description": "Filtra uma linha de produto"},
+                },
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "recomendacoes",
+            "description": "Regras de associação (quem compra a categoria A também compra B) por filial, "
+                           "gênero e tipo de cliente, ordenadas por confiança.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "Branch": {"type": "string"},
+                    "Gender": {"type": "string"},
+                    "Customer_type": {"type": "string"},
+                    "top": {"type": "integer"},
+                },
+            },
+        },
+    },
+]
+
+
+def _limitar(valor, padrao):
+    try:
+        return max(1, min(int(valor), LIMITE_LINHAS_RESULTADO))
+    except (TypeError, ValueError):
+        return padrao
+
+
+class FerramentasChat:
+    """
+    Ferramentas que o modelo do chat pode chamar para responder a partir do banco.
+    - Só existem as consultas de FERRAMENTAS; os argumentos do modelo viram parâmetros
+      validados (nunca SQL livre) e as leituras usam as conexões somente leitura do pool.
+    - Cada resultado é limitado a LIMITE_LINHAS_RESULTADO linhas e devolvido como JSON compacto.
+    - 'precos(chaves)' (opcional) retorna a tabela de melhores preços; por padrão a pré-calculada
+      pelo batch_cli, se está em dia, ou a de um PricingEngine sincronizado com o banco na chamada.
+    """
+
+    definicoes = FERRAMENTAS
+
+    def __init__(self, db, precos=None):
+        self.db = db
+        self.precos = precos or (lambda chaves: obter_precos(db, chaves))
+
+    def executar(self, nome, argumentos):
+        """
+        Executa a ferramenta 'nome' e retorna o resultado em texto. Erros (argumentos inválidos,
+        tempo esgotado) também voltam como texto, para o modelo poder corrigir a chamada.
+        """
+        funcoes = {"consultar_vendas": self.consultar_vendas, "melhores_precos": self.melhores_precos,
+                   "recomendacoes": self.recomendacoes}
+        if nome not in funcoes:
+            return json.dumps({"erro": f"Ferramenta desconhecida: {nome}"}, ensure_ascii=False)
+        try:
+            resultado = funcoes[nome](**(argumentos or {}))
+        except (TypeError, ValueError, TimeoutError) as erro:
+            return json.dumps({"erro": str(erro)}, ensure_ascii=False)
+        return resultado.to_json(orient="records", force_ascii=False, double_precision=2)
+
+    def consultar_vendas(self, medida, agregacao, agrupar_por=None, filtros=None, data_inicio=None,
+                         data_fim=None, ordem="desc", limite=10):
+        if medida not in MEDIDAS_FERRAMENTA:
+            raise ValueError(f"Medida inválida: {medida!r}. Use uma de {MEDIDAS_FERRAMENTA}")
+        agrupar_por = [agrupar_por] if isinstance(agrupar_por, str) else list(agrupar_por or [])
+        invalidas = [d for d in agrupar_por + list(filtros or {})
+                     if d not in DIMENSOES_FERRAMENTA and d not in DIMENSOES_DERIVADAS]
+        if invalidas:
+            raise ValueError(f"Dimensões inválidas: {invalidas}")
+        filtros = {d: v for d, v in (filtros or {}).items() if v not in (None, "")}
+
+        return self.db.aggregate_sales(
+            agrupar_por, [(agregacao, "*" if agregacao == "count" else medida)], filtros=filtros,
+            data_inicio=data_inicio or None, data_fim=data_fim or None, descendente=ordem != "asc",
+            limite=_limitar(limite, 10), timeout=TIMEOUT_CONSULTA)
+
+    def melhores_precos(self, nivel="Produto", produto=None):
+        if nivel not in NIVEIS_PRECO:
+            raise ValueError(f"Nível inválido: {nivel!r}. Use um de {list(NIVEIS_PRECO)}")
+        tabela = self.precos(NIVEIS_PRECO[nivel])
+        if produto:
+            tabela = tabela[tabela["Produto"] == produto]
+        return tabela.head(LIMITE_LINHAS_RESULTADO)
+
+    def recomendacoes(self, top=5, **segmento):
+        invalidas = set(segmento) - set(COLUNAS_SEGMENTACAO)
+        if invalidas:
+            raise ValueError(f"Segmentação inválida: {sorted(invalidas)}")
+        segmento = {c: v for c, v in segmento.items() if v not in (None, "")}
+        colunas = [c for c in COLUNAS_SEGMENTACAO if c in segmento] or list(COLUNAS_SEGMENTACAO)
+
+        regras, _ = obter_regras(self.db, colunas)
+        for coluna, valor in segmento.items():
+            regras = regras[regras[coluna] == valor]
+        regras = regras.sort_values("confidence", ascending=False, kind="stable")
+        return regras[colunas + ["antecedente", "consequente", "confidence", "lift"]].head(_limitar(top, 5))
@@ -1,17 +1,594 @@
+import atexit
+import csv
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+
+import pandas as pd
+
+from instrumentation import instrumentar
+
+# Colunas da tabela supermarket_sales, na ordem em que foram criadas
+COLUNAS_VENDAS = [
+    "Invoice_ID",
+    "Branch",
+    "City",
+    "Customer_type",
+    "Gender",
+    "Product_line",
+    "Unit_price",
+    "Quantity",
+    "Tax_5",
+    "Total",
+    "Date",
+    "Time",
+    "Payment",
+    "cogs",
+    "gross_margin_percentage",
+    "gross_income",
+    "Rating",
+]
+
+# Mapeamento dos cabeçalhos do supermarket_sales.csv para as colunas da tabela
+COLUNAS_CSV = {
+    "Invoice ID": "Invoice_ID",
+    "Customer type": "Customer_type",
+    "Product line": "Product_line",
+    "Unit price": "Unit_price",
+    "Tax 5%": "Tax_5",
+    "gross margin percentage": "gross_margin_percentage",
+    "gross income": "gross_income",
+}
+
+# Data da venda em ISO (YYYY-MM-DD), derivada da coluna Date (M/D/YYYY) pelo próprio SQLite
+_EXPR_DATE_ISO = """printf('%04d-%02d-%02d',
+    substr(Date, instr(Date, '/') + instr(substr(Date, instr(Date, '/') + 1), '/') + 1),
+    substr(Date, 1, instr(Date, '/') - 1),
+    substr(Date, instr(Date, '/') + 1, instr(substr(Date, instr(Date, '/') + 1), '/') - 1))"""
+
+# Grão mais fino das tabelas materializadas de precificação (além do dia e do preço)
+GRAO_PRECOS = ["Product_line", "Branch", "City", "Customer_type", "Gender", "Payment"]
+
+
+def _sql_cubo_precos(grao):
+    """
+    Script que recria demand_curve e last_price no grão 'grao' (+ dia), com carga inicial e
+    triggers que as mantêm atualizadas a cada venda inserida, alterada ou apagada.
+    """
+    colunas = ", ".join(grao)
+    novas = ", ".join(f"NEW.{c}" for c in grao)
+    do_old = " AND ".join(f"{c} = OLD.{c}" for c in grao + ["Date_iso"])
+    definicoes = "\n".join(f"        {c} TEXT NOT NULL," for c in grao)
+    adicionar_new = f"""
+        INSERT INTO demand_curve VALUES ({novas}, NEW.Date_iso, NEW.Unit_price, NEW.Quantity, 1)
+            ON CONFLICT ({colunas}, Date_iso, Unit_price)
+            DO UPDATE SET Quantity = Quantity + excluded.Quantity, vendas = vendas + 1;
+        INSERT INTO last_price VALUES ({novas}, NEW.Date_iso, NEW.rowid, NEW.Unit_price, NEW.gross_income)
+            ON CONFLICT ({colunas}, Date_iso)
+            DO UPDATE SET sale_rowid = excluded.sale_rowid, Unit_price = excluded.Unit_price,
+                          gross_income = excluded.gross_income
+            WHERE excluded.sale_rowid >= last_price.sale_rowid;"""
+    remover_old = f"""
+        UPDATE demand_curve SET Quantity = Quantity - OLD.Quantity, vendas = vendas - 1
+            WHERE {do_old} AND Unit_price = OLD.Unit_price;
+        DELETE FROM demand_curve WHERE {do_old} AND Unit_price = OLD.Unit_price AND vendas <= 0;
+        DELETE FROM last_price WHERE {do_old} AND sale_rowid = OLD.rowid;
+        INSERT OR IGNORE INTO last_price
+            SELECT {colunas}, Date_iso, rowid, Unit_price, gross_income FROM supermarket_sales
+            WHERE rowid = (SELECT MAX(rowid) FROM supermarket_sales WHERE {do_old});"""
+    return f"""
+    DROP TRIGGER IF EXISTS trg_sales_insert;
+    DROP TRIGGER IF EXISTS trg_sales_delete;
+    DROP TRIGGER IF EXISTS trg_sales_update;
+    DROP TABLE IF EXISTS demand_curve;
+    DROP TABLE IF EXISTS last_price;
+
+    CREATE TABLE demand_curve (
+{definicoes}
+        Date_iso TEXT NOT NULL,
+        Unit_price REAL NOT NULL,
+        Quantity INTEGER NOT NULL,
+        vendas INTEGER NOT NULL,
+        PRIMARY KEY ({colunas}, Date_iso, Unit_price)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_demand_curve_data ON demand_curve (Date_iso);
+
+    CREATE TABLE last_price (
+{definicoes}
+        Date_iso TEXT NOT NULL,
+        sale_rowid INTEGER NOT NULL,
+        Unit_price REAL NOT NULL,
+        gross_income REAL NOT NULL,
+        PRIMARY KEY ({colunas}, Date_iso)
+    ) WITHOUT ROWID;
+
+    {';'.join(_sql_carga_cubo(grao))};
+
+    CREATE TRIGGER trg_sales_insert AFTER INSERT ON supermarket_sales
+    BEGIN
+        {adicionar_new}
+    END;
+
+    CREATE TRIGGER trg_sales_delete AFTER DELETE ON supermarket_sales
+    BEGIN
+        {remover_old}
+    END;
+
+    CREATE TRIGGER trg_sales_update
+    AFTER UPDATE OF {colunas}, Date, Unit_price, Quantity, gross_income ON supermarket_sales
+    BEGIN
+        {remover_old}
+        {adicionar_new}
+    END;
+    """
+
+
+def _sql_carga_cubo(grao, incremental=False):
+    """
+    Comandos que carregam demand_curve e last_price, no grão 'grao' (+ dia), com um único
+    INSERT ... SELECT ... GROUP BY cada, a partir de todas as vendas. Com 'incremental', somam
+    às tabelas só as vendas com rowid acima do parâmetro :rowid (as inseridas depois dele).
+    """
+    colunas = ", ".join(grao)
+    novas = "WHERE rowid > :rowid" if incremental else ""
+    demanda = f"""
+        INSERT INTO demand_curve
+            SELECT {colunas}, Date_iso, Unit_price, SUM(Quantity), COUNT(*)
+            FROM supermarket_sales {novas} GROUP BY {colunas}, Date_iso, Unit_price"""
+    ultimo = f"""
+        INSERT INTO last_price
+            SELECT {colunas}, Date_iso, rowid, Unit_price, gross_income FROM supermarket_sales
+            WHERE rowid IN (SELECT MAX(rowid) FROM supermarket_sales {novas} GROUP BY {colunas}, Date_iso)"""
+    if incremental:
+        demanda += f"""
+            ON CONFLICT ({colunas}, Date_iso, Unit_price)
+            DO UPDATE SET Quantity = Quantity + excluded.Quantity, vendas = vendas + excluded.vendas"""
+        ultimo += f"""
+            ON CONFLICT ({colunas}, Date_iso)
+            DO UPDATE SET sale_rowid = excluded.sale_rowid, Unit_price = excluded.Unit_price,
+                          gross_income = excluded.gross_income
+            WHERE excluded.sale_rowid >= last_price.sale_rowid"""
+    return [demanda, ultimo]
+
+
+# Triggers que mantêm demand_curve e last_price, suspensos durante as cargas em lote
+TRIGGERS_CUBO = ("trg_sales_insert", "trg_sales_delete", "trg_sales_update")
+
+# A partir de quantas linhas um lote de insert_many suspende os triggers de TRIGGERS_CUBO
+# e atualiza demand_curve e last_price com um INSERT ... SELECT ... GROUP BY
+LOTE_MINIMO_CARGA_EM_MASSA = 1000
+
+
+# Migrações de schema, aplicadas em ordem; a posição na lista + 1 é o PRAGMA user_version
+MIGRACOES = [
+    # 1: coluna de data ordenável e índices para filtros por segmento e período
+    f"""
+    ALTER TABLE supermarket_sales
+        ADD COLUMN Date_iso TEXT GENERATED ALWAYS AS ({_EXPR_DATE_ISO}) VIRTUAL;
+    CREATE INDEX IF NOT EXISTS idx_sales_produto_cidade_data
+        ON supermarket_sales (Product_line, City, Date_iso, Unit_price, Quantity, gross_income);
+    CREATE INDEX IF NOT EXISTS idx_sales_filial_data
+        ON supermarket_sales (Branch, Date_iso);
+    """,
+    # 2: curva de demanda e último preço materializados, mantidos por triggers
+    """
+    CREATE TABLE IF NOT EXISTS demand_curve (
+        Product_line TEXT NOT NULL,
+        City TEXT NOT NULL,
+        Date_iso TEXT NOT NULL,
+        Unit_price REAL NOT NULL,
+        Quantity INTEGER NOT NULL,
+        vendas INTEGER NOT NULL,
+        PRIMARY KEY (Product_line, City, Date_iso, Unit_price)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_demand_curve_data ON demand_curve (Date_iso);
+
+    CREATE TABLE IF NOT EXISTS last_price (
+        Product_line TEXT NOT NULL,
+        City TEXT NOT NULL,
+        sale_rowid INTEGER NOT NULL,
+        Unit_price REAL NOT NULL,
+        gross_income REAL NOT NULL,
+        PRIMARY KEY (Product_line, City)
+    ) WITHOUT ROWID;
+
+    INSERT INTO demand_curve
+        SELECT Product_line, City, Date_iso, Unit_price, SUM(Quantity), COUNT(*)
+        FROM supermarket_sales GROUP BY Product_line, City, Date_iso, Unit_price;
+    INSERT INTO last_price
+        SELECT Product_line, City, rowid, Unit_price, gross_income FROM supermarket_sales
+        WHERE rowid IN (SELECT MAX(rowid) FROM supermarket_sales GROUP BY Product_line, City);
+
+    CREATE TRIGGER IF NOT EXISTS trg_sales_insert AFTER INSERT ON supermarket_sales
+    BEGIN
+        {adicionar_new}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_sales_delete AFTER DELETE ON supermarket_sales
+    BEGIN
+        {remover_old}
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_sales_update
+    AFTER UPDATE OF Product_line, City, Date, Unit_price, Quantity, gross_income ON supermarket_sales
+    BEGIN
+        {remover_old}
+        {adicionar_new}
+    END;
+    """.format(
+        adicionar_new="""
+        INSERT INTO demand_curve VALUES (NEW.Product_line, NEW.City, NEW.Date_iso, NEW.Unit_price, NEW.Quantity, 1)
+            ON CONFLICT (Product_line, City, Date_iso, Unit_price)
+            DO UPDATE SET Quantity = Quantity + excluded.Quantity, vendas = vendas + 1;
+        INSERT INTO last_price VALUES (NEW.Product_line, NEW.City, NEW.rowid, NEW.Unit_price, NEW.gross_income)
+            ON CONFLICT (Product_line, City)
+            DO UPDATE SET sale_rowid = excluded.sale_rowid, Unit_price = excluded.Unit_price,
+                          gross_income = excluded.gross_income
+            WHERE excluded.sale_rowid >= last_price.sale_rowid;""",
+        remover_old="""
+        UPDATE demand_curve SET Quantity = Quantity - OLD.Quantity, vendas = vendas - 1
+            WHERE Product_line = OLD.Product_line AND City = OLD.City
+              AND Date_iso = OLD.Date_iso AND Unit_price = OLD.Unit_price;
+        DELETE FROM demand_curve
+            WHERE Product_line = OLD.Product_line AND City = OLD.City
+              AND Date_iso = OLD.Date_iso AND Unit_price = OLD.Unit_price AND vendas <= 0;
+        DELETE FROM last_price
+            WHERE Product_line = OLD.Product_line AND City = OLD.City AND sale_rowid = OLD.rowid;
+        INSERT OR IGNORE INTO last_price
+            SELECT Product_line, City, rowid, Unit_price, gross_income FROM supermarket_sales
+            WHERE rowid = (SELECT MAX(rowid) FROM supermarket_sales
+                           WHERE Product_line = OLD.Product_line AND City = OLD.City);""",
+    ),
+    # 3: versão dos dados de vendas e regras de associação persistidas por segmentação
+    """
+    CREATE TABLE IF NOT EXISTS sales_meta (
+        chave TEXT PRIMARY KEY,
+        valor INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO sales_meta VALUES ('versao', 1);
+
+    CREATE TRIGGER IF NOT EXISTS trg_sales_versao_insert AFTER INSERT ON supermarket_sales
+    BEGIN
+        UPDATE sales_meta SET valor = valor + 1 WHERE chave = 'versao';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_sales_versao_update AFTER UPDATE ON supermarket_sales
+    BEGIN
+        UPDATE sales_meta SET valor = valor + 1 WHERE chave = 'versao';
+    END;
+    CREATE TRIGGER IF NOT EXISTS trg_sales_versao_delete AFTER DELETE ON supermarket_sales
+    BEGIN
+        UPDATE sales_meta SET valor = valor + 1 WHERE chave = 'versao';
+    END;
+
+    CREATE TABLE IF NOT EXISTS recommendation_runs (
+        segmentacao TEXT PRIMARY KEY,
+        data_version INTEGER NOT NULL,
+        segmentos TEXT NOT NULL,
+        gerado_em TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS recommendation_rules (
+        segmentacao TEXT NOT NULL,
+        Branch TEXT,
+        Gender TEXT,
+        Customer_type TEXT,
+        antecedente TEXT NOT NULL,
+        consequente TEXT NOT NULL,
+        antecedent_support REAL NOT NULL,
+        consequent_support REAL NOT NULL,
+        support REAL NOT NULL,
+        confidence REAL NOT NULL,
+        lift REAL NOT NULL,
+        leverage REAL,
+        conviction REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_rules_segmento
+        ON recommendation_rules (segmentacao, Branch, Gender, Customer_type, confidence);
+    """,
+    # 4: demand_curve e last_price no grão mais fino (GRAO_PRECOS + dia), agregáveis por qualquer chave
+    _sql_cubo_precos(GRAO_PRECOS),
+    # 5: melhores preços pré-calculados (ex.: pelo batch_cli) por combinação de chaves e período
+    f"""
+    CREATE TABLE IF NOT EXISTS price_runs (
+        chaves TEXT NOT NULL,
+        meses INTEGER NOT NULL,
+        data_version INTEGER NOT NULL,
+        gerado_em TEXT NOT NULL,
+        PRIMARY KEY (chaves, meses)
+    );
+    CREATE TABLE IF NOT EXISTS best_prices (
+        chaves TEXT NOT NULL,
+        meses INTEGER NOT NULL,
+        {" ".join(f"{c} TEXT," for c in GRAO_PRECOS + ["Month", "Weekday"])}
+        melhor_preco REAL,
+        ultimo_preco REAL,
+        diferenca_preco REAL,
+        demanda_capturada REAL,
+        demanda_atual_capturada REAL,
+        diferenca_demanda REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_best_prices_chaves ON best_prices (chaves, meses);
+    """,
+]
+
+# Colunas que segmentam as regras de associação
+COLUNAS_SEGMENTACAO = ["Branch", "Gender", "Customer_type"]
+
+# Métricas guardadas para cada regra de associação
+COLUNAS_METRICAS_REGRAS = [
+    "antecedent_support",
+    "consequent_support",
+    "support",
+    "confidence",
+    "lift",
+    "leverage",
+    "conviction",
+]
+
+
+# Colunas que podem ser usadas em consultas e filtros (inclui as derivadas pelas migrações)
+COLUNAS_CONSULTA = COLUNAS_VENDAS + ["Date_iso", "rowid"]
+
+# Operadores aceitos nos filtros no formato {coluna: {operador: valor}}
+OPERADORES = ("=", "!=", "<", "<=", ">", ">=")
+
+# Cláusulas aceitas para tratar Invoice_ID repetido na carga em lote
+CONFLITOS = {"abort": "INSERT", "ignore": "INSERT OR IGNORE", "replace": "INSERT OR REPLACE"}
+
+# Funções de agregação aceitas em aggregate_sales
+AGREGACOES = {"sum": "SUM", "avg": "AVG", "min": "MIN", "max": "MAX", "count": "COUNT"}
+
+# Dimensões derivadas de Date_iso que podem ser usadas no agrupamento de aggregate_sales
+DIMENSOES_DERIVADAS = {"Month": "substr(Date_iso, 1, 7)", "Weekday": "strftime('%w', Date_iso)"}
+
+# Chaves de segmentação das tabelas materializadas: o grão e os períodos derivados do dia
+CHAVES_MATERIALIZADAS = GRAO_PRECOS + list(DIMENSOES_DERIVADAS)
+
+# Métricas de cada segmento na tabela best_prices
+COLUNAS_METRICAS_PRECOS = [
+    "melhor_preco",
+    "ultimo_preco",
+    "diferenca_preco",
+    "demanda_capturada",
+    "demanda_atual_capturada",
+    "diferenca_demanda",
+]
+
+# Limite de linhas de aggregate_sales, qualquer que seja o 'limite' pedido
+LIMITE_MAXIMO_LINHAS = 200
+
+
+# PRAGMAs aplicados em toda conexão aberta pelo pool
+PRAGMAS = {
+    "synchronous": "NORMAL",     # seguro com WAL e evita um fsync por commit
+    "cache_size": -64000,        # ~64 MB de cache de páginas por conexão
+    "mmap_size": 268435456,      # 256 MB lidos via memória mapeada
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,        # espera o escritor em vez de falhar com "database is locked"
+    "recursive_triggers": "ON",  # INSERT OR REPLACE também dispara os triggers de DELETE
+}
+
+
+class ConnectionPool:
+    """
+    Pool de conexões SQLite compartilhado pelo processo.
+    - O banco é colocado em modo WAL, então leitores não bloqueiam o escritor (e vice-versa).
+    - Leituras usam conexões somente leitura emprestadas de uma fila (até 'max_leitores').
+    - Escritas passam por uma única conexão, serializada por um lock.
+    """
+
+    def __init__(self, db_name, max_leitores=8, pragmas=PRAGMAS):
+        self.db_name = db_name
+        self.max_leitores = max_leitores
+        self.pragmas = dict(pragmas)
+        self._leitores = queue.LifoQueue()
+        self._abertos = 0
+        self._lock_pool = threading.Lock()
+        self._lock_escrita = threading.RLock()
+        self._escritor = None
+        self._local = threading.local()
+        self.migrado = False
+
+    def _conectar(self, somente_leitura):
+        # check_same_thread=False: a conexão pode ser usada por qualquer thread do Streamlit,
+        # o pool garante que apenas uma thread a use por vez.
+        conn = sqlite3.connect(self.db_name, check_same_thread=False)
+        for nome, valor in self.pragmas.items():
+            conn.execute(f"PRAGMA {nome} = {valor};")
+        if somente_leitura:
+            conn.execute("PRAGMA query_only = ON;")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL;")
+        return conn
+
+    @contextmanager
+    def leitura(self, timeout=30):
+        """
+        Empresta uma conexão de leitura do pool e a devolve ao final do bloco 'with'.
+        Dentro de um snapshot(), devolve a conexão do snapshot da thread atual.
+        """
+        conn = getattr(self._local, "snapshot", None)
+        if conn is not None:
+            yield conn
+            return
+        try:
+            conn = self._leitores.get_nowait()
+        except queue.Empty:
+            with self._lock_pool:
+                criar = self._abertos < self.max_leitores
+                if criar:
+                    self._abertos += 1
+            if criar:
+                # Garante o modo WAL antes da primeira leitura
+                with self.escrita():
+                    pass
+                conn = self._conectar(somente_leitura=True)
+            else:
+                conn = self._leitores.get(timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self._leitores.put(conn)
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Abre uma transação de leitura: todas as leituras da thread dentro do bloco 'with'
+        enxergam o mesmo estado do banco, mesmo que outra conexão escreva no meio.
+        Um snapshot aberto dentro de outro, na mesma thread, apenas reutiliza o de fora.
+        """
+        if getattr(self._local, "snapshot", None) is not None:
+            yield self._local.snapshot
+            return
+        with self.leitura() as conn:
+            conn.execute("BEGIN;")
+            self._local.snapshot = conn
+            try:
+                yield conn
+            finally:
+                self._local.snapshot = None
+                conn.execute("COMMIT;")
+
+    @contextmanager
+    def escrita(self):
+        """
+        Entrega a conexão escritora dentro de uma transação: commit ao final do bloco,
+        rollback em caso de exceção. Apenas uma thread escreve por vez.
+        """
+        with self._lock_escrita:
+            if self._escritor is None:
+                self._escritor = self._conectar(somente_leitura=False)
+            with self._escritor:
+                yield self._escritor
+
+    def close(self):
+        """
+        Fecha todas as conexões ociosas e a conexão escritora.
+        """
+        while True:
+            try:
+                self._leitores.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock_pool:
+            self._abertos = 0
+        with self._lock_escrita:
+            if self._escritor is not None:
+                self._escritor.close()
+                self._escritor = None
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_name="supermarket_sales.db"):
+    """
+    Retorna o ConnectionPool do processo para 'db_name', criando-o na primeira chamada.
+    """
+    chave = os.path.abspath(db_name)
+    with _POOLS_LOCK:
+        if chave not in _POOLS:
+            _POOLS[chave] = ConnectionPool(db_name)
+        return _POOLS[chave]
+
+
+@atexit.register
+def _fechar_pools():
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.close()
+
+
+def _data_iso(valor):
+    """
+    Converte date/datetime/Timestamp (ou texto já em ISO) para 'YYYY-MM-DD'.
+    """
+    if hasattr(valor, "strftime"):
+        return valor.strftime("%Y-%m-%d")
+    return str(valor)
+
+
+def _validar_colunas(colunas):
+    invalidas = set(colunas) - set(COLUNAS_CONSULTA)
+    if invalidas:
+        raise ValueError(f"Colunas inexistentes em supermarket_sales: {sorted(invalidas)}")
+    return list(colunas)
+
+
+def _montar_where(filtros=None, data_inicio=None, data_fim=None):
+    """
+    Monta a cláusula WHERE e seus parâmetros.
+    - 'filtros' é um dicionário {coluna: valor}; listas, tuplas e conjuntos viram IN (...)
+      e dicionários {operador: valor} viram comparações, ex.: {"Unit_price": {">=": 10}}.
+    - 'data_inicio' e 'data_fim' filtram Date_iso (intervalo fechado).
+    """
+    condicoes, params = [], []
+    for coluna, valor in (filtros or {}).items():
+        _validar_colunas([coluna])
+        if isinstance(valor, dict):
+            for operador, limite in valor.items():
+                if operador not in OPERADORES:
+                    raise ValueError(f"Operador inválido: {operador!r}. Use um de {list(OPERADORES)}")
+                condicoes.append(f"{coluna} {operador} ?")
+                params.append(limite)
+        elif isinstance(valor, (list, tuple, set)):
+            valor = list(valor)
+            condicoes.append(f"{coluna} IN ({', '.join('?' * len(valor))})")
+            params.extend(valor)
+        else:
+            condicoes.append(f"{coluna} = ?")
+            params.append(valor)
+    if data_inicio is not None:
+        condicoes.append("Date_iso >= ?")
+        params.append(_data_iso(data_inicio))
+    if data_fim is not None:
+        condicoes.append("Date_iso <= ?")
+        params.append(_data_iso(data_fim))
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return where, params
+
+
+@contextmanager
+def _tempo_limite(conn, segundos):
+    """
+    Interrompe (sqlite3.OperationalError: interrupted) consultas da conexão que passarem de
+    'segundos', verificando o relógio a cada alguns milhares de instruções da VM do SQLite.
+    """
+    if segundos is None:
+        yield conn
+        return
+    prazo = time.monotonic() + segundos
+    conn.set_progress_handler(lambda: time.monotonic() > prazo, 10000)
+    try:
+        yield conn
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def _lotes(iteravel, tamanho):
+    """
+    Divide um iterável em listas de no máximo 'tamanho' elementos, sem materializar tudo.
+    """
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
 
 class DatabaseManager:
-    def __init__(self, db_name="supermarket_sales.db"):
+    def __init__(self, db_name="supermarket_sales.db", pool=None):
         """
-        Construtor da classe: cria a conexão e chama a criação da tabela (caso não exista).
+        Construtor da classe: usa o pool de conexões do processo para 'db_name'.
+        Nenhuma conexão é aberta aqui; leituras e escritas emprestam conexões do pool.
         """
         self.db_name = db_name
-        self.conn = sqlite3.connect(self.db_name)
-        print(self.conn.execute("""SELECT name FROM sqlite_master
-                                        WHERE type='table'
-                                        ORDER BY name;"""))
-        
-        # self.create_table()
+        self.pool = pool or get_pool(db_name)
+        if not self.pool.migrado:
+            self.migrate()
 
     def create_table(self):
         """
@@ -19,66 +596,491 @@ class DatabaseManager:
         """
         query = """
             CREATE TABLE IF NOT EXISTS supermarket_sales (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                Product_line TEXT,
-                Date TEXT,
-                Unit_price REAL,
-                Quantity INTEGER,
-                gross_income REAL
+                Invoice_ID TEXT PRIMARY KEY,
+                Branch TEXT NOT NULL,
+                City TEXT NOT NULL,
+                Customer_type TEXT NOT NULL,
+                Gender TEXT NOT NULL,
+                Product_line TEXT NOT NULL,
+                Unit_price REAL NOT NULL,
+                Quantity INTEGER NOT NULL,
+                Tax_5 REAL NOT NULL,
+                Total REAL NOT NULL,
+                Date TEXT NOT NULL,
+                Time TEXT NOT NULL,
+                Payment TEXT NOT NULL,
+                cogs REAL NOT NULL,
+                gross_margin_percentage REAL NOT NULL,
+                gross_income REAL NOT NULL,
+                Rating REAL NOT NULL
             );
         """
-        self.conn.execute(query)
-        self.conn.commit()
+        with self.pool.escrita() as conn:
+            conn.execute(query)
 
-    def insert_data(self, Product_line, Date, Unit_price, Quantity, gross_income):
+    def migrate(self):
         """
-        Insere um novo registro na tabela supermarket_sales.
+        Aplica as migrações de MIGRACOES ainda não executadas, controladas pelo PRAGMA user_version.
+        Cada migração roda em uma transação própria junto com a atualização da versão.
         """
-        query = """
-            INSERT INTO supermarket_sales (Product_line, Date, Unit_price, Quantity, gross_income)
-            VALUES (?, ?, ?, ?, ?);
+        self.create_table()
+        with self.pool.escrita() as conn:
+            versao = conn.execute("PRAGMA user_version;").fetchone()[0]
+            for numero, script in enumerate(MIGRACOES[versao:], start=versao + 1):
+                conn.executescript(f"BEGIN; {script} PRAGMA user_version = {numero}; COMMIT;")
+            self.pool.migrado = True
+
+    def insert_data(self, **valores):
+        """
+        Insere uma venda na tabela supermarket_sales, com os valores passados por coluna
+        (ex.: insert_data(Invoice_ID="750-67-8428", Branch="A", ...)), via insert_many.
+        Retorna o mesmo dicionário de estatísticas de insert_many.
+        """
+        return self.insert_many([tuple(valores.values())], colunas=list(valores))
+
+    def insert_many(self, registros, colunas=COLUNAS_VENDAS, tamanho_lote=5000, conflito="abort"):
+        """
+        Insere vários registros na tabela supermarket_sales com executemany.
+        - 'registros' é um iterável de tuplas (na ordem de 'colunas') ou de dicionários.
+        - Cada lote de 'tamanho_lote' linhas é gravado em uma única transação (um commit por lote).
+        - 'conflito' define o que fazer com Invoice_ID repetido: "abort", "ignore" ou "replace".
+        - Lotes a partir de LOTE_MINIMO_CARGA_EM_MASSA linhas atualizam demand_curve e last_price
+          de uma vez (_inserir_em_massa) em vez de linha a linha pelos triggers.
+
+        Retorna um dicionário com as linhas lidas, as efetivamente inseridas, o tempo gasto
+        e as linhas por segundo.
         """
-        self.conn.execute(query, (Product_line, Date, Unit_price, Quantity, gross_income))
-        self.conn.commit()
+        colunas = list(colunas)
+        invalidas = set(colunas) - set(COLUNAS_VENDAS)
+        if invalidas:
+            raise ValueError(f"Colunas inexistentes em supermarket_sales: {sorted(invalidas)}")
+        if conflito not in CONFLITOS:
+            raise ValueError(f"Conflito inválido: {conflito!r}. Use um de {list(CONFLITOS)}")
 
+        query = f"""
+            {CONFLITOS[conflito]} INTO supermarket_sales ({', '.join(colunas)})
+            VALUES ({', '.join('?' * len(colunas))});
+        """
+        inicio = time.perf_counter()
+        total = inseridas = 0
+        for lote in _lotes(registros, tamanho_lote):
+            if isinstance(lote[0], dict):
+                lote = [tuple(registro[c] for c in colunas) for registro in lote]
+            # O bloco 'with' abre a transação e faz um único commit ao final do lote
+            with self.pool.escrita() as conn:
+                if len(lote) >= LOTE_MINIMO_CARGA_EM_MASSA:
+                    inseridas += self._inserir_em_massa(conn, query, lote, incremental=conflito != "replace")
+                else:
+                    # rowcount não inclui as linhas alteradas pelos triggers (total_changes incluiria)
+                    inseridas += conn.executemany(query, lote).rowcount
+            total += len(lote)
+        segundos = time.perf_counter() - inicio
+
+        return {
+            "linhas": total,
+            "inseridas": inseridas,
+            "segundos": round(segundos, 3),
+            "linhas_por_segundo": round(total / segundos, 1) if segundos > 0 else float(total),
+        }
+
+    @staticmethod
+    def _inserir_em_massa(conn, query, lote, incremental):
+        """
+        Insere 'lote' sem os triggers de TRIGGERS_CUBO (que fariam dois upserts por linha) e
+        atualiza demand_curve e last_price de uma vez, na mesma transação:
+        - 'incremental' (nenhuma venda é substituída): soma às tabelas só as linhas novas;
+        - senão (INSERT OR REPLACE apaga vendas): recarrega as tabelas a partir de todas as vendas.
+        Os triggers são recriados com o mesmo SQL ao final; em caso de erro, o rollback os devolve.
+        Retorna a quantidade de linhas inseridas.
+        """
+        conn.execute("BEGIN;")
+        triggers = conn.execute(f"""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'trigger' AND name IN ({', '.join('?' * len(TRIGGERS_CUBO))});
+        """, TRIGGERS_CUBO).fetchall()
+        for nome, _ in triggers:
+            conn.execute(f"DROP TRIGGER {nome};")
+        ultimo_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM supermarket_sales;").fetchone()[0]
+
+        inseridas = conn.executemany(query, lote).rowcount
+        if not incremental:
+            conn.execute("DELETE FROM demand_curve;")
+            conn.execute("DELETE FROM last_price;")
+        for comando in _sql_carga_cubo(GRAO_PRECOS, incremental):
+            conn.execute(comando, {"rowid": ultimo_rowid})
+
+        for _, sql in triggers:
+            conn.execute(sql)
+        return inseridas
+
+    def load_csv(self, caminho="supermarket_sales.csv", tamanho_lote=5000, conflito="abort"):
+        """
+        Carrega um arquivo no formato do supermarket_sales.csv lendo-o em lotes (streaming).
+        - Os cabeçalhos do CSV são convertidos para as colunas da tabela via COLUNAS_CSV.
+        - Os valores chegam como texto; a afinidade de tipo do SQLite converte REAL/INTEGER.
+
+        Retorna o mesmo dicionário de estatísticas de insert_many.
+        """
+        self.create_table()
+        with open(caminho, newline="", encoding="utf-8") as arquivo:
+            leitor = csv.reader(arquivo)
+            colunas = [COLUNAS_CSV.get(nome, nome) for nome in next(leitor)]
+            return self.insert_many(leitor, colunas=colunas, tamanho_lote=tamanho_lote, conflito=conflito)
+
+    @instrumentar("db.get_all_data")
     def get_all_data(self):
         """
         Retorna todos os registros da tabela supermarket_sales.
         """
-        query = "SELECT * FROM supermarket_sales;"
-        cursor = self.conn.execute(query)
-        data = cursor.fetchall()
+        query = f"SELECT {', '.join(COLUNAS_VENDAS)} FROM supermarket_sales;"
+        with self.pool.leitura() as conn:
+            data = conn.execute(query).fetchall()
         return data
 
-    def update_data(self, record_id, Product_line, Date, Unit_price, Quantity, gross_income):
+    def get_date_range(self):
         """
-        Atualiza um registro específico na tabela supermarket_sales.
+        Retorna a menor e a maior data de venda (Date_iso) da tabela.
         """
-        query = """
+        query = "SELECT MIN(Date_iso), MAX(Date_iso) FROM supermarket_sales;"
+        with self.pool.leitura() as conn:
+            return conn.execute(query).fetchone()
+
+    def get_fingerprint(self):
+        """
+        Retorna (quantidade de linhas, maior rowid) da tabela de vendas.
+        Sozinho não detecta alterações (um UPDATE não muda nenhum dos dois): para saber se desde
+        a última leitura houve apenas inserções, compare também get_data_version(), que avança
+        uma unidade por linha inserida, alterada ou apagada.
+        """
+        query = "SELECT COUNT(*), MAX(rowid) FROM supermarket_sales;"
+        with self.pool.leitura() as conn:
+            return conn.execute(query).fetchone()
+
+    def get_sales(self, colunas=None, filtros=None, data_inicio=None, data_fim=None):
+        """
+        Retorna somente as colunas e linhas pedidas, com os filtros aplicados no próprio SQLite.
+        - 'colunas': lista de colunas (padrão: todas as colunas originais).
+        - 'filtros': dicionário {coluna: valor ou lista de valores}, ex.: {"City": ["Yangon"]}.
+        - 'data_inicio' / 'data_fim': limites (inclusivos) sobre Date_iso.
+        """
+        colunas = _validar_colunas(colunas or COLUNAS_VENDAS)
+        where, params = _montar_where(filtros, data_inicio, data_fim)
+        query = f"SELECT {', '.join(colunas)} FROM supermarket_sales {where};"
+        with self.pool.leitura() as conn:
+            return conn.execute(query, params).fetchall()
+
+    @instrumentar("db.read_frame")
+    def read_frame(self, colunas=None, filtros=None, data_inicio=None, data_fim=None,
+                   ordenar_por=None, limite=None, chunksize=None, dtype=None):
+        """
+        Lê vendas direto para um DataFrame, trazendo do SQLite só as colunas e linhas pedidas.
+        - 'colunas', 'filtros', 'data_inicio' e 'data_fim' funcionam como em get_sales.
+        - 'ordenar_por': lista de colunas para o ORDER BY; 'limite': máximo de linhas.
+        - 'chunksize': se informado, retorna um iterador de DataFrames com até 'chunksize' linhas
+          cada, sem materializar o resultado inteiro.
+        - 'dtype': tipos das colunas repassados ao pandas (ex.: {"City": "category"}).
+        """
+        colunas = _validar_colunas(colunas or COLUNAS_VENDAS)
+        where, params = _montar_where(filtros, data_inicio, data_fim)
+        query = f"SELECT {', '.join(colunas)} FROM supermarket_sales {where}"
+        if ordenar_por:
+            query += f" ORDER BY {', '.join(_validar_colunas(ordenar_por))}"
+        if limite is not None:
+            query += " LIMIT ?"
+            params.append(int(limite))
+
+        if chunksize is None:
+            with self.pool.leitura() as conn:
+                return pd.read_sql_query(query, conn, params=params, dtype=dtype)
+        return self._read_frame_chunks(query, params, chunksize, dtype)
+
+    def _read_frame_chunks(self, query, params, chunksize, dtype):
+        # A conexão fica emprestada enquanto o iterador estiver sendo consumido
+        with self.pool.leitura() as conn:
+            yield from pd.read_sql_query(query, conn, params=params, chunksize=chunksize, dtype=dtype)
+
+    @instrumentar("db.aggregate_sales")
+    def aggregate_sales(self, agrupar_por=None, medidas=(("sum", "Total"),), filtros=None, data_inicio=None,
+                        data_fim=None, ordenar_por=None, descendente=True, limite=50, timeout=2.0):
+        """
+        Consulta agregada somente leitura sobre supermarket_sales, montada só com nomes
+        validados (valores sempre como parâmetros), para uso por código não confiável como o chat.
+        - 'agrupar_por': colunas de COLUNAS_CONSULTA ou de DIMENSOES_DERIVADAS (ex.: "Month").
+        - 'medidas': pares (agregação, coluna) com agregação em AGREGACOES; ("count", "*") conta
+          as vendas. Cada medida vira a coluna "<agregação>_<coluna>" (ou "count").
+        - 'filtros', 'data_inicio' e 'data_fim' funcionam como em get_sales.
+        - 'ordenar_por': nome de uma coluna do resultado; 'limite' é limitado a LIMITE_MAXIMO_LINHAS.
+        - 'timeout': segundos até a consulta ser interrompida (TimeoutError).
+        """
+        grupos = []
+        for coluna in agrupar_por or []:
+            if coluna in DIMENSOES_DERIVADAS:
+                grupos.append((coluna, DIMENSOES_DERIVADAS[coluna]))
+            else:
+                grupos.append((coluna, _validar_colunas([coluna])[0]))
+
+        selecionadas = []
+        for agregacao, coluna in medidas:
+            if agregacao not in AGREGACOES:
+                raise ValueError(f"Agregação inválida: {agregacao!r}. Use uma de {list(AGREGACOES)}")
+            if coluna == "*" and agregacao == "count":
+                selecionadas.append(("count", "COUNT(*)"))
+            else:
+                _validar_colunas([coluna])
+                selecionadas.append((f"{agregacao}_{coluna}", f"{AGREGACOES[agregacao]}({coluna})"))
+        if not selecionadas:
+            raise ValueError("Informe ao menos uma medida")
+
+        nomes = [nome for nome, _ in grupos + selecionadas]
+        if ordenar_por is None:
+            ordenar_por = selecionadas[0][0]
+        if ordenar_por not in nomes:
+            raise ValueError(f"ordenar_por deve ser uma das colunas do resultado: {nomes}")
+
+        where, params = _montar_where(filtros, data_inicio, data_fim)
+        agrupamento = f"GROUP BY {', '.join(expr for _, expr in grupos)}" if grupos else ""
+        query = f"""
+            SELECT {', '.join(f'{expr} AS "{nome}"' for nome, expr in grupos + selecionadas)}
+            FROM supermarket_sales {where} {agrupamento}
+            ORDER BY "{ordenar_por}" {'DESC' if descendente else 'ASC'}
+            LIMIT ?;
+        """
+        params.append(max(1, min(int(limite), LIMITE_MAXIMO_LINHAS)))
+        with self.pool.leitura() as conn, _tempo_limite(conn, timeout):
+            try:
+                linhas = conn.execute(query, params).fetchall()
+            except sqlite3.OperationalError as erro:
+                if "interrupted" in str(erro):
+                    raise TimeoutError(f"Consulta interrompida após {timeout}s") from erro
+                raise
+        return pd.DataFrame.from_records(linhas, columns=nomes)
+
+    def snapshot(self):
+        """
+        Bloco 'with' em que as leituras deste DatabaseManager veem um único estado do banco.
+        """
+        return self.pool.snapshot()
+
+    @instrumentar("db.read_demand_curve")
+    def read_demand_curve(self, chaves, data_inicio=None):
+        """
+        Lê a curva de demanda materializada (tabela demand_curve), somada por 'chaves', dia e preço.
+        Como a tabela está no grão mais fino, qualquer combinação de CHAVES_MATERIALIZADAS é só
+        uma agregação sobre linhas já agregadas, em vez do histórico de vendas inteiro.
+        """
+        expressoes = self._expressoes_chaves(chaves)
+        where, params = _montar_where(data_inicio=data_inicio)
+        query = f"""
+            SELECT {', '.join(f'{expr} AS {chave}' for chave, expr in expressoes)},
+                   Date_iso, Unit_price, SUM(Quantity) AS Quantity
+            FROM demand_curve {where}
+            GROUP BY {', '.join(expr for _, expr in expressoes)}, Date_iso, Unit_price;
+        """
+        with self.pool.leitura() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    @instrumentar("db.read_last_prices")
+    def read_last_prices(self, chaves):
+        """
+        Lê da tabela last_price o preço e o gross_income da última venda (maior rowid) de cada
+        combinação de 'chaves'.
+        """
+        expressoes = self._expressoes_chaves(chaves)
+        query = f"""
+            SELECT {', '.join(f'{expr} AS {chave}' for chave, expr in expressoes)}, Unit_price, gross_income
+            FROM last_price
+            WHERE sale_rowid IN (SELECT MAX(sale_rowid) FROM last_price
+                                 GROUP BY {', '.join(expr for _, expr in expressoes)});
+        """
+        with self.pool.leitura() as conn:
+            return pd.read_sql_query(query, conn)
+
+    def get_demand_curve_date_range(self):
+        """
+        Retorna a menor e a maior data (Date_iso) presentes na curva de demanda materializada.
+        """
+        query = "SELECT MIN(Date_iso), MAX(Date_iso) FROM demand_curve;"
+        with self.pool.leitura() as conn:
+            return conn.execute(query).fetchone()
+
+    @staticmethod
+    def _expressoes_chaves(chaves):
+        # (chave, expressão SQL) de cada chave; as derivadas do dia viram expressões sobre Date_iso
+        invalidas = set(chaves) - set(CHAVES_MATERIALIZADAS)
+        if invalidas:
+            raise ValueError(f"Chaves sem agregação materializada: {sorted(invalidas)}")
+        return [(chave, DIMENSOES_DERIVADAS.get(chave, chave)) for chave in chaves]
+
+    def get_data_version(self):
+        """
+        Retorna a versão dos dados de vendas: um contador incrementado por trigger a cada
+        linha inserida, alterada ou apagada em supermarket_sales.
+        """
+        with self.pool.leitura() as conn:
+            return conn.execute("SELECT valor FROM sales_meta WHERE chave = 'versao';").fetchone()[0]
+
+    @staticmethod
+    def _nome_segmentacao(colunas):
+        invalidas = set(colunas) - set(COLUNAS_SEGMENTACAO)
+        if invalidas:
+            raise ValueError(f"Colunas de segmentação inválidas: {sorted(invalidas)}")
+        return ",".join(c for c in COLUNAS_SEGMENTACAO if c in colunas)
+
+    def save_rules(self, colunas, regras, segmentos, versao):
+        """
+        Substitui as regras persistidas da segmentação 'colunas' pelas de 'regras' (DataFrame com
+        as colunas de segmentação, antecedente, consequente e as métricas) e registra a versão
+        dos dados usada e a lista de segmentos minerados.
+        """
+        segmentacao = self._nome_segmentacao(colunas)
+        colunas_tabela = COLUNAS_SEGMENTACAO + ["antecedente", "consequente"] + COLUNAS_METRICAS_REGRAS
+        linhas = regras.reindex(columns=colunas_tabela).astype(object)
+        linhas = linhas.where(linhas.notna(), None).itertuples(index=False, name=None)
+        with self.pool.escrita() as conn:
+            conn.execute("DELETE FROM recommendation_rules WHERE segmentacao = ?;", (segmentacao,))
+            conn.executemany(f"""
+                INSERT INTO recommendation_rules (segmentacao, {', '.join(colunas_tabela)})
+                VALUES (?, {', '.join('?' * len(colunas_tabela))});
+            """, ((segmentacao,) + linha for linha in linhas))
+            conn.execute("""
+                INSERT OR REPLACE INTO recommendation_runs VALUES (?, ?, ?, datetime('now'));
+            """, (segmentacao, versao, json.dumps(segmentos)))
+
+    def get_rules_run(self, colunas):
+        """
+        Retorna (versão dos dados, lista de segmentos) da última mineração da segmentação
+        'colunas', ou None se ela nunca foi minerada.
+        """
+        query = "SELECT data_version, segmentos FROM recommendation_runs WHERE segmentacao = ?;"
+        with self.pool.leitura() as conn:
+            linha = conn.execute(query, (self._nome_segmentacao(colunas),)).fetchone()
+        return None if linha is None else (linha[0], json.loads(linha[1]))
+
+    @instrumentar("db.read_rules")
+    def read_rules(self, colunas, top=None):
+        """
+        Lê as regras persistidas da segmentação 'colunas', ordenadas por confiança decrescente
+        dentro de cada segmento. 'top' limita a quantidade de regras por segmento.
+        """
+        segmentacao = self._nome_segmentacao(colunas)
+        particao = ", ".join(c for c in COLUNAS_SEGMENTACAO if c in colunas) or "segmentacao"
+        query = f"""
+            SELECT {', '.join(COLUNAS_SEGMENTACAO)}, antecedente, consequente,
+                   {', '.join(COLUNAS_METRICAS_REGRAS)}
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY {particao} ORDER BY confidence DESC) AS posicao
+                FROM recommendation_rules WHERE segmentacao = ?
+            )
+            {'WHERE posicao <= ?' if top else ''}
+            ORDER BY {particao}, posicao;
+        """
+        params = [segmentacao] + ([int(top)] if top else [])
+        with self.pool.leitura() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    @staticmethod
+    def _nome_chaves(chaves):
+        invalidas = set(chaves) - set(CHAVES_MATERIALIZADAS)
+        if invalidas:
+            raise ValueError(f"Chaves de precificação inválidas: {sorted(invalidas)}")
+        return ",".join(c for c in CHAVES_MATERIALIZADAS if c in chaves)
+
+    def save_prices(self, chaves, meses, precos, versao):
+        """
+        Substitui os melhores preços persistidos da combinação 'chaves' e período 'meses' pelos
+        de 'precos' (DataFrame com as colunas das chaves e COLUNAS_METRICAS_PRECOS) e registra
+        a versão dos dados usada.
+        """
+        nome = self._nome_chaves(chaves)
+        colunas_tabela = [c for c in CHAVES_MATERIALIZADAS if c in chaves] + COLUNAS_METRICAS_PRECOS
+        linhas = precos.reindex(columns=colunas_tabela).astype(object)
+        linhas = linhas.where(linhas.notna(), None).itertuples(index=False, name=None)
+        with self.pool.escrita() as conn:
+            conn.execute("DELETE FROM best_prices WHERE chaves = ? AND meses = ?;", (nome, meses))
+            conn.executemany(f"""
+                INSERT INTO best_prices (chaves, meses, {', '.join(colunas_tabela)})
+                VALUES (?, ?, {', '.join('?' * len(colunas_tabela))});
+            """, ((nome, meses) + linha for linha in linhas))
+            conn.execute("INSERT OR REPLACE INTO price_runs VALUES (?, ?, ?, datetime('now'));",
+                         (nome, meses, versao))
+
+    def get_prices_run(self, chaves, meses):
+        """
+        Retorna a versão dos dados do último cálculo de preços de 'chaves' e 'meses', ou None.
+        """
+        query = "SELECT data_version FROM price_runs WHERE chaves = ? AND meses = ?;"
+        with self.pool.leitura() as conn:
+            linha = conn.execute(query, (self._nome_chaves(chaves), meses)).fetchone()
+        return None if linha is None else linha[0]
+
+    @instrumentar("db.read_prices")
+    def read_prices(self, chaves, meses):
+        """
+        Lê os melhores preços persistidos de 'chaves' e 'meses', ordenados pelas chaves na ordem dada.
+        """
+        nome = self._nome_chaves(chaves)
+        colunas = [c for c in CHAVES_MATERIALIZADAS if c in chaves]
+        query = f"""
+            SELECT {', '.join(colunas + COLUNAS_METRICAS_PRECOS)} FROM best_prices
+            WHERE chaves = ? AND meses = ? ORDER BY {', '.join(chaves)};
+        """
+        with self.pool.leitura() as conn:
+            return pd.read_sql_query(query, conn, params=(nome, meses))
+
+    def get_ultimos_registros(self, chaves, colunas=("Unit_price", "gross_income")):
+        """
+        Retorna, para cada combinação de 'chaves', as 'colunas' do último registro inserido
+        (maior rowid), sem depender do período filtrado.
+        """
+        chaves = _validar_colunas(chaves)
+        selecionadas = chaves + _validar_colunas(colunas)
+        query = f"""
+            SELECT {', '.join(selecionadas)} FROM supermarket_sales
+            WHERE rowid IN (SELECT MAX(rowid) FROM supermarket_sales GROUP BY {', '.join(chaves)});
+        """
+        with self.pool.leitura() as conn:
+            return conn.execute(query).fetchall()
+
+    def update_data(self, invoice_id, **valores):
+        """
+        Atualiza as colunas passadas em 'valores' da venda 'invoice_id' (Invoice_ID).
+        Retorna a quantidade de linhas alteradas (0 se a venda não existe).
+        """
+        colunas = list(valores)
+        if not colunas:
+            raise ValueError("Informe ao menos uma coluna para atualizar")
+        invalidas = set(colunas) - set(COLUNAS_VENDAS)
+        if invalidas:
+            raise ValueError(f"Colunas inexistentes em supermarket_sales: {sorted(invalidas)}")
+        query = f"""
             UPDATE supermarket_sales
-            SET Product_line = ?,
-                Date = ?,
-                Unit_price = ?,
-                Quantity = ?,
-                gross_income = ?
-            WHERE id = ?;
+            SET {', '.join(f'{coluna} = ?' for coluna in colunas)}
+            WHERE Invoice_ID = ?;
         """
-        self.conn.execute(query, (Product_line, Date, Unit_price, Quantity, gross_income, record_id))
-        self.conn.commit()
+        with self.pool.escrita() as conn:
+            return conn.execute(query, (*valores.values(), invoice_id)).rowcount
 
-    def delete_data(self, record_id):
+    def delete_data(self, invoice_id):
         """
-        Deleta um registro específico na tabela supermarket_sales.
+        Deleta a venda 'invoice_id' (Invoice_ID) da tabela supermarket_sales.
+        Retorna a quantidade de linhas apagadas (0 se a venda não existe).
         """
         query = """
             DELETE FROM supermarket_sales
-            WHERE id = ?;
+            WHERE Invoice_ID = ?;
         """
-        self.conn.execute(query, (record_id,))
-        self.conn.commit()
+        with self.pool.escrita() as conn:
+            return conn.execute(query, (invoice_id,)).rowcount
 
-    def __del__(self):
-        """
-        Fecha a conexão com o banco de dados quando o objeto é destruído.
-        """
-        self.conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Carga em lote de vendas no banco do supermercado.")
+    parser.add_argument("csv", help="Arquivo no formato do supermarket_sales.csv")
+    parser.add_argument("--db", default="supermarket_sales.db")
+    parser.add_argument("--lote", type=int, default=5000, help="Linhas por transação")
+    parser.add_argument("--conflito", choices=list(CONFLITOS), default="abort")
+    args = parser.parse_args()
+
+    stats = DatabaseManager(args.db).load_csv(args.csv, tamanho_lote=args.lote, conflito=args.conflito)
+    print(f"{stats['inseridas']}/{stats['linhas']} linhas em {stats['segundos']}s ({stats['linhas_por_segundo']} linhas/s)")
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import xlsxwriter
+
+from instrumentation import instrumentar
+
+# Onde ficam os arquivos exportados (reaproveitados enquanto a versão dos dados não muda)
+DIRETORIO_EXPORTACOES = os.environ.get(
+    "EXPORTACOES_DIR", os.path.join(tempfile.gettempdir(), "sistema_mercado_exportacoes"))
+
+# Linhas convertidas por vez ao escrever o arquivo
+TAMANHO_PARTE = 10_000
+
+# Arquivos exportados há mais do que isto (em segundos) são apagados a cada nova exportação
+IDADE_MAXIMA_EXPORTACOES = 24 * 3600
+
+FORMATOS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+}
+
+
+def _hash(valor):
+    return hashlib.sha256(json.dumps(valor, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _partes(df, tamanho):
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+def _escrever_xlsx(caminho, df, aba, tamanho_parte):
+    # constant_memory: cada linha vai para o disco assim que a próxima começa a ser escrita
+    with xlsxwriter.Workbook(caminho, {"constant_memory": True, "nan_inf_to_errors": True}) as workbook:
+        planilha = workbook.add_worksheet(aba[:31])
+        planilha.write_row(0, 0, [str(c) for c in df.columns])
+        linha = 1
+        for parte in _partes(df, tamanho_parte):
+            for valores in parte.astype(object).where(parte.notna(), None).itertuples(index=False, name=None):
+                planilha.write_row(linha, 0, valores)
+                linha += 1
+
+
+def _escrever_csv(caminho, df, tamanho_parte):
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as arquivo:
+        for n, parte in enumerate(_partes(df, tamanho_parte)):
+            parte.to_csv(arquivo, index=False, header=n == 0)
+        if df.empty:
+            df.to_csv(arquivo, index=False)
+
+
+@instrumentar("exportacao.exportar")
+def exportar(df, nome, versao, formato="xlsx", aba="Dados", parametros=None, tamanho_parte=TAMANHO_PARTE):
+    """
+    Grava 'df' em um arquivo temporário (Excel ou CSV) e retorna o caminho.
+    - O arquivo é escrito em partes de 'tamanho_parte' linhas; no Excel, em modo constant_memory.
+    - O caminho depende de 'nome', 'versao' (dos dados), 'formato' e 'parametros': enquanto eles
+      não mudam, o mesmo arquivo é reaproveitado sem ser gerado de novo.
+    - A gravação é feita em um arquivo provisório renomeado ao final, então downloads
+      simultâneos nunca veem um arquivo incompleto.
+    - Ao gravar uma versão nova, os arquivos de 'nome' das outras versões (e os de qualquer
+      exportação com mais de IDADE_MAXIMA_EXPORTACOES) são apagados (limpar).
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato!r}. Use um de {list(FORMATOS)}")
+    os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+    caminho = os.path.join(DIRETORIO_EXPORTACOES, f"{nome}-{_hash(versao)}-{_hash([formato, parametros])}.{formato}")
+    if os.path.exists(caminho):
+        return caminho
+
+    gravar(df, caminho, formato, aba, tamanho_parte)
+    limpar(nome, versao)
+    return caminho
+
+
+def limpar(nome=None, versao=None, idade=IDADE_MAXIMA_EXPORTACOES):
+    """
+    Apaga de DIRETORIO_EXPORTACOES os arquivos de 'nome' gerados para uma versão dos dados
+    diferente de 'versao' e os arquivos de qualquer exportação gravados há mais de 'idade'
+    segundos. Arquivos em uso que o sistema não deixa apagar ficam para a próxima limpeza.
+    """
+    if not os.path.isdir(DIRETORIO_EXPORTACOES):
+        return
+    limite = time.time() - idade
+    for entrada in os.scandir(DIRETORIO_EXPORTACOES):
+        base, _, extensao = entrada.name.rpartition(".")
+        if extensao not in FORMATOS or base.count("-") < 2:
+            continue
+        nome_arquivo, hash_versao, _ = base.rsplit("-", 2)
+        try:
+            if (nome_arquivo == nome and hash_versao != _hash(versao)) or entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+        except OSError:
+            pass
+
+
+def gravar(df, caminho, formato="xlsx", aba="Dados", tamanho_parte=TAMANHO_PARTE):
+    """
+    Grava 'df' em 'caminho' (Excel ou CSV) em partes de 'tamanho_parte' linhas, por meio de um
+    arquivo provisório renomeado ao final, e retorna o caminho.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato!r}. Use um de {list(FORMATOS)}")
+    provisorio = f"{caminho}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        if formato == "xlsx":
+            _escrever_xlsx(provisorio, df, aba, tamanho_parte)
+        else:
+            _escrever_csv(provisorio, df, tamanho_parte)
+        os.replace(provisorio, caminho)
+    finally:
+        if os.path.exists(provisorio):
+            os.remove(provisorio)
+    return caminho
+
+
+@contextmanager
+def arquivo_exportado(df, nome, versao, formato="xlsx", **kwargs):
+    """
+    Bloco 'with' com o arquivo exportado (gerado ou reaproveitado do cache) aberto para leitura,
+    para o 'data' do st.download_button, que o lê durante a chamada. O arquivo é fechado ao
+    sair do bloco. Se outra sessão o apagar (limpar) antes de ser aberto, ele é gerado de novo.
+    """
+    try:
+        arquivo = open(exportar(df, nome, versao, formato, **kwargs), "rb")
+    except FileNotFoundError:
+        arquivo = open(exportar(df, nome, versao, formato, **kwargs), "rb")
+    with arquivo:
+        yield arquivo
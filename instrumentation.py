@@ -0,0 +1,174 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Arquivo JSONL onde cada medição é acrescentada (vazio desativa o log)
+METRICAS_LOG = os.environ.get("METRICAS_LOG", "metricas.jsonl")
+
+# Painel de desempenho na barra lateral das telas (PAINEL_DESEMPENHO=1)
+PAINEL_DESEMPENHO = os.environ.get("PAINEL_DESEMPENHO", "0") == "1"
+
+_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Medições da execução atual (um rerun do Streamlit, por exemplo); fora de uma execução, só o log
+_EXECUCAO = contextvars.ContextVar("execucao", default=None)
+_LOG_LOCK = threading.Lock()
+
+
+def memoria_mb():
+    """
+    Memória residente (RSS) do processo em MB, ou None se o sistema não a expõe em /proc.
+    """
+    try:
+        with open("/proc/self/statm") as arquivo:
+            return int(arquivo.read().split()[1]) * _PAGINA / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _gravar(registro):
+    if not METRICAS_LOG:
+        return
+    linha = json.dumps(registro, ensure_ascii=False, default=str)
+    with _LOG_LOCK:
+        try:
+            with open(METRICAS_LOG, "a", encoding="utf-8") as arquivo:
+                arquivo.write(linha + "\n")
+        except OSError:
+            pass
+
+
+@contextmanager
+def medir(nome, **atributos):
+    """
+    Mede o bloco: tempo de parede, variação da memória residente e os 'atributos' dados.
+    O dicionário devolvido pode ser completado dentro do bloco (ex.: registro["linhas"] = len(df)).
+    A medição vai para a execução atual (se houver) e para o log METRICAS_LOG, mesmo com erro.
+    """
+    registro = {"nome": nome, **atributos}
+    execucao = _EXECUCAO.get()
+    memoria_inicio = memoria_mb()
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as erro:
+        registro["erro"] = type(erro).__name__
+        raise
+    finally:
+        registro["segundos"] = round(time.perf_counter() - inicio, 6)
+        memoria_fim = memoria_mb()
+        if memoria_inicio is not None and memoria_fim is not None:
+            registro["memoria_delta_mb"] = round(memoria_fim - memoria_inicio, 3)
+        registro["momento"] = time.time()
+        if execucao is not None:
+            registro["execucao"] = execucao["id"]
+            execucao["medicoes"].append(registro)
+        _gravar(registro)
+
+
+def _linhas(resultado):
+    # Em tuplas (ex.: (versão, DataFrame)) conta as linhas do primeiro DataFrame
+    if isinstance(resultado, tuple):
+        resultado = next((r for r in resultado if isinstance(r, pd.DataFrame)), None)
+    if isinstance(resultado, (str, bytes, dict)):
+        return None
+    try:
+        return len(resultado)
+    except TypeError:
+        return None
+
+
+def instrumentar(nome=None):
+    """
+    Decorador que mede cada chamada da função com medir(), registrando também o número de
+    linhas do resultado (quando ele tem tamanho). Em geradores, mede até o fim do consumo.
+    """
+    def decorador(funcao):
+        rotulo = nome or f"{funcao.__module__}.{funcao.__qualname__}"
+
+        if inspect.isgeneratorfunction(funcao):
+            @functools.wraps(funcao)
+            def gerador(*args, **kwargs):
+                with medir(rotulo) as registro:
+                    partes = 0
+                    for parte in funcao(*args, **kwargs):
+                        partes += 1
+                        yield parte
+                    registro["partes"] = partes
+            return gerador
+
+        @functools.wraps(funcao)
+        def wrapper(*args, **kwargs):
+            with medir(rotulo) as registro:
+                resultado = funcao(*args, **kwargs)
+                linhas = _linhas(resultado)
+                if linhas is not None:
+                    registro["linhas"] = linhas
+                return resultado
+        return wrapper
+    return decorador
+
+
+def iniciar_execucao(nome, **atributos):
+    """
+    Começa uma nova execução (ex.: um rerun de uma tela) no contexto atual: as medições seguintes
+    feitas nesta thread são agrupadas nela. Retorna a execução, encerrada por finalizar_execucao.
+    """
+    execucao = {"id": uuid.uuid4().hex[:12], "nome": nome, "atributos": atributos, "medicoes": [],
+                "inicio": time.perf_counter(), "memoria_inicio": memoria_mb(), "finalizada": False}
+    _EXECUCAO.set(execucao)
+    return execucao
+
+
+def finalizar_execucao(execucao=None):
+    """
+    Registra o tempo total e a variação de memória da execução (uma única vez) e devolve suas
+    medições como DataFrame, em ordem de término.
+    """
+    execucao = execucao or _EXECUCAO.get()
+    if execucao is None:
+        return pd.DataFrame()
+    if not execucao["finalizada"]:
+        execucao["finalizada"] = True
+        registro = {"nome": execucao["nome"], **execucao["atributos"],
+                    "segundos": round(time.perf_counter() - execucao["inicio"], 6)}
+        memoria_fim = memoria_mb()
+        if execucao["memoria_inicio"] is not None and memoria_fim is not None:
+            registro["memoria_delta_mb"] = round(memoria_fim - execucao["memoria_inicio"], 3)
+        registro.update(momento=time.time(), execucao=execucao["id"])
+        execucao["medicoes"].append(registro)
+        _gravar(registro)
+    return pd.DataFrame(execucao["medicoes"])
+
+
+def historico(caminho=None, ultimas=10_000):
+    """
+    Resumo das últimas 'ultimas' medições do log: quantidade, mediana, p95 e máximo do tempo
+    e mediana da variação de memória por nome, para acompanhar regressões.
+    """
+    caminho = caminho or METRICAS_LOG
+    if not caminho or not os.path.exists(caminho):
+        return pd.DataFrame()
+    with open(caminho, encoding="utf-8") as arquivo:
+        linhas = deque(arquivo, maxlen=ultimas)
+    medicoes = pd.DataFrame([json.loads(linha) for linha in linhas if linha.strip()])
+    if medicoes.empty:
+        return medicoes
+    if "memoria_delta_mb" not in medicoes:
+        medicoes["memoria_delta_mb"] = None
+    return medicoes.groupby("nome").agg(
+        chamadas=("segundos", "size"),
+        mediana_s=("segundos", "median"),
+        p95_s=("segundos", lambda s: s.quantile(0.95)),
+        max_s=("segundos", "max"),
+        memoria_mediana_mb=("memoria_delta_mb", "median"),
+    ).sort_values("p95_s", ascending=False)
@@ -0,0 +1,177 @@
+import threading
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumentar
+
+# Segmentos (SKUs) do estoque: cada linha de produto em cada filial
+CHAVES_ESTOQUE = ["Branch", "Product_line"]
+NOMES_ESTOQUE = {"Branch": "Filial", "Product_line": "Produto"}
+
+# Dias mais recentes usados para ajustar as previsões
+HISTORICO_DIAS = 90
+
+# Parâmetros padrão: janela da média móvel, suavização, prazo de entrega (dias),
+# nível de serviço e dias de demanda cobertos por um pedido
+JANELA_MEDIA_MOVEL = 7
+ALPHA_SUAVIZACAO = 0.3
+PRAZO_ENTREGA = 3
+NIVEL_SERVICO = 0.95
+DIAS_COBERTURA = 7
+
+METODOS_PREVISAO = {
+    "suavizacao": "Suavização exponencial",
+    "media_movel": "Média móvel",
+}
+
+CRITICO, REPOR, NORMAL, EXCESSO, SEM_INFORMACAO = "Crítico", "Repor", "Normal", "Excesso", "Sem informação"
+
+_ESTOQUES = {}
+_ESTOQUES_LOCK = threading.Lock()
+
+
+def series_diarias(dados, historico=HISTORICO_DIAS):
+    """
+    Monta a matriz (segmentos x dias) de quantidade vendida por dia nos últimos 'historico' dias,
+    com zero nos dias sem venda. Retorna (segmentos, dias, matriz), onde 'segmentos' é um
+    DataFrame com as CHAVES_ESTOQUE de cada linha da matriz.
+    """
+    fim = dados["Date"].max().normalize()
+    dias = pd.date_range(fim - pd.Timedelta(days=historico - 1), fim, freq="D")
+    recentes = dados.loc[dados["Date"] >= dias[0], CHAVES_ESTOQUE + ["Date", "Quantity"]]
+
+    # Todos os segmentos com venda em qualquer período entram, mesmo sem venda recente
+    segmentos = dados[CHAVES_ESTOQUE].drop_duplicates().sort_values(CHAVES_ESTOQUE).reset_index(drop=True)
+    linha = pd.MultiIndex.from_frame(segmentos).get_indexer(pd.MultiIndex.from_frame(recentes[CHAVES_ESTOQUE]))
+    coluna = (recentes["Date"].dt.normalize() - dias[0]).dt.days.to_numpy()
+
+    matriz = np.zeros((len(segmentos), len(dias)))
+    np.add.at(matriz, (linha, coluna), recentes["Quantity"].to_numpy(dtype=float))
+    return segmentos, dias, matriz
+
+
+def suavizacao_exponencial(matriz, alpha=ALPHA_SUAVIZACAO):
+    """
+    Nível da suavização exponencial simples ao fim de cada dia, para todas as séries de uma vez.
+    O nível no dia t é uma média ponderada dos dias 0..t, então todos os níveis saem de um único
+    produto de matrizes (dias x dias, triangular), sem laço por série nem por dia.
+    """
+    t = np.arange(matriz.shape[1])
+    expoente = t[None, :] - t[:, None]
+    pesos = np.where(expoente >= 0, alpha * (1 - alpha) ** np.maximum(expoente, 0), 0.0)
+    # O primeiro dia inicializa o nível e fica com o peso restante
+    pesos[0] = (1 - alpha) ** t
+    return matriz @ pesos
+
+
+def media_movel(matriz, janela=JANELA_MEDIA_MOVEL):
+    """
+    Média móvel dos últimos 'janela' dias ao fim de cada dia, para todas as séries de uma vez
+    (somas acumuladas). Nos primeiros dias a média usa os dias disponíveis.
+    """
+    acumulada = np.cumsum(np.pad(matriz, ((0, 0), (1, 0))), axis=1)
+    fim = np.arange(1, matriz.shape[1] + 1)
+    inicio = np.maximum(fim - janela, 0)
+    return (acumulada[:, fim] - acumulada[:, inicio]) / (fim - inicio)
+
+
+class InventoryEngine:
+    """
+    Previsão de demanda diária e parâmetros de reposição de cada linha de produto em cada filial.
+    - As vendas viram uma matriz (segmentos x dias) e as previsões (média móvel ou suavização
+      exponencial) são calculadas para todas as séries em operações NumPy sobre a matriz.
+    - O desvio usado no estoque de segurança é o dos erros da previsão de um dia à frente.
+    - Estoque de segurança = z * desvio * raiz(prazo de entrega); ponto de pedido = previsão *
+      prazo + estoque de segurança; estoque máximo = ponto de pedido + previsão * dias de cobertura.
+    """
+
+    def __init__(self, dados, versao=None, metodo="suavizacao", janela=JANELA_MEDIA_MOVEL,
+                 alpha=ALPHA_SUAVIZACAO, prazo_entrega=PRAZO_ENTREGA, nivel_servico=NIVEL_SERVICO,
+                 dias_cobertura=DIAS_COBERTURA, historico=HISTORICO_DIAS):
+        if metodo not in METODOS_PREVISAO:
+            raise ValueError(f"Método inválido: {metodo!r}. Use um de {list(METODOS_PREVISAO)}")
+        self.versao = versao
+        self.metodo = metodo
+        self.segmentos, self.dias, self.matriz = series_diarias(dados, historico)
+
+        if metodo == "suavizacao":
+            niveis = suavizacao_exponencial(self.matriz, alpha)
+        else:
+            niveis = media_movel(self.matriz, janela)
+        erros = self.matriz[:, 1:] - niveis[:, :-1]
+
+        self.previsao = niveis[:, -1]
+        self.desvio = np.sqrt(np.mean(erros ** 2, axis=1)) if erros.shape[1] else np.zeros(len(self.previsao))
+        z = NormalDist().inv_cdf(nivel_servico)
+        self.estoque_seguranca = np.ceil(z * self.desvio * np.sqrt(prazo_entrega))
+        self.ponto_pedido = np.ceil(self.previsao * prazo_entrega) + self.estoque_seguranca
+        self.estoque_maximo = self.ponto_pedido + np.ceil(self.previsao * dias_cobertura)
+
+    def tabela(self):
+        """
+        Parâmetros de reposição de cada segmento, com as chaves renomeadas como na tela.
+        """
+        return self.segmentos.assign(**{
+            "Média Diária": self.matriz.mean(axis=1).round(2),
+            "Previsão Diária": self.previsao.round(2),
+            "Desvio Diário": self.desvio.round(2),
+            "Estoque de Segurança": self.estoque_seguranca,
+            "Ponto de Pedido": self.ponto_pedido,
+            "Estoque Máximo": self.estoque_maximo,
+        }).rename(columns=NOMES_ESTOQUE)
+
+    def estoque_atual(self, anterior=None):
+        """
+        Tabela (Filial, Produto, Estoque Atual) na ordem de tabela(), para o estoque ser informado
+        na tela. Com 'anterior' (a mesma tabela, de outra versão dos dados), os valores já
+        informados são mantidos nos segmentos que continuam existindo; os novos ficam vazios.
+        """
+        chaves = [NOMES_ESTOQUE[c] for c in CHAVES_ESTOQUE]
+        atual = self.tabela()[chaves].astype(object)
+        if anterior is None:
+            return atual.assign(**{"Estoque Atual": None})
+        anterior = anterior[chaves + ["Estoque Atual"]].astype({c: object for c in chaves})
+        return atual.merge(anterior.drop_duplicates(chaves), on=chaves, how="left")
+
+    def classificar(self, estoque):
+        """
+        Classifica o estoque atual de cada segmento ('estoque' na ordem de tabela(); NaN quando
+        desconhecido): Crítico (até o estoque de segurança), Repor (até o ponto de pedido),
+        Excesso (acima do estoque máximo) ou Normal. Inclui os dias de cobertura e a sugestão
+        de compra para voltar ao estoque máximo.
+        """
+        estoque = np.asarray(estoque, dtype=float)
+        status = np.select(
+            [np.isnan(estoque), estoque <= self.estoque_seguranca, estoque <= self.ponto_pedido,
+             estoque > self.estoque_maximo],
+            [SEM_INFORMACAO, CRITICO, REPOR, EXCESSO],
+            NORMAL,
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cobertura = np.where(self.previsao > 0, estoque / self.previsao, np.inf)
+        compra = np.where(np.isin(status, [CRITICO, REPOR]), self.estoque_maximo - estoque, 0.0)
+        return self.tabela().assign(**{
+            "Estoque Atual": estoque,
+            "Dias de Cobertura": np.round(cobertura, 1),
+            "Sugestão de Compra": compra,
+            "Situação": status,
+        })
+
+
+@instrumentar("estoque.obter_estoque")
+def obter_estoque(dataset, **parametros):
+    """
+    Retorna o InventoryEngine do SalesDataset 'dataset' com os 'parametros' dados, recalculado
+    só quando a versão dos dados de vendas muda.
+    """
+    versao, dados = dataset.get_versionado()
+    chave = (id(dataset), versao, tuple(sorted(parametros.items())))
+    with _ESTOQUES_LOCK:
+        if chave not in _ESTOQUES:
+            # Mantém apenas a versão mais recente de cada dataset
+            for antiga in [c for c in _ESTOQUES if c[0] == id(dataset) and c[1] != versao]:
+                del _ESTOQUES[antiga]
+            _ESTOQUES[chave] = InventoryEngine(dados, versao, **parametros)
+        return _ESTOQUES[chave]
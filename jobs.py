@@ -0,0 +1,209 @@
+import hashlib
+import json
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from database_manager import get_pool
+
+# Threads que executam os jobs (cada job pesado pode abrir seus próprios processos)
+WORKERS_JOBS = 2
+
+# Intervalo mínimo, em segundos, entre duas gravações de progresso de um mesmo job
+INTERVALO_PROGRESSO = 0.25
+
+# Jobs terminados há mais do que isto (em segundos) são apagados a cada nova submissão
+IDADE_MAXIMA_JOBS = 7 * 24 * 3600
+
+# Intervalo, em segundos, entre os sinais de vida que cada JobManager grava nos jobs que executa
+INTERVALO_BATIMENTO = 5
+
+# Jobs pendentes ou em execução sem sinal de vida há mais do que isto (em segundos) ficaram
+# abandonados (ex.: o processo que os executava terminou) e são executados de novo
+PRAZO_BATIMENTO = 60
+
+PENDENTE, EXECUTANDO, CONCLUIDO, ERRO = "pendente", "executando", "concluido", "erro"
+
+
+def chave_job(tipo, parametros):
+    """
+    Chave determinística do job: hash do tipo e dos parâmetros (em JSON com chaves ordenadas).
+    """
+    texto = json.dumps([tipo, parametros], sort_keys=True, default=str)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+class JobManager:
+    """
+    Execução em segundo plano de cálculos pesados, com estado e resultado numa tabela SQLite.
+    - Cada tipo de job é uma função registrada com registrar(tipo, funcao); ela recebe os
+      parâmetros do job e um callback progresso(feitos, total, mensagem=None).
+    - submeter() calcula a chave a partir do tipo e dos parâmetros: pedidos iguais (inclusive de
+      sessões diferentes) compartilham a mesma execução e o mesmo resultado guardado.
+    - Vários processos podem compartilhar o mesmo jobs.db: cada JobManager grava um sinal de
+      vida nos jobs que executa, e só os que ficam PRAZO_BATIMENTO segundos sem ele (o processo
+      dono terminou) são dados como interrompidos. Esses, e os jobs com erro, são executados de
+      novo ao serem submetidos outra vez.
+    - Os resultados são guardados com pickle; a tela apenas consulta o status (polling). Para
+      resultados grandes que o próprio job já persiste (ex.: as regras do recomendador), basta
+      retornar a versão persistida.
+    - Quando um job com 'versao' nos parâmetros (ex.: a versão dos dados de vendas) conclui, os
+      jobs terminados do mesmo tipo criados antes dele com outra 'versao' são apagados: até o
+      substituto concluir, o job anterior continua disponível para as sessões que o consultam.
+      Jobs terminados há mais de IDADE_MAXIMA_JOBS também são apagados a cada submissão.
+    """
+
+    def __init__(self, db_name="jobs.db", workers=WORKERS_JOBS, intervalo_batimento=INTERVALO_BATIMENTO,
+                 prazo_batimento=PRAZO_BATIMENTO):
+        self.pool = get_pool(db_name)
+        self.dono = uuid.uuid4().hex
+        self.intervalo_batimento = intervalo_batimento
+        self.prazo_batimento = prazo_batimento
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._funcoes = {}
+        self._lock = threading.Lock()
+        with self.pool.escrita() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    chave TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    parametros TEXT,
+                    status TEXT NOT NULL,
+                    progresso REAL DEFAULT 0,
+                    mensagem TEXT,
+                    resultado BLOB,
+                    erro TEXT,
+                    criado_em REAL,
+                    iniciado_em REAL,
+                    concluido_em REAL,
+                    dono TEXT,
+                    batimento REAL
+                );
+            """)
+            # jobs.db criado antes do sinal de vida
+            existentes = {linha[1] for linha in conn.execute("PRAGMA table_info(jobs);")}
+            for coluna, tipo in (("dono", "TEXT"), ("batimento", "REAL")):
+                if coluna not in existentes:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {coluna} {tipo};")
+            # Jobs em andamento de processos que terminaram não vão concluir; os de outros
+            # processos ainda vivos (com sinal de vida recente) continuam como estão
+            conn.execute("""
+                UPDATE jobs SET status = ?, erro = 'Interrompido'
+                WHERE status IN (?, ?) AND COALESCE(batimento, criado_em) < ?;
+            """, (ERRO, PENDENTE, EXECUTANDO, time.time() - self.prazo_batimento))
+        threading.Thread(target=self._sinalizar, daemon=True, name="job-batimento").start()
+
+    def _sinalizar(self):
+        # Grava periodicamente o sinal de vida dos jobs deste JobManager que ainda não terminaram
+        while True:
+            time.sleep(self.intervalo_batimento)
+            with self.pool.escrita() as conn:
+                conn.execute("UPDATE jobs SET batimento = ? WHERE dono = ? AND status IN (?, ?);",
+                             (time.time(), self.dono, PENDENTE, EXECUTANDO))
+
+    def _abandonado(self, status, dono, batimento):
+        return (status in (PENDENTE, EXECUTANDO) and dono != self.dono
+                and (batimento or 0) < time.time() - self.prazo_batimento)
+
+    def registrar(self, tipo, funcao):
+        self._funcoes[tipo] = funcao
+
+    def submeter(self, tipo, **parametros):
+        """
+        Enfileira o job (se ainda não existir um igual pendente, em execução ou concluído)
+        e retorna sua chave.
+        """
+        if tipo not in self._funcoes:
+            raise ValueError(f"Tipo de job não registrado: {tipo!r}")
+        chave = chave_job(tipo, parametros)
+        with self._lock, self.pool.escrita() as conn:
+            linha = conn.execute("SELECT status, dono, COALESCE(batimento, criado_em) FROM jobs WHERE chave = ?;",
+                                 (chave,)).fetchone()
+            if linha is not None and linha[0] != ERRO and not self._abandonado(*linha):
+                return chave
+            agora = time.time()
+            conn.execute("""
+                INSERT OR REPLACE INTO jobs (chave, tipo, parametros, status, progresso, criado_em, dono, batimento)
+                VALUES (?, ?, ?, ?, 0, ?, ?, ?);
+            """, (chave, tipo, json.dumps(parametros, default=str), PENDENTE, agora, self.dono, agora))
+        self.limpar(IDADE_MAXIMA_JOBS)
+        self._executor.submit(self._executar, chave, tipo, parametros)
+        return chave
+
+    def _executar(self, chave, tipo, parametros):
+        with self.pool.escrita() as conn:
+            conn.execute("UPDATE jobs SET status = ?, iniciado_em = ? WHERE chave = ?;",
+                         (EXECUTANDO, time.time(), chave))
+        ultimo = [0.0]
+
+        def progresso(feitos, total=1, mensagem=None):
+            agora = time.monotonic()
+            if agora - ultimo[0] < INTERVALO_PROGRESSO and feitos < total:
+                return
+            ultimo[0] = agora
+            with self.pool.escrita() as conn:
+                conn.execute("UPDATE jobs SET progresso = ?, mensagem = ? WHERE chave = ?;",
+                             (feitos / total if total else 0.0, mensagem, chave))
+
+        try:
+            resultado = self._funcoes[tipo](progresso=progresso, **parametros)
+        except Exception as erro:
+            with self.pool.escrita() as conn:
+                conn.execute("UPDATE jobs SET status = ?, erro = ?, concluido_em = ? WHERE chave = ?;",
+                             (ERRO, f"{type(erro).__name__}: {erro}", time.time(), chave))
+            return
+        with self.pool.escrita() as conn:
+            conn.execute("""
+                UPDATE jobs SET status = ?, progresso = 1, resultado = ?, concluido_em = ? WHERE chave = ?;
+            """, (CONCLUIDO, pickle.dumps(resultado), time.time(), chave))
+            if "versao" in parametros:
+                # Agora o job anterior (de outra versão) já tem substituto e pode ser apagado
+                conn.execute("""
+                    DELETE FROM jobs WHERE tipo = ? AND status IN (?, ?)
+                        AND criado_em < (SELECT criado_em FROM jobs WHERE chave = ?)
+                        AND json_extract(parametros, '$.versao') IS NOT ?;
+                """, (tipo, CONCLUIDO, ERRO, chave, json.loads(json.dumps(parametros["versao"], default=str))))
+
+    def status(self, chave):
+        """
+        Retorna {status, progresso, mensagem, erro} do job, ou None se a chave não existe.
+        """
+        with self.pool.leitura() as conn:
+            linha = conn.execute("SELECT status, progresso, mensagem, erro FROM jobs WHERE chave = ?;",
+                                 (chave,)).fetchone()
+        if linha is None:
+            return None
+        return dict(zip(["status", "progresso", "mensagem", "erro"], linha))
+
+    def aguardar(self, chave, timeout=1.0, intervalo=0.05):
+        """
+        Espera até 'timeout' segundos o job terminar (concluído ou com erro) e retorna o status.
+        Útil para que jobs rápidos não precisem de polling pela tela.
+        """
+        prazo = time.monotonic() + timeout
+        while True:
+            job = self.status(chave)
+            if job is None or job["status"] in (CONCLUIDO, ERRO) or time.monotonic() >= prazo:
+                return job
+            time.sleep(intervalo)
+
+    def resultado(self, chave):
+        """
+        Retorna o resultado de um job concluído.
+        """
+        with self.pool.leitura() as conn:
+            linha = conn.execute("SELECT resultado FROM jobs WHERE chave = ? AND status = ?;",
+                                 (chave, CONCLUIDO)).fetchone()
+        if linha is None:
+            raise KeyError(f"Job sem resultado: {chave}")
+        return pickle.loads(linha[0])
+
+    def limpar(self, idade=IDADE_MAXIMA_JOBS):
+        """
+        Apaga os jobs terminados há mais de 'idade' segundos.
+        """
+        with self.pool.escrita() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND concluido_em < ?;",
+                         (CONCLUIDO, ERRO, time.time() - idade))
@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from pricing_engine import NOMES_CHAVES
+
+COLUNAS_SIMULACAO = [
+    "Último Preço",
+    "Preço Simulado",
+    "Demanda Estimada",
+    "Demanda Atual",
+    "Lucro Estimado",
+    "Lucro Atual",
+    "Diferença % Lucro",
+]
+
+_SIMULADORES = {}
+_SIMULADORES_LOCK = threading.Lock()
+
+
+class PriceSimulator:
+    """
+    Simulação de preços ("e se o preço mudar X%?") sobre as curvas de um PricingEngine.
+    - As curvas de demanda acumulada de todos os segmentos ficam em duas matrizes
+      (segmentos x pontos), completadas com +inf nos preços e 0 na demanda.
+    - A demanda em um preço qualquer é interpolada linearmente entre os preços observados;
+      abaixo do menor preço vale a demanda total e acima do maior, zero.
+    - Qualquer quantidade de pares (segmento, preço) é respondida em uma única chamada vetorizada.
+    """
+
+    def __init__(self, engine):
+        self.chaves = list(engine.chaves)
+        self.revisao, curvas = engine.curvas()
+        self.segmentos = sorted(curvas)
+        self._indice = {segmento: i for i, segmento in enumerate(self.segmentos)}
+
+        pontos = max((len(curvas[s][0]) for s in self.segmentos), default=0)
+        self.precos = np.full((len(self.segmentos), pontos), np.inf)
+        self.demanda = np.zeros((len(self.segmentos), pontos))
+        self.ultimo_preco = np.full(len(self.segmentos), np.nan)
+        self.custo = np.full(len(self.segmentos), np.nan)
+        for i, segmento in enumerate(self.segmentos):
+            precos, demanda, ultimo_preco, custo = curvas[segmento]
+            self.precos[i, :len(precos)] = precos
+            self.demanda[i, :len(demanda)] = demanda
+            self.ultimo_preco[i], self.custo[i] = ultimo_preco, custo
+
+    def indices(self, segmentos):
+        """
+        Posições dos segmentos nas matrizes (KeyError para segmento desconhecido).
+        """
+        return np.array([self._indice[tuple(s)] for s in segmentos], dtype=np.int64)
+
+    def demanda_em(self, indices, precos):
+        """
+        Demanda estimada de cada segmento (posição em 'indices') no preço correspondente de 'precos'.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        precos = np.asarray(precos, dtype=float)
+        if not len(self.segmentos):
+            return np.zeros(len(precos))
+        linhas_precos, linhas_demanda = self.precos[indices], self.demanda[indices]
+
+        # Primeiro ponto com preço >= p (ou o fim da curva) e o ponto anterior
+        direita = (linhas_precos < precos[:, None]).sum(axis=1)
+        n_pontos = np.isfinite(linhas_precos).sum(axis=1)
+        esquerda = np.maximum(direita - 1, 0)
+        linhas = np.arange(len(indices))
+
+        p0, p1 = linhas_precos[linhas, esquerda], linhas_precos[linhas, np.minimum(direita, self.precos.shape[1] - 1)]
+        d0, d1 = linhas_demanda[linhas, esquerda], linhas_demanda[linhas, np.minimum(direita, self.precos.shape[1] - 1)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            interpolada = d0 + (d1 - d0) * (precos - p0) / (p1 - p0)
+
+        return np.select(
+            [direita == 0, direita >= n_pontos, p1 == precos],
+            [linhas_demanda[:, 0], 0.0, d1],
+            interpolada,
+        )
+
+    def simular(self, variacao=0.0, segmentos=None, precos=None):
+        """
+        Simula os segmentos pedidos (todos, por padrão) em 'precos' ou, se não informados, no
+        último preço com 'variacao' percentual (ex.: 5 = +5%). Retorna demanda e lucro
+        estimados no preço simulado e no último preço, com as chaves renomeadas como na tela.
+        """
+        segmentos = self.segmentos if segmentos is None else [tuple(s) for s in segmentos]
+        indices = self.indices(segmentos)
+        ultimo = self.ultimo_preco[indices]
+        precos = ultimo * (1 + variacao / 100) if precos is None else np.broadcast_to(
+            np.asarray(precos, dtype=float), ultimo.shape)
+        custo = self.custo[indices]
+
+        demanda = self.demanda_em(indices, precos)
+        demanda_atual = self.demanda_em(indices, ultimo)
+        lucro, lucro_atual = (precos - custo) * demanda, (ultimo - custo) * demanda_atual
+        with np.errstate(divide="ignore", invalid="ignore"):
+            diferenca = np.round((lucro - lucro_atual) * 100 / np.abs(lucro_atual), 1)
+
+        tabela = pd.DataFrame(segmentos, columns=self.chaves)
+        metricas = pd.DataFrame(np.column_stack([ultimo, precos, demanda, demanda_atual, lucro, lucro_atual, diferenca]),
+                                columns=COLUNAS_SIMULACAO)
+        tabela = pd.concat([tabela, metricas], axis=1)
+        return tabela.rename(columns=NOMES_CHAVES)
+
+    def curva_lucro(self, segmento, pontos=100):
+        """
+        Lucro e demanda estimados em 'pontos' preços igualmente espaçados entre o menor e o
+        maior preço observado do segmento, para gráficos.
+        """
+        i = self._indice[tuple(segmento)]
+        observados = self.precos[i][np.isfinite(self.precos[i])]
+        precos = np.linspace(observados.min(), observados.max(), pontos)
+        demanda = self.demanda_em(np.full(pontos, i), precos)
+        return pd.DataFrame({"Preço": precos, "Demanda": demanda, "Lucro": (precos - self.custo[i]) * demanda})
+
+
+def obter_simulador(engine):
+    """
+    Retorna o PriceSimulator de 'engine', reconstruído só quando a revisão do motor muda (a cada
+    fit, append ou limpar; sincronizar faz um deles sempre que a versão dos dados muda, inclusive
+    por alterações e exclusões).
+    """
+    with _SIMULADORES_LOCK:
+        simulador = _SIMULADORES.get(id(engine))
+        if simulador is None or simulador.revisao != engine.revisao:
+            simulador = _SIMULADORES[id(engine)] = PriceSimulator(engine)
+        return simulador
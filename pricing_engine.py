@@ -0,0 +1,390 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from database_manager import CHAVES_MATERIALIZADAS, COLUNAS_METRICAS_PRECOS, DatabaseManager
+from instrumentation import instrumentar
+
+# Nomes exibidos para as chaves de segmentação (na ordem em que aparecem nas tabelas)
+NOMES_CHAVES = {
+    "Product_line": "Produto",
+    "Branch": "Filial",
+    "City": "Cidade",
+    "Customer_type": "Tipo de Cliente",
+    "Gender": "Gênero",
+    "Payment": "Pagamento",
+    "Month": "Mês",
+    "Weekday": "Dia da Semana",
+}
+
+# Chaves calculadas a partir da data da venda (iguais às DIMENSOES_DERIVADAS do banco)
+CHAVES_DERIVADAS = {
+    "Month": lambda datas: datas.str[:7],
+    "Weekday": lambda datas: ((pd.to_datetime(datas).dt.dayofweek + 1) % 7).astype(str),
+}
+
+COLUNAS_METRICAS = [
+    "Melhor Preço",
+    "Último Preço",
+    "Diferença % Preço",
+    "% Demanda Capturada",
+    "% Demanda Atual Capturada",
+    "Diferença % Demanda",
+]
+
+# Nomes das métricas na tabela best_prices do banco
+COLUNAS_PRECOS_BANCO = dict(zip(COLUNAS_METRICAS, COLUNAS_METRICAS_PRECOS))
+
+# Colunas lidas do banco para alimentar o motor
+COLUNAS_ENTRADA = ["rowid", "Date_iso", "Unit_price", "Quantity", "gross_income"]
+
+
+def _construir_curvas(janela, chaves):
+    """
+    Constrói de uma vez as curvas de demanda de todos os segmentos presentes em 'janela'.
+    Para cada segmento, devolve os preços em ordem crescente e a demanda acumulada
+    (quantidade vendida a preços >= p), já como arrays NumPy.
+    """
+    if janela.empty:
+        return {}
+
+    agregado = janela.groupby(chaves + ["Unit_price"], sort=True, observed=True)["Quantity"].sum().reset_index()
+    segmentos = agregado.groupby(chaves, sort=False, observed=True).ngroup().to_numpy()
+    precos = agregado["Unit_price"].to_numpy(dtype=float)
+    qtd = agregado["Quantity"].to_numpy(dtype=float)
+
+    # Início de cada segmento no array ordenado e fim (exclusivo) de cada linha
+    inicios = np.flatnonzero(np.r_[True, segmentos[1:] != segmentos[:-1]])
+    fins = np.r_[inicios[1:], len(qtd)]
+    fim_por_linha = np.repeat(fins, np.diff(np.r_[inicios, len(qtd)]))
+
+    # Soma acumulada do fim para o começo, descontando o que pertence aos segmentos seguintes
+    sufixo = np.r_[np.cumsum(qtd[::-1])[::-1], 0.0]
+    demanda = sufixo[:-1] - sufixo[fim_por_linha]
+
+    chaves_segmentos = agregado[chaves].iloc[inicios].itertuples(index=False, name=None)
+    return {
+        segmento: (p, d)
+        for segmento, p, d in zip(chaves_segmentos, np.split(precos, inicios[1:]), np.split(demanda, inicios[1:]))
+    }
+
+
+class PricingEngine:
+    """
+    Motor de otimização de preços por segmento.
+    - Mantém as vendas dos últimos 'months' meses agregadas por (segmento, dia, preço).
+    - Guarda a curva de demanda acumulada de cada segmento em arrays NumPy ordenados.
+    - Novas vendas (append) só recalculam as curvas dos segmentos afetados.
+    - O melhor preço de cada segmento fica em cache até a próxima atualização.
+    - 'versao' é a versão dos dados do banco refletida no motor (mantida por sincronizar).
+    """
+
+    def __init__(self, chaves=("Product_line",), months=3):
+        self.chaves = list(chaves)
+        self.months = months
+        self.revisao = 0
+        self._lock = threading.RLock()
+        self.limpar()
+
+    def limpar(self):
+        """
+        Descarta todas as vendas do motor (ex.: a tabela de vendas ficou vazia).
+        """
+        with self._lock:
+            self.ultimo_rowid = 0
+            self.linhas = 0
+            self.versao = None
+            self._janela = None
+            self._data_max = None
+            self._ultimos = {}
+            self._curvas = {}
+            self._resultados = {}
+            self._tabela = None
+            self.revisao += 1
+
+    def _preparar(self, df):
+        df = df[self.chaves + ["Date", "Unit_price", "Quantity"]].copy()
+        df["Date"] = pd.to_datetime(df["Date"])
+        return df
+
+    def _atualizar_ultimos(self, df):
+        ultimos = df.groupby(self.chaves, sort=False, observed=True)[["Unit_price", "cost"]].last()
+        for segmento, (preco, custo) in zip(ultimos.index, ultimos.to_numpy()):
+            segmento = segmento if isinstance(segmento, tuple) else (segmento,)
+            self._ultimos[segmento] = (preco, custo)
+            self._resultados.pop(segmento, None)
+
+    def _agregar(self, df):
+        return df.groupby(self.chaves + ["Date", "Unit_price"], as_index=False, observed=True)["Quantity"].sum()
+
+    def fit(self, df, df_ultimos=None):
+        """
+        Constrói o motor a partir das vendas em 'df' (colunas das chaves, Date, Unit_price,
+        Quantity e cost). 'df_ultimos' traz o último preço/custo de cada segmento quando 'df'
+        contém apenas o período recente; por padrão eles são tirados do próprio 'df'.
+        """
+        with self._lock:
+            vendas = self._preparar(df)
+            self._data_max = vendas["Date"].max()
+            corte = self._data_max - pd.DateOffset(months=self.months)
+            self._janela = self._agregar(vendas[vendas["Date"] >= corte])
+
+            self._ultimos, self._resultados, self._tabela = {}, {}, None
+            self._atualizar_ultimos(df if df_ultimos is None else df_ultimos)
+            self._curvas = _construir_curvas(self._janela, self.chaves)
+            self.linhas = len(df)
+            if "rowid" in df.columns and len(df):
+                self.ultimo_rowid = int(df["rowid"].max())
+            self.versao = None
+            self.revisao += 1
+        return self
+
+    def append(self, df_novo):
+        """
+        Incorpora novas vendas (mesmas colunas de fit). Se a data máxima avançar, as vendas
+        que saíram da janela de 'months' meses são descartadas. Só os segmentos com vendas
+        novas ou descartadas têm a curva recalculada.
+        """
+        if df_novo.empty:
+            return self
+        if self._janela is None:
+            return self.fit(df_novo)
+
+        with self._lock:
+            novas = self._preparar(df_novo)
+            self._data_max = max(self._data_max, novas["Date"].max())
+            corte = self._data_max - pd.DateOffset(months=self.months)
+
+            janela = pd.concat([self._janela, self._agregar(novas[novas["Date"] >= corte])], ignore_index=True)
+            saiu = janela["Date"] < corte
+            afetados = set(janela.loc[saiu, self.chaves].itertuples(index=False, name=None))
+            afetados |= set(novas[self.chaves].itertuples(index=False, name=None))
+            self._janela = janela[~saiu].reset_index(drop=True)
+
+            self._atualizar_ultimos(df_novo)
+            linhas_afetadas = pd.MultiIndex.from_frame(self._janela[self.chaves]).isin(list(afetados))
+            curvas = _construir_curvas(self._janela[linhas_afetadas], self.chaves)
+            for segmento in afetados:
+                self._resultados.pop(segmento, None)
+                if segmento in curvas:
+                    self._curvas[segmento] = curvas[segmento]
+                else:
+                    self._curvas.pop(segmento, None)
+            self._tabela = None
+            self.linhas += len(df_novo)
+            if "rowid" in df_novo.columns:
+                self.ultimo_rowid = max(self.ultimo_rowid, int(df_novo["rowid"].max()))
+            self.versao = None
+            self.revisao += 1
+        return self
+
+    def curva(self, segmento):
+        """
+        Retorna (preços crescentes, demanda acumulada) do segmento.
+        """
+        return self._curvas[tuple(segmento)]
+
+    def curvas(self):
+        """
+        Retorna (revisão, {segmento: (preços, demanda acumulada, último preço, custo)}) de todos
+        os segmentos. 'revisao' muda a cada fit/append, servindo de chave para caches derivados.
+        """
+        with self._lock:
+            return self.revisao, {
+                segmento: (precos, demanda) + tuple(self._ultimos.get(segmento, (np.nan, np.nan)))
+                for segmento, (precos, demanda) in self._curvas.items()
+            }
+
+    def melhor_preco(self, segmento):
+        """
+        Retorna o melhor preço do segmento e as métricas de demanda, em um dicionário.
+        O resultado fica em cache até que o segmento receba novas vendas.
+        """
+        segmento = tuple(segmento)
+        resultado = self._resultados.get(segmento)
+        if resultado is None:
+            resultado = self._resultados[segmento] = self._calcular(segmento)
+        return resultado
+
+    def _calcular(self, segmento):
+        precos, demanda = self._curvas[segmento]
+        ultimo_preco, custo = self._ultimos.get(segmento, (np.nan, np.nan))
+
+        # Primeiro máximo = menor preço entre empates, como o idxmax do cálculo original
+        melhor = int(np.argmax((precos - custo) * demanda))
+        capturada = np.round(demanda * 100 / demanda.max(), 1)
+        posicao_atual = np.flatnonzero(precos == ultimo_preco)
+        atual = capturada[posicao_atual[0]] if len(posicao_atual) else np.nan
+
+        return {
+            "Melhor Preço": precos[melhor],
+            "Último Preço": ultimo_preco,
+            "Diferença % Preço": np.round((precos[melhor] - ultimo_preco) * 100 / ultimo_preco, 1),
+            "% Demanda Capturada": capturada[melhor],
+            "% Demanda Atual Capturada": atual,
+            "Diferença % Demanda": np.round((capturada[melhor] - atual) * 100 / atual, 1),
+        }
+
+    @instrumentar("precos.melhores_precos")
+    def melhores_precos(self):
+        """
+        Retorna o melhor preço de todos os segmentos, no formato exibido na tela de precificação.
+        """
+        with self._lock:
+            if self._tabela is None:
+                segmentos = sorted(self._curvas)
+                tabela = pd.DataFrame(segmentos, columns=self.chaves)
+                metricas = pd.DataFrame([self.melhor_preco(s) for s in segmentos], columns=COLUNAS_METRICAS)
+                tabela = pd.concat([tabela, metricas], axis=1)
+
+                ordem = [c for c in NOMES_CHAVES if c in self.chaves]
+                ordem += [c for c in self.chaves if c not in NOMES_CHAVES]
+                self._tabela = tabela[ordem + COLUNAS_METRICAS].rename(columns=NOMES_CHAVES)
+            return self._tabela
+
+
+def _preparar_entrada(df, chaves=()):
+    for chave in chaves:
+        if chave in CHAVES_DERIVADAS and chave not in df:
+            df[chave] = CHAVES_DERIVADAS[chave](df["Date_iso"])
+    df = df.rename(columns={"Date_iso": "Date"})
+    df["cost"] = df["Unit_price"] - df["gross_income"]
+    return df
+
+
+@instrumentar("precos.sincronizar")
+def sincronizar(engine, db):
+    """
+    Mantém 'engine' em dia com a tabela de vendas de 'db' (um DatabaseManager).
+    - Se a versão dos dados (sales_meta) é a mesma da última chamada, nada é lido.
+    - Se desde a última chamada houve apenas inserções (a versão avançou exatamente o número de
+      linhas novas), lê só as vendas com rowid acima do último visto e faz append; chaves
+      derivadas da data (Month, Weekday) são calculadas sobre essas linhas.
+    - Na primeira chamada, ou se linhas foram alteradas ou apagadas, reconstrói o motor a partir
+      das tabelas materializadas demand_curve e last_price, que já vêm agregadas.
+    Os triggers mantêm essas tabelas corretas a cada edição; o motor em memória só acompanha as
+    edições porque é comparado com a versão dos dados a cada chamada.
+    """
+    with engine._lock, db.snapshot():
+        versao = db.get_data_version()
+        if engine.versao == versao:
+            return engine
+        total, max_rowid = db.get_fingerprint()
+        if not total:
+            engine.limpar()
+            engine.versao = versao
+            return engine
+
+        # Cada linha inserida, alterada ou apagada soma 1 à versão
+        anterior, novas = engine.versao, total - engine.linhas
+        if engine._janela is not None and anterior is not None and novas == versao - anterior:
+            colunas = [c for c in engine.chaves if c not in CHAVES_DERIVADAS]
+            df_novo = db.read_frame(colunas + COLUNAS_ENTRADA, filtros={"rowid": {">": engine.ultimo_rowid}})
+            if len(df_novo) == novas:
+                engine.append(_preparar_entrada(df_novo, engine.chaves))
+                engine.versao = versao
+                return engine
+
+        _, data_max = db.get_demand_curve_date_range()
+        corte = pd.Timestamp(data_max) - pd.DateOffset(months=engine.months)
+        df = db.read_demand_curve(engine.chaves, data_inicio=corte).rename(columns={"Date_iso": "Date"})
+        engine.fit(df, _preparar_entrada(db.read_last_prices(engine.chaves)))
+        engine.linhas, engine.ultimo_rowid, engine.versao = total, max_rowid, versao
+        return engine
+
+
+def _calcular_precos(db_name, chaves, meses):
+    # Executada nos processos do pool: abre o próprio DatabaseManager e devolve (versão, tabela)
+    db = DatabaseManager(db_name)
+    with db.snapshot():
+        return db.get_data_version(), sincronizar(PricingEngine(chaves, meses), db).melhores_precos()
+
+
+def salvar_precos(db, chaves, meses, tabela, versao):
+    """
+    Persiste em 'db' a tabela de melhores_precos() de 'chaves' e 'meses', calculada na 'versao'.
+    """
+    nomes = {nome: chave for chave, nome in NOMES_CHAVES.items()}
+    db.save_prices(chaves, meses, tabela.rename(columns={**nomes, **COLUNAS_PRECOS_BANCO}), versao)
+
+
+def precos_calculados(db, chaves, meses=3):
+    """
+    Retorna a tabela de melhores preços pré-calculada (no formato de melhores_precos()) se ela
+    foi calculada na versão atual dos dados, ou None.
+    """
+    with db.snapshot():
+        if db.get_prices_run(chaves, meses) != db.get_data_version():
+            return None
+        tabela = db.read_prices(chaves, meses)
+    return tabela.rename(columns={**NOMES_CHAVES, **{b: m for m, b in COLUNAS_PRECOS_BANCO.items()}})
+
+
+def obter_precos(db, chaves, meses=3, engine=None):
+    """
+    Melhores preços de 'chaves': os pré-calculados, se estão em dia, ou os de 'engine' (um
+    PricingEngine novo, por padrão) sincronizado com o banco.
+    """
+    precos = precos_calculados(db, chaves, meses)
+    if precos is None:
+        precos = sincronizar(engine or PricingEngine(chaves, meses), db).melhores_precos()
+    return precos
+
+
+def combinacoes_chaves(max_chaves=None):
+    """
+    Todas as combinações não vazias de CHAVES_MATERIALIZADAS com até 'max_chaves' chaves.
+    """
+    max_chaves = len(CHAVES_MATERIALIZADAS) if max_chaves is None else max_chaves
+    return [list(c) for n in range(1, max_chaves + 1) for c in combinations(CHAVES_MATERIALIZADAS, n)]
+
+
+def atualizar_precos(db, combinacoes=None, meses=3, workers=1, progresso=None, forcar=False):
+    """
+    Calcula e persiste os melhores preços de cada combinação de chaves (todas as de
+    combinacoes_chaves(), por padrão) que esteja desatualizada, ou de todas com 'forcar'.
+    Com 'workers' > 1 as combinações são calculadas em processos separados, cada um lendo o
+    banco por conta própria. 'progresso(feitos, total)' é chamado a cada combinação concluída.
+    Retorna {tupla de chaves: tabela} das combinações recalculadas.
+    """
+    combinacoes = combinacoes_chaves() if combinacoes is None else [list(c) for c in combinacoes]
+    versao = db.get_data_version()
+    pendentes = [c for c in combinacoes if forcar or db.get_prices_run(c, meses) != versao]
+    calculadas = {}
+
+    def concluir(chaves, resultado):
+        versao_calculo, tabela = resultado
+        salvar_precos(db, chaves, meses, tabela, versao_calculo)
+        calculadas[tuple(chaves)] = tabela
+        if progresso is not None:
+            progresso(len(calculadas), len(pendentes))
+
+    if workers <= 1:
+        for chaves in pendentes:
+            concluir(chaves, _calcular_precos(db.db_name, chaves, meses))
+        return calculadas
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futuros = {executor.submit(_calcular_precos, db.db_name, chaves, meses): chaves for chaves in pendentes}
+        for futuro in as_completed(futuros):
+            concluir(futuros[futuro], futuro.result())
+    return calculadas
+
+
+def calcular_preco_otimizado(df, chaves=['Product_line'], months=3, df_ultimos=None):
+    """
+    Calcula o preço otimizado de cada segmento com base nos últimos 'months' meses.
+    Mantida por compatibilidade: constrói um PricingEngine e devolve melhores_precos().
+    - 'df' precisa das colunas das chaves, Date, Unit_price, Quantity e cost.
+    - 'df_ultimos' (opcional) traz o último custo e preço de cada chave, quando 'df' contém
+      apenas o período filtrado; por padrão eles são tirados do próprio 'df'.
+
+    Retorna um DataFrame com as colunas:
+        [Produto, (Cidade), Melhor Preço, Último Preço, Diferença % Preço,
+         % Demanda Capturada, % Demanda Atual Capturada, Diferença % Demanda]
+    """
+    return PricingEngine(chaves, months).fit(df, df_ultimos).melhores_precos()
@@ -0,0 +1,261 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from mlxtend.preprocessing import TransactionEncoder
+from mlxtend.frequent_patterns import apriori, association_rules
+
+from database_manager import COLUNAS_SEGMENTACAO
+from instrumentation import instrumentar
+
+# Colunas lidas do banco para montar as transações
+COLUNAS_RECOMENDADOR = ["Branch", "Gender", "Customer_type", "Date", "Product_line"]
+
+# Uma transação reúne as categorias compradas na mesma filial, pelo mesmo tipo de cliente, no mesmo dia
+CHAVES_TRANSACAO = ["Branch", "Customer_type", "Date"]
+
+# Processos usados para minerar segmentos em paralelo no método "apriori"
+WORKERS_PADRAO = int(os.environ.get("RECOMENDADOR_WORKERS", os.cpu_count() or 1))
+
+# Nomes das métricas no mlxtend -> nomes guardados no banco
+METRICAS_MLXTEND = {
+    "antecedent support": "antecedent_support",
+    "consequent support": "consequent_support",
+    "support": "support",
+    "confidence": "confidence",
+    "lift": "lift",
+    "leverage": "leverage",
+    "conviction": "conviction",
+}
+
+
+def _regras_transacoes(transactions, min_support=0.0001, min_confidence=0.01):
+    """
+    Roda Apriori + association_rules sobre uma lista de transações e mantém só as regras
+    1 -> 1 com lift > 1, com antecedente e consequente como texto.
+    """
+    te = TransactionEncoder()
+    te_ary = te.fit(transactions).transform(transactions)
+    df = pd.DataFrame(te_ary, columns=te.columns_)
+
+    frequent_itemsets = apriori(df, min_support=min_support, use_colnames=True)
+    if frequent_itemsets.empty:
+        return pd.DataFrame(columns=["antecedente", "consequente"] + list(METRICAS_MLXTEND.values()))
+
+    rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence,
+                              num_itemsets=len(frequent_itemsets))
+    rules = rules[(rules["antecedents"].apply(len) == 1) & (rules["consequents"].apply(len) == 1)]
+    rules = rules[rules["lift"] > 1.0]
+
+    regras = rules[list(METRICAS_MLXTEND)].rename(columns=METRICAS_MLXTEND)
+    regras.insert(0, "antecedente", rules["antecedents"].apply(lambda itens: next(iter(itens))))
+    regras.insert(1, "consequente", rules["consequents"].apply(lambda itens: next(iter(itens))))
+    return regras.reset_index(drop=True)
+
+
+def _minerar_segmento(filtros, transactions, min_support, min_confidence):
+    # Executada nos processos do pool: precisa ser uma função de módulo (serializável)
+    regras = _regras_transacoes(transactions, min_support, min_confidence)
+    for coluna, valor in filtros.items():
+        regras[coluna] = valor
+    return regras
+
+
+_EXECUTORES = {}
+_EXECUTORES_LOCK = threading.Lock()
+
+
+def _executor(workers):
+    """
+    Pool de processos reutilizado entre chamadas (um por quantidade de workers).
+    Usa 'spawn' para não herdar as threads do servidor do Streamlit em um fork.
+    """
+    with _EXECUTORES_LOCK:
+        if workers not in _EXECUTORES:
+            _EXECUTORES[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                       mp_context=multiprocessing.get_context("spawn"))
+        return _EXECUTORES[workers]
+
+
+@instrumentar("recomendador.apriori")
+def minerar_regras(vendas, colunas, min_support=0.0001, min_confidence=0.01, workers=1, progresso=None):
+    """
+    Minera as regras de associação de cada combinação de valores de 'colunas'
+    (subconjunto de Branch, Gender, Customer_type), com Apriori por segmento.
+    - 'workers' > 1 distribui os segmentos entre processos (ver WORKERS_PADRAO).
+    - 'progresso(feitos, total)' é chamada a cada segmento concluído.
+
+    Retorna (regras, segmentos):
+    - regras: DataFrame com as colunas de segmentação, antecedente, consequente e métricas.
+    - segmentos: lista de dicionários {coluna: valor}, na ordem em que aparecem nas vendas.
+    """
+    # Um único groupby separa as vendas de todos os segmentos, na ordem de aparição
+    tarefas = []
+    for valores, filtrado in vendas.groupby(colunas, sort=False, observed=True):
+        filtros = dict(zip(colunas, valores))
+        transactions = filtrado.groupby(CHAVES_TRANSACAO, observed=True)["Product_line"].apply(list).tolist()
+        tarefas.append((filtros, transactions))
+    segmentos = [filtros for filtros, _ in tarefas]
+
+    todas = [None] * len(tarefas)
+    if workers > 1 and len(tarefas) > 1:
+        pool = _executor(workers)
+        futuros = {pool.submit(_minerar_segmento, filtros, transactions, min_support, min_confidence): i
+                   for i, (filtros, transactions) in enumerate(tarefas)}
+        for feitos, futuro in enumerate(as_completed(futuros), start=1):
+            todas[futuros[futuro]] = futuro.result()
+            if progresso:
+                progresso(feitos, len(tarefas))
+    else:
+        for i, (filtros, transactions) in enumerate(tarefas):
+            todas[i] = _minerar_segmento(filtros, transactions, min_support, min_confidence)
+            if progresso:
+                progresso(i + 1, len(tarefas))
+
+    regras = pd.concat(todas, ignore_index=True) if todas else pd.DataFrame()
+    return regras, segmentos
+
+
+@instrumentar("recomendador.pares")
+def minerar_regras_pares(vendas, colunas, min_support=0.0001, min_confidence=0.01, workers=1, progresso=None,
+                         tamanho_bloco=100_000):
+    """
+    Mesma saída de minerar_regras, calculada em uma única passada vetorizada.
+    Como só interessam regras 1 -> 1, basta contar, por segmento, quantas transações contêm
+    cada categoria e cada par de categorias; não é preciso rodar o Apriori completo.
+    - As transações de todos os segmentos são agrupadas uma única vez.
+    - A cesta de cada transação vira uma linha de uma matriz booleana (transações x categorias).
+    - As contagens de itens e de pares saem de produtos matriciais com a matriz de segmentos,
+      em blocos de 'tamanho_bloco' transações para limitar a memória.
+    'workers' existe só para manter a assinatura de minerar_regras (aqui não há processos);
+    'progresso(feitos, total)' é chamada a cada bloco processado.
+    """
+    segmentos = vendas[colunas].drop_duplicates().to_dict("records")
+    if not segmentos:
+        return pd.DataFrame(columns=colunas + ["antecedente", "consequente"] + list(METRICAS_MLXTEND.values())), []
+    chaves = CHAVES_TRANSACAO + [c for c in colunas if c not in CHAVES_TRANSACAO]
+
+    # Código do segmento (na ordem de aparição) e da transação de cada venda
+    seg_venda = vendas.groupby(colunas, sort=False, observed=True).ngroup().to_numpy()
+    transacao = vendas.groupby(chaves, sort=False, observed=True).ngroup().to_numpy()
+    item, itens = pd.factorize(vendas["Product_line"], sort=True)
+    n_seg, n_trans, n_itens = len(segmentos), transacao.max() + 1, len(itens)
+
+    cestas = np.zeros((n_trans, n_itens), dtype=bool)
+    cestas[transacao, item] = True
+    seg_transacao = np.empty(n_trans, dtype=np.int64)
+    seg_transacao[transacao] = seg_venda
+
+    total = np.bincount(seg_transacao, minlength=n_seg).astype(float)
+    cont_item = np.zeros((n_seg, n_itens))
+    cont_par = np.zeros((n_seg, n_itens * n_itens))
+    n_blocos = -(-n_trans // tamanho_bloco)
+    for n_bloco, inicio in enumerate(range(0, n_trans, tamanho_bloco), start=1):
+        bloco = cestas[inicio:inicio + tamanho_bloco].astype(float)
+        segs = np.zeros((n_seg, len(bloco)))
+        segs[seg_transacao[inicio:inicio + tamanho_bloco], np.arange(len(bloco))] = 1.0
+        cont_item += segs @ bloco
+        cont_par += segs @ (bloco[:, :, None] * bloco[:, None, :]).reshape(len(bloco), -1)
+        if progresso:
+            progresso(n_bloco, n_blocos)
+
+    # Métricas de todas as regras (segmento, antecedente, consequente) de uma vez
+    s, a, c = np.meshgrid(np.arange(n_seg), np.arange(n_itens), np.arange(n_itens), indexing="ij")
+    s, a, c = s.ravel(), a.ravel(), c.ravel()
+    support = cont_par.ravel() / total[s]
+    antecedent_support = cont_item[s, a] / total[s]
+    consequent_support = cont_item[s, c] / total[s]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confidence = support / antecedent_support
+        lift = confidence / consequent_support
+        conviction = np.where(confidence < 1, (1 - consequent_support) / (1 - confidence), np.inf)
+
+    manter = (a != c) & (support >= min_support) & (confidence >= min_confidence) & (lift > 1.0)
+    regras = pd.DataFrame({
+        "antecedente": itens[a[manter]],
+        "consequente": itens[c[manter]],
+        "antecedent_support": antecedent_support[manter],
+        "consequent_support": consequent_support[manter],
+        "support": support[manter],
+        "confidence": confidence[manter],
+        "lift": lift[manter],
+        "leverage": (support - antecedent_support * consequent_support)[manter],
+        "conviction": conviction[manter],
+    })
+    valores_segmentos = pd.DataFrame(segmentos, columns=colunas)
+    for coluna in colunas:
+        regras[coluna] = valores_segmentos[coluna].to_numpy()[s[manter]]
+    return regras, segmentos
+
+
+# Algoritmos de mineração disponíveis; "pares" é o padrão por ser equivalente e bem mais rápido
+METODOS = {"pares": minerar_regras_pares, "apriori": minerar_regras}
+
+
+def sincronizar_regras(db, colunas, metodo="pares", workers=1, progresso=None, vendas=None):
+    """
+    Garante que as regras persistidas da segmentação 'colunas' são da versão atual dos dados de
+    vendas, minerando-as de novo só se ela mudou desde a última mineração.
+    Retorna (versão dos dados, segmentos) da mineração persistida; as regras ficam no banco
+    (read_rules). Os demais parâmetros são os de obter_regras.
+    """
+    versao = db.get_data_version()
+    execucao = db.get_rules_run(colunas)
+    if execucao is None or execucao[0] != versao:
+        if vendas is None:
+            vendas = db.read_frame(COLUNAS_RECOMENDADOR)
+        regras, segmentos = METODOS[metodo](vendas, colunas, workers=workers, progresso=progresso)
+        db.save_rules(colunas, regras, segmentos, versao)
+        execucao = (versao, segmentos)
+    return execucao
+
+
+@instrumentar("recomendador.obter_regras")
+def obter_regras(db, colunas, top=None, metodo="pares", workers=1, progresso=None, vendas=None):
+    """
+    Retorna (regras, segmentos) da segmentação 'colunas' a partir das tabelas do banco.
+    As regras só são mineradas de novo quando a versão dos dados de vendas mudou desde a
+    última mineração; caso contrário é apenas uma leitura indexada.
+    'metodo' escolhe o algoritmo de mineração em METODOS; 'workers' e 'progresso' são
+    repassados a ele. 'vendas' (opcional) evita reler o banco quando o chamador já tem as vendas
+    em memória (ex.: o SalesDataset compartilhado).
+    """
+    _, segmentos = sincronizar_regras(db, colunas, metodo, workers, progresso, vendas)
+    return db.read_rules(colunas, top=top), segmentos
+
+
+def combinacoes_segmentacao():
+    """
+    Todas as combinações não vazias de COLUNAS_SEGMENTACAO.
+    """
+    return [list(c) for n in range(1, len(COLUNAS_SEGMENTACAO) + 1) for c in combinations(COLUNAS_SEGMENTACAO, n)]
+
+
+def atualizar_regras(db, segmentacoes=None, metodo="pares", workers=1, progresso=None, forcar=False):
+    """
+    Minera e persiste as regras de todas as segmentações (todas as combinações não vazias de
+    Branch, Gender e Customer_type, por padrão) que estejam desatualizadas, ou de todas com 'forcar'.
+    'progresso(feitos, total)' é chamado a cada segmentação verificada.
+    Retorna a lista de segmentações que foram recalculadas.
+    """
+    if segmentacoes is None:
+        segmentacoes = combinacoes_segmentacao()
+
+    versao = db.get_data_version()
+    recalculadas = []
+    vendas = None
+    for feitas, colunas in enumerate(segmentacoes, start=1):
+        execucao = db.get_rules_run(colunas)
+        if forcar or execucao is None or execucao[0] != versao:
+            if vendas is None:
+                vendas = db.read_frame(COLUNAS_RECOMENDADOR)
+            regras, segmentos = METODOS[metodo](vendas, colunas, workers=workers)
+            db.save_rules(colunas, regras, segmentos, versao)
+            recalculadas.append(colunas)
+        if progresso is not None:
+            progresso(feitas, len(segmentacoes))
+    return recalculadas
@@ -0,0 +1,66 @@
+import threading
+
+import pandas as pd
+
+from database_manager import COLUNAS_VENDAS
+from instrumentation import instrumentar
+
+# Colunas de texto com poucos valores distintos, guardadas como category para economizar memória
+COLUNAS_CATEGORICAS = ["Branch", "City", "Customer_type", "Gender", "Product_line", "Payment"]
+
+
+class SalesDataset:
+    """
+    Vendas carregadas uma única vez por processo e compartilhadas por todas as telas.
+    - As colunas de texto repetitivo viram category e a coluna Date já vem como datetime.
+    - A cada acesso só a versão dos dados (sales_meta, mantida por trigger) é consultada;
+      o DataFrame é recarregado apenas quando supermarket_sales mudou.
+    - O DataFrame devolvido é compartilhado: quem precisar alterá-lo deve trabalhar numa cópia.
+    - Com um SalesSnapshot, as vendas são lidas do snapshot colunar (atualizado antes, na mesma
+      transação de leitura do banco) em vez de linha a linha do SQLite.
+    """
+
+    def __init__(self, db, snapshot=None):
+        self.db = db
+        self.snapshot = snapshot
+        self._atual = None
+        self._lock = threading.Lock()
+
+    @instrumentar("dados.carregar_vendas")
+    def _carregar(self):
+        colunas = [c if c != "Date" else "Date_iso" for c in COLUNAS_VENDAS]
+        dtype = {c: "category" for c in COLUNAS_CATEGORICAS}
+        if self.snapshot is not None:
+            self.snapshot.atualizar()
+            dados = self.snapshot.ler(colunas, ordenar_por=["rowid"], dtype=dtype)
+        else:
+            dados = self.db.read_frame(colunas, dtype=dtype)
+        dados = dados.rename(columns={"Date_iso": "Date"})
+        dados["Date"] = pd.to_datetime(dados["Date"], format="%Y-%m-%d")
+        return dados
+
+    def get_versionado(self):
+        """
+        Retorna (versão, DataFrame de vendas), recarregando as vendas se a versão dos dados mudou.
+        A versão devolvida é sempre a do DataFrame devolvido, útil para caches derivados.
+        """
+        versao = self.db.get_data_version()
+        atual = self._atual
+        if atual is None or atual[0] != versao:
+            with self._lock:
+                atual = self._atual
+                if atual is None or atual[0] != versao:
+                    with self.db.snapshot():
+                        atual = (self.db.get_data_version(), self._carregar())
+                    self._atual = atual
+        return atual
+
+    def get(self):
+        """
+        Retorna o DataFrame de vendas, recarregando-o se a versão dos dados mudou.
+        """
+        return self.get_versionado()[1]
+
+    @property
+    def versao(self):
+        return self._atual[0] if self._atual else None
@@ -0,0 +1,205 @@
+import json
+import operator
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from database_manager import COLUNAS_VENDAS
+from instrumentation import instrumentar
+
+# Onde fica o snapshot colunar das vendas (uma pasta por geração, com partições Month=/Branch=)
+DIRETORIO_SNAPSHOT = os.environ.get("SNAPSHOT_DIR", "snapshot_vendas")
+
+# Linhas lidas do SQLite por vez ao gravar o snapshot
+TAMANHO_PARTE = 100_000
+
+# Arquivos acima dos quais as atualizações incrementais são consolidadas em uma nova geração
+MAX_ARQUIVOS = 500
+
+COMPRESSAO = "zstd"
+
+# Colunas do snapshot: as da tabela, a data ISO e o rowid (para atualizar e ordenar)
+ESQUEMA = pa.schema(
+    [(c, pa.float64() if c in ("Unit_price", "Tax_5", "Total", "cogs", "gross_margin_percentage",
+                                "gross_income", "Rating")
+      else pa.int64() if c == "Quantity" else pa.string()) for c in COLUNAS_VENDAS]
+    + [("Date_iso", pa.string()), ("rowid", pa.int64()), ("Month", pa.string())]
+)
+COLUNAS_SNAPSHOT = [c for c in ESQUEMA.names if c != "Month"]
+
+# Pastas de partição (hive): Month=YYYY-MM/Branch=X
+PARTICOES = pa.schema([("Month", pa.string()), ("Branch", pa.string())])
+
+OPERADORES = {"=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le,
+              ">": operator.gt, ">=": operator.ge}
+
+
+def _data_iso(valor):
+    return valor.strftime("%Y-%m-%d") if hasattr(valor, "strftime") else str(valor)
+
+
+def _expressao(filtros=None, data_inicio=None, data_fim=None):
+    """
+    Filtro do Arrow equivalente ao WHERE de DatabaseManager.read_frame (mesmo formato de
+    'filtros'). Os limites de data também filtram a partição Month, para que meses inteiros
+    nem sejam abertos.
+    """
+    condicoes = []
+    for coluna, valor in (filtros or {}).items():
+        if coluna not in COLUNAS_SNAPSHOT:
+            raise ValueError(f"Coluna inexistente no snapshot: {coluna!r}")
+        if isinstance(valor, dict):
+            for simbolo, limite in valor.items():
+                if simbolo not in OPERADORES:
+                    raise ValueError(f"Operador inválido: {simbolo!r}. Use um de {list(OPERADORES)}")
+                condicoes.append(OPERADORES[simbolo](ds.field(coluna), limite))
+        elif isinstance(valor, (list, tuple, set)):
+            condicoes.append(ds.field(coluna).isin(list(valor)))
+        else:
+            condicoes.append(ds.field(coluna) == valor)
+    if data_inicio is not None:
+        data_inicio = _data_iso(data_inicio)
+        condicoes += [ds.field("Month") >= data_inicio[:7], ds.field("Date_iso") >= data_inicio]
+    if data_fim is not None:
+        data_fim = _data_iso(data_fim)
+        condicoes += [ds.field("Month") <= data_fim[:7], ds.field("Date_iso") <= data_fim]
+
+    expressao = None
+    for condicao in condicoes:
+        expressao = condicao if expressao is None else expressao & condicao
+    return expressao
+
+
+class SalesSnapshot:
+    """
+    Cópia colunar (Parquet com zstd) da tabela supermarket_sales para leituras analíticas.
+    - O SQLite continua sendo o banco transacional; o snapshot é atualizado a partir dele.
+    - Os arquivos ficam particionados por mês e filial: filtros de data e de Branch descartam
+      pastas inteiras, e os demais filtros usam as estatísticas de cada arquivo (predicate
+      pushdown). Só as colunas pedidas são lidas, com memory map.
+    - Se desde a última atualização houve apenas inserções, só as linhas novas (rowid acima do
+      último gravado) são escritas, em arquivos novos; alterações ou exclusões (detectadas pelo
+      contador de versão dos dados) geram uma nova geração completa.
+    - A lista de arquivos válidos fica em _estado.json, gravado por último: leitores nunca veem
+      arquivos incompletos de uma atualização em andamento.
+    """
+
+    def __init__(self, db, diretorio=DIRETORIO_SNAPSHOT):
+        self.db = db
+        self.diretorio = diretorio
+        self._arquivo_estado = os.path.join(diretorio, "_estado.json")
+        self._lock = threading.Lock()
+        self._fs = fs.LocalFileSystem(use_mmap=True)
+
+    def estado(self):
+        """
+        Retorna o estado gravado ({geracao, arquivos, linhas, ultimo_rowid, versao}) ou None.
+        """
+        try:
+            with open(self._arquivo_estado, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def _gravar_estado(self, estado):
+        provisorio = f"{self._arquivo_estado}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(provisorio, "w", encoding="utf-8") as arquivo:
+            json.dump(estado, arquivo)
+        os.replace(provisorio, self._arquivo_estado)
+
+    def _escrever(self, geracao, filtros, prefixo):
+        # Lê do SQLite em partes e grava em streaming; devolve os arquivos escritos (relativos)
+        def lotes():
+            for parte in self.db.read_frame(COLUNAS_SNAPSHOT, filtros=filtros, chunksize=TAMANHO_PARTE):
+                parte["Month"] = parte["Date_iso"].str[:7]
+                yield pa.RecordBatch.from_pandas(parte, schema=ESQUEMA, preserve_index=False)
+
+        base = os.path.join(self.diretorio, geracao)
+        escritos = []
+        ds.write_dataset(
+            lotes(), base, schema=ESQUEMA, format="parquet",
+            partitioning=ds.partitioning(PARTICOES, flavor="hive"),
+            basename_template=f"{prefixo}-{{i}}.parquet",
+            file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSAO),
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=lambda arquivo: escritos.append(os.path.relpath(arquivo.path, base)),
+        )
+        return escritos
+
+    @instrumentar("snapshot.atualizar")
+    def atualizar(self):
+        """
+        Deixa o snapshot igual à tabela de vendas. Retorna {modo, linhas, segundos}, com modo
+        "atual" (nada a fazer), "incremental" (só inserções) ou "completo" (nova geração).
+        """
+        inicio = time.perf_counter()
+        with self._lock, self.db.snapshot():
+            versao = self.db.get_data_version()
+            total, max_rowid = self.db.get_fingerprint()
+            max_rowid = max_rowid or 0
+            estado = self.estado()
+            if estado is not None and estado["versao"] == versao:
+                return {"modo": "atual", "linhas": 0, "segundos": round(time.perf_counter() - inicio, 3)}
+
+            # Cada linha inserida, alterada ou apagada soma 1 à versão: se a diferença de versão é
+            # igual ao número de linhas novas, tudo o que aconteceu foram essas inserções
+            novas = None if estado is None else total - estado["linhas"]
+            incremental = (estado is not None and novas == versao - estado["versao"]
+                           and len(estado["arquivos"]) < MAX_ARQUIVOS)
+            if incremental:
+                escritos = self._escrever(estado["geracao"], {"rowid": {">": estado["ultimo_rowid"]}},
+                                          f"parte-{estado['ultimo_rowid'] + 1}-{max_rowid}")
+                estado.update(arquivos=estado["arquivos"] + escritos, linhas=total,
+                              ultimo_rowid=max_rowid, versao=versao)
+                self._gravar_estado(estado)
+                return {"modo": "incremental", "linhas": novas,
+                        "segundos": round(time.perf_counter() - inicio, 3)}
+
+            geracao = f"geracao-{uuid.uuid4().hex[:12]}"
+            escritos = self._escrever(geracao, None, f"parte-1-{max_rowid}")
+            os.makedirs(self.diretorio, exist_ok=True)
+            self._gravar_estado({"geracao": geracao, "arquivos": escritos, "linhas": total,
+                                 "ultimo_rowid": max_rowid, "versao": versao})
+            # Remove as gerações anteriores, que já não estão no estado
+            for nome in os.listdir(self.diretorio):
+                if nome.startswith("geracao-") and nome != geracao:
+                    shutil.rmtree(os.path.join(self.diretorio, nome), ignore_errors=True)
+            return {"modo": "completo", "linhas": total, "segundos": round(time.perf_counter() - inicio, 3)}
+
+    def dataset(self):
+        """
+        Dataset do Arrow com os arquivos da geração atual (vazio se o snapshot não existe).
+        """
+        estado = self.estado()
+        if estado is None or not estado["arquivos"]:
+            return ds.dataset(ESQUEMA.empty_table())
+        base = os.path.join(self.diretorio, estado["geracao"])
+        return ds.dataset([os.path.join(base, arquivo) for arquivo in estado["arquivos"]], schema=ESQUEMA,
+                          format="parquet", filesystem=self._fs, partition_base_dir=base,
+                          partitioning=ds.partitioning(PARTICOES, flavor="hive"))
+
+    @instrumentar("snapshot.ler")
+    def ler(self, colunas=None, filtros=None, data_inicio=None, data_fim=None, ordenar_por=None, dtype=None):
+        """
+        Lê vendas do snapshot para um DataFrame, com a mesma interface de DatabaseManager.read_frame:
+        só as 'colunas' pedidas são lidas e 'filtros', 'data_inicio' e 'data_fim' são aplicados
+        na leitura dos arquivos. 'ordenar_por' ordena pelas colunas dadas (ex.: ["rowid"] para a
+        ordem do SQLite); 'dtype' converte tipos (ex.: {"City": "category"}).
+        """
+        colunas = list(colunas or COLUNAS_VENDAS)
+        invalidas = [c for c in colunas + list(ordenar_por or []) if c not in COLUNAS_SNAPSHOT]
+        if invalidas:
+            raise ValueError(f"Colunas inexistentes no snapshot: {invalidas}")
+
+        lidas = colunas + [c for c in ordenar_por or [] if c not in colunas]
+        tabela = self.dataset().to_table(columns=lidas, filter=_expressao(filtros, data_inicio, data_fim))
+        if ordenar_por:
+            tabela = tabela.sort_by([(c, "ascending") for c in ordenar_por])
+        dados = tabela.select(colunas).to_pandas()
+        return dados.astype(dtype) if dtype else dados
@@ -0,0 +1,56 @@
+import threading
+
+# Dimensões do cubo (grão mais fino) e medidas somáveis
+DIMENSOES_CUBO = ["Product_line", "Month", "City", "Payment", "Gender"]
+MEDIDAS_CUBO = ["Total", "Quantity", "vendas"]
+
+_CUBOS = {}
+_CUBOS_LOCK = threading.Lock()
+
+
+class SummaryCube:
+    """
+    Faturamento (Total), quantidade e número de vendas agregados por linha de produto, mês,
+    cidade, forma de pagamento e gênero, calculados em uma única passada sobre as vendas.
+    Qualquer resumo por um subconjunto dessas dimensões sai do cubo (poucas centenas de
+    linhas) com rollup(), sem voltar às vendas.
+    """
+
+    def __init__(self, dados, versao=None):
+        self.versao = versao
+        vendas = dados.assign(Month=dados["Date"].dt.to_period("M"))
+        self.dados = vendas.groupby(DIMENSOES_CUBO, observed=True).agg(
+            Total=("Total", "sum"),
+            Quantity=("Quantity", "sum"),
+            vendas=("Total", "size"),
+        ).reset_index()
+
+    def rollup(self, dimensoes=(), ordenar_por=None, ascendente=False):
+        """
+        Soma as medidas pelas 'dimensoes' pedidas (subconjunto de DIMENSOES_CUBO).
+        Sem dimensões, retorna os totais gerais (Series). 'ordenar_por' ordena pela medida dada.
+        """
+        dimensoes = list(dimensoes)
+        invalidas = [d for d in dimensoes if d not in DIMENSOES_CUBO]
+        if invalidas:
+            raise ValueError(f"Dimensões inválidas: {invalidas}")
+        if not dimensoes:
+            return self.dados[MEDIDAS_CUBO].sum()
+
+        resumo = self.dados.groupby(dimensoes, observed=True)[MEDIDAS_CUBO].sum()
+        if ordenar_por is not None:
+            resumo = resumo.sort_values(ordenar_por, ascending=ascendente, kind="stable")
+        return resumo
+
+
+def obter_cubo(dataset):
+    """
+    Retorna o SummaryCube do SalesDataset 'dataset', recalculado só quando a versão dos
+    dados de vendas muda.
+    """
+    versao, dados = dataset.get_versionado()
+    with _CUBOS_LOCK:
+        cubo = _CUBOS.get(id(dataset))
+        if cubo is None or cubo.versao != versao:
+            cubo = _CUBOS[id(dataset)] = SummaryCube(dados, versao)
+        return cubo
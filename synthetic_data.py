@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from database_manager import COLUNAS_CSV, COLUNAS_VENDAS, DatabaseManager
+
+# CSV original, modelo das distribuições
+CSV_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supermarket_sales.csv")
+
+# Linhas geradas (e gravadas) por vez
+TAMANHO_PARTE = 100_000
+
+# Desvio do ruído multiplicativo aplicado aos preços amostrados
+RUIDO_PRECO = 0.05
+
+# Margem bruta fixa do dataset original
+MARGEM_BRUTA = 4.761904762
+
+
+def carregar_base(caminho=CSV_BASE):
+    """
+    Lê o CSV original, que serve de modelo para as distribuições dos dados sintéticos.
+    """
+    base = pd.read_csv(caminho).rename(columns=COLUNAS_CSV)
+    base["Date"] = pd.to_datetime(base["Date"], format="%m/%d/%Y")
+    return base
+
+
+def gerar_vendas(n, seed=0, base=None, inicio=None, dias=None, tamanho_parte=TAMANHO_PARTE, primeiro_id=0):
+    """
+    Gera 'n' vendas sintéticas no schema de supermarket_sales, em DataFrames de no máximo
+    'tamanho_parte' linhas (gerador), sem manter tudo em memória.
+    - Cada venda parte de uma linha do CSV sorteada: filial, cidade, tipo de cliente, gênero,
+      linha de produto, pagamento, quantidade e nota mantêm a distribuição conjunta original.
+    - O preço unitário é o da linha sorteada com um ruído de RUIDO_PRECO, para que existam
+      muitos preços distintos por produto; impostos, total e custos são recalculados dele.
+    - As datas são uniformes em 'dias' dias a partir de 'inicio' (por padrão, o mesmo período
+      do CSV) e os horários entre 10:00 e 20:59, como no original.
+    - Para a mesma 'seed' o resultado é sempre o mesmo, qualquer que seja 'tamanho_parte'
+      consumido por vez (cada parte tem seu próprio gerador aleatório).
+    - Os Invoice_ID são numerados a partir de 'primeiro_id' (que também entra nos geradores):
+      para completar um banco, passe um valor acima dos já usados e as vendas novas não repetem
+      nem os IDs nem as linhas sorteadas das anteriores.
+    """
+    base = carregar_base() if base is None else base
+    inicio = base["Date"].min() if inicio is None else pd.Timestamp(inicio)
+    dias = (base["Date"].max() - base["Date"].min()).days + 1 if dias is None else dias
+
+    for numero, primeira in enumerate(range(0, n, tamanho_parte)):
+        tamanho = min(tamanho_parte, n - primeira)
+        rng = np.random.default_rng([seed, primeiro_id, numero])
+        vendas = base.iloc[rng.integers(0, len(base), tamanho)].reset_index(drop=True)
+
+        preco = np.round(vendas["Unit_price"].to_numpy() * rng.lognormal(0.0, RUIDO_PRECO, tamanho), 2)
+        quantidade = vendas["Quantity"].to_numpy()
+        cogs = np.round(preco * quantidade, 2)
+        imposto = cogs * 0.05
+        datas = inicio + pd.to_timedelta(rng.integers(0, dias, tamanho), unit="D")
+        minutos = rng.integers(10 * 60, 21 * 60, tamanho)
+        ids = pd.Series(np.arange(primeiro_id + primeira, primeiro_id + primeira + tamanho) + seed * 10**9)
+        ids = ids.astype(str).str.zfill(10)
+
+        vendas = vendas.assign(
+            Invoice_ID=ids.str[:4] + "-" + ids.str[4:6] + "-" + ids.str[6:],
+            Unit_price=preco,
+            Tax_5=imposto,
+            Total=cogs + imposto,
+            Date=datas.month.astype(str) + "/" + datas.day.astype(str) + "/" + datas.year.astype(str),
+            Time=pd.Series(minutos // 60).map("{:02d}".format) + ":" + pd.Series(minutos % 60).map("{:02d}".format),
+            cogs=cogs,
+            gross_margin_percentage=MARGEM_BRUTA,
+            gross_income=imposto,
+        )
+        yield vendas[COLUNAS_VENDAS]
+
+
+def criar_banco(caminho, n, seed=0, tamanho_parte=TAMANHO_PARTE, **kwargs):
+    """
+    Cria (ou completa) o banco 'caminho' com 'n' vendas sintéticas de gerar_vendas, gravadas
+    parte a parte com insert_many. Ao completar um banco, a numeração das vendas novas começa
+    depois do maior rowid existente, sem repetir Invoice_ID. Retorna as estatísticas de carga somadas.
+    """
+    db = DatabaseManager(caminho)
+    primeiro_id = db.get_fingerprint()[1] or 0
+    linhas = inseridas = 0
+    segundos = 0.0
+    for parte in gerar_vendas(n, seed, tamanho_parte=tamanho_parte, primeiro_id=primeiro_id, **kwargs):
+        stats = db.insert_many(parte.itertuples(index=False, name=None), tamanho_lote=tamanho_parte)
+        linhas, inseridas, segundos = linhas + stats["linhas"], inseridas + stats["inseridas"], segundos + stats["segundos"]
+    return {
+        "linhas": linhas,
+        "inseridas": inseridas,
+        "segundos": round(segundos, 3),
+        "linhas_por_segundo": round(linhas / segundos, 1) if segundos > 0 else float(linhas),
+    }
+
+
+def criar_csv(caminho, n, seed=0, tamanho_parte=TAMANHO_PARTE, **kwargs):
+    """
+    Grava 'n' vendas sintéticas em um CSV no formato do supermarket_sales.csv (mesmos cabeçalhos),
+    que pode ser carregado com DatabaseManager.load_csv.
+    """
+    cabecalhos = {coluna: nome for nome, coluna in COLUNAS_CSV.items()}
+    with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+        for numero, parte in enumerate(gerar_vendas(n, seed, tamanho_parte=tamanho_parte, **kwargs)):
+            parte.rename(columns=cabecalhos).to_csv(arquivo, index=False, header=numero == 0)
+    return os.path.getsize(caminho)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera vendas sintéticas no schema do supermercado.")
+    parser.add_argument("linhas", type=int, help="Quantidade de vendas a gerar")
+    parser.add_argument("--db", help="Banco SQLite a criar ou completar")
+    parser.add_argument("--csv", help="Arquivo CSV a gerar (formato do supermarket_sales.csv)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dias", type=int, help="Período coberto pelas vendas (padrão: o do CSV original)")
+    parser.add_argument("--parte", type=int, default=TAMANHO_PARTE, help="Linhas geradas por vez")
+    args = parser.parse_args()
+    if not args.db and not args.csv:
+        parser.error("informe --db e/ou --csv")
+
+    if args.db:
+        stats = criar_banco(args.db, args.linhas, args.seed, args.parte, dias=args.dias)
+        print(f"{stats['inseridas']}/{stats['linhas']} linhas em {stats['segundos']}s ({stats['linhas_por_segundo']} linhas/s)")
+    if args.csv:
+        tamanho = criar_csv(args.csv, args.linhas, args.seed, args.parte, dias=args.dias)
+        print(f"{args.csv}: {tamanho / 1e6:.1f} MB")
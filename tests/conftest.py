@@ -0,0 +1,26 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Medições de desempenho dos testes não vão para o metricas.jsonl do repositório
+os.environ.setdefault("METRICAS_LOG", "")
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from database_manager import DatabaseManager  # noqa: E402
+
+# Banco versionado no repositório, ainda sem as migrações aplicadas
+BANCO_BASE = os.path.join(RAIZ, "supermarket_sales.db")
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    DatabaseManager sobre uma cópia do banco do repositório (migrada ao abrir).
+    """
+    caminho = tmp_path / "vendas.db"
+    shutil.copy(BANCO_BASE, caminho)
+    return DatabaseManager(str(caminho))
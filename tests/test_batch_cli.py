@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pandas as pd
+
+from batch_cli import executar
+from conftest import RAIZ
+from pricing_engine import PricingEngine, precos_calculados, sincronizar
+
+
+def test_precos_pre_calculados_iguais_ao_motor_e_invalidados_por_edicao(db, tmp_path):
+    resumo = executar(db, max_chaves=1, workers=1, saida=str(tmp_path), log=lambda texto: None)
+    assert resumo["precos"]["recalculadas"] == resumo["precos"]["total"] == 8
+    assert (tmp_path / "precos-Product_line-3m.csv").exists()
+    assert (tmp_path / "regras-Branch+Gender+Customer_type.csv").exists()
+
+    for chaves in (["Product_line"], ["Weekday"]):
+        esperado = sincronizar(PricingEngine(chaves), db).melhores_precos()
+        pd.testing.assert_frame_equal(precos_calculados(db, chaves), esperado, check_dtype=False)
+
+    # Nada a refazer enquanto os dados não mudam; depois de uma edição, o pré-cálculo não vale mais
+    assert executar(db, max_chaves=1, log=lambda texto: None)["precos"]["recalculadas"] == 0
+    with db.pool.escrita() as conn:
+        conn.execute("UPDATE supermarket_sales SET Unit_price = Unit_price * 2 WHERE rowid = 1;")
+    assert precos_calculados(db, ["Product_line"]) is None
+
+
+def test_batch_cli_nao_importa_streamlit():
+    codigo = "import sys, batch_cli; sys.exit('streamlit' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ).returncode == 0
@@ -0,0 +1,97 @@
+import itertools
+
+import pytest
+
+import chat_cache
+from chat_cache import ChatCache
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    # time.time() controlado pelo teste: avança um segundo a cada leitura, a partir de 'agora'
+    estado = {"agora": 1_000_000.0}
+    passos = itertools.count()
+    monkeypatch.setattr(chat_cache.time, "time", lambda: estado["agora"] + next(passos))
+    return estado
+
+
+def _cache(tmp_path, **kwargs):
+    return ChatCache(str(tmp_path / "chat_cache.db"), **kwargs)
+
+
+def _gerar(*trechos):
+    return lambda: iter(trechos)
+
+
+def test_chave_estavel_e_sensivel_ao_contexto():
+    chave = ChatCache.chave("phi3", 7, "Qual a categoria com MAIOR faturamento?")
+    assert chave == ChatCache.chave("phi3", 7, "  qual a categoria com maior faturamento ")
+    assert chave == ChatCache.chave("phi3", 7, "Qual a categória com maior faturamento")
+    assert len({chave,
+                ChatCache.chave("llama3", 7, "Qual a categoria com maior faturamento?"),
+                ChatCache.chave("phi3", 8, "Qual a categoria com maior faturamento?"),
+                ChatCache.chave("phi3", 7, "Qual a categoria com maior faturamento?", contexto="Yangon"),
+                ChatCache.chave("phi3", 7, "Qual a categoria com maior faturamento?", modo="ferramentas")}) == 5
+
+
+def test_resposta_repetida_vem_do_cache(tmp_path):
+    cache, metrica = _cache(tmp_path), {}
+    chave = ChatCache.chave("phi3", 1, "oi")
+    assert "".join(cache.responder(chave, _gerar("Olá", ", tudo bem?"), metrica=metrica)) == "Olá, tudo bem?"
+    assert metrica["cache"] is False
+
+    falhar = lambda: pytest.fail("não deveria gerar de novo")
+    assert "".join(cache.responder(chave, falhar, metrica=metrica)) == "Olá, tudo bem?"
+    assert metrica["cache"] is True
+    assert cache.estatisticas()["acertos"] == 1 and cache.estatisticas()["consultas"] == 2
+
+
+def test_respostas_vencem_apos_o_ttl(tmp_path, relogio):
+    cache = _cache(tmp_path, ttl=100)
+    cache.put("a", "resposta")
+    assert cache.get("a") == "resposta"
+    relogio["agora"] += 101
+    assert cache.get("a") is None
+    cache.put("b", "outra")
+    assert cache.estatisticas()["respostas"] == 1
+
+
+def test_descarta_as_menos_usadas_acima_da_capacidade(tmp_path, relogio):
+    cache = _cache(tmp_path, max_respostas=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+    assert cache.estatisticas()["respostas"] == 2
+
+
+def test_nova_versao_dos_dados_nao_usa_respostas_antigas(db, tmp_path):
+    cache = _cache(tmp_path)
+    pergunta = "Qual o faturamento total?"
+    antes = ChatCache.chave("phi3", db.get_data_version(), pergunta)
+    "".join(cache.responder(antes, _gerar("R$ 322.966,75")))
+
+    db.update_data("750-67-8428", Quantity=8)
+    depois = ChatCache.chave("phi3", db.get_data_version(), pergunta)
+    assert depois != antes
+    metrica = {}
+    assert "".join(cache.responder(depois, _gerar("R$ 323.000,00"), metrica=metrica)) == "R$ 323.000,00"
+    assert metrica["cache"] is False
+
+
+def test_resposta_interrompida_nao_e_guardada(tmp_path):
+    cache = _cache(tmp_path)
+
+    def gerar():
+        yield "Começo da resposta"
+        raise ConnectionError("servidor caiu")
+
+    with pytest.raises(ConnectionError):
+        "".join(cache.responder("a", gerar))
+    assert cache.get("a") is None
+    assert cache.estatisticas()["respostas"] == 0
+
+    # Nem uma resposta em branco
+    "".join(cache.responder("b", _gerar(" ", "\n")))
+    assert cache.get("b") is None
@@ -0,0 +1,66 @@
+from chat_context import estimar_tokens
+from chat_memory import MemoriaConversa, contexto_modelo, resumo_truncado
+
+MODELO = "phi3"
+
+
+def _conversa(turnos, tamanho=600):
+    mensagens = []
+    for i in range(turnos):
+        mensagens.append({"role": "user", "content": f"pergunta {i} " + "x" * tamanho})
+        mensagens.append({"role": "assistant", "content": f"resposta {i} " + "y" * tamanho})
+    return mensagens
+
+
+def _tokens(mensagens):
+    return sum(estimar_tokens(m["content"]) for m in mensagens)
+
+
+def test_resumidor_recebe_todas_as_mensagens_que_saem_em_ordem():
+    memoria, resumidas, chamadas = MemoriaConversa(), [], []
+
+    def resumidor(model_name, resumo, mensagens, limite_tokens):
+        chamadas.append(len(mensagens))
+        resumidas.extend(mensagens)
+        return f"resumo de {len(resumidas)} mensagens"
+
+    historico = _conversa(60)
+    for fim in range(1, len(historico) + 1):
+        envio = memoria.mensagens_para_envio(MODELO, historico[:fim], system="S", resumidor=resumidor)
+        assert _tokens(envio) <= memoria.orcamento(MODELO)
+        assert envio[-1] == historico[fim - 1]
+
+    # Nenhuma mensagem some sem passar pelo resumidor, e ele não roda a cada turno
+    assert resumidas == historico[:memoria.compactadas]
+    assert envio[2:] == historico[memoria.compactadas:]
+    assert envio[1]["content"].endswith(f"resumo de {memoria.compactadas} mensagens")
+    assert len(chamadas) < len(historico) / 4
+
+
+def test_resumo_do_modelo_e_limitado():
+    memoria = MemoriaConversa()
+    envio = memoria.mensagens_para_envio(MODELO, _conversa(20), resumidor=lambda *args: "z" * 100_000)
+    assert _tokens(envio) <= memoria.orcamento(MODELO)
+
+
+def test_sem_resumidor_usa_resumo_truncado():
+    memoria = MemoriaConversa()
+    historico = _conversa(20)
+    envio = memoria.mensagens_para_envio(MODELO, historico, resumidor=lambda *args: None)
+    assert envio[0]["content"].startswith("Resumo da conversa até aqui:\n- Usuário: pergunta ")
+    assert _tokens(envio) <= memoria.orcamento(MODELO)
+
+
+def test_resumo_truncado_descarta_as_linhas_mais_antigas():
+    resumo = resumo_truncado("", _conversa(50), limite_tokens=200)
+    assert estimar_tokens(resumo) <= 200
+    assert "resposta 49" in resumo and "pergunta 0 " not in resumo
+
+
+def test_historico_limpo_recomeca_a_memoria():
+    memoria = MemoriaConversa()
+    memoria.mensagens_para_envio(MODELO, _conversa(20), resumidor=lambda *args: "resumo")
+    assert memoria.compactadas
+    envio = memoria.mensagens_para_envio(MODELO, [{"role": "user", "content": "oi"}])
+    assert envio == [{"role": "user", "content": "oi"}] and memoria.resumo == ""
+    assert contexto_modelo("phi3:mini") == 4096
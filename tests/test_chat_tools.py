@@ -0,0 +1,96 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import chat_tools
+from chat_backend import ChatBackend
+from chat_tools import LIMITE_LINHAS_RESULTADO, FerramentasChat
+from database_manager import LIMITE_MAXIMO_LINHAS
+
+
+def _erro(resultado):
+    return json.loads(resultado)["erro"]
+
+
+@pytest.mark.parametrize("argumentos", [
+    {"medida": "Invoice_ID", "agregacao": "sum"},
+    {"medida": "Total", "agregacao": "sum", "agrupar_por": ["Invoice_ID"]},
+    {"medida": "Total", "agregacao": "sum", "agrupar_por": "City; DROP TABLE supermarket_sales"},
+    {"medida": "Total", "agregacao": "sum", "filtros": {"rowid": 1}},
+    {"medida": "Total", "agregacao": "group_concat"},
+])
+def test_colunas_e_agregacoes_fora_da_lista_sao_recusadas(db, argumentos):
+    ferramentas = FerramentasChat(db)
+    with pytest.raises(ValueError):
+        ferramentas.consultar_vendas(**argumentos)
+    assert _erro(ferramentas.executar("consultar_vendas", argumentos))
+    assert db.get_fingerprint()[0] == 1000
+
+
+@pytest.mark.parametrize("operador", ["LIKE", "IS NOT", "= 1 OR 1 =", "; DROP TABLE supermarket_sales; --"])
+def test_operadores_fora_da_lista_nos_filtros_sao_recusados(db, operador):
+    argumentos = {"medida": "Total", "agregacao": "sum", "filtros": {"City": {operador: "Yangon"}}}
+    assert "Operador inválido" in _erro(FerramentasChat(db).executar("consultar_vendas", argumentos))
+    with pytest.raises(ValueError, match="Operador inválido"):
+        db.aggregate_sales(["City"], filtros={"Unit_price": {operador: 10}})
+
+
+def test_filtros_com_operadores_validos(db):
+    resultado = FerramentasChat(db).consultar_vendas(
+        "Total", "count", filtros={"City": {"!=": "Yangon"}, "Branch": ""}, agrupar_por="City")
+    assert set(resultado["City"]) == {"Mandalay", "Naypyitaw"}
+
+
+def test_limite_de_linhas_e_limitado(db):
+    ferramentas = FerramentasChat(db)
+    detalhado = ["Product_line", "City", "Gender", "Payment", "Customer_type", "Month"]
+    assert len(ferramentas.consultar_vendas("Total", "sum", agrupar_por=detalhado, limite=10_000)) == LIMITE_LINHAS_RESULTADO
+    assert len(ferramentas.consultar_vendas("Total", "sum", agrupar_por=detalhado, limite=-5)) == 1
+    assert len(ferramentas.consultar_vendas("Total", "sum", agrupar_por=detalhado, limite="muitas")) == 10
+    assert len(db.aggregate_sales(detalhado, limite=10**9)) == LIMITE_MAXIMO_LINHAS
+
+
+def test_consulta_lenta_e_interrompida_e_a_conexao_continua_utilizavel(db, monkeypatch):
+    with db.pool.leitura() as conn:
+        emprestada = conn
+
+    with pytest.raises(TimeoutError):
+        db.aggregate_sales(["Product_line", "City", "Month"], timeout=0)
+    monkeypatch.setattr(chat_tools, "TIMEOUT_CONSULTA", 0)
+    assert "interrompida" in _erro(FerramentasChat(db).executar(
+        "consultar_vendas", {"medida": "Total", "agregacao": "sum", "agrupar_por": ["Product_line"]}))
+
+    # A mesma conexão volta ao pool, sem o limite de tempo da consulta interrompida
+    with db.pool.leitura() as conn:
+        assert conn is emprestada
+        assert conn.execute("SELECT COUNT(*) FROM supermarket_sales;").fetchone()[0] == 1000
+    assert len(db.aggregate_sales(["Product_line", "City", "Month"], timeout=None, limite=200)) == 54
+
+
+def test_ferramenta_desconhecida_vira_erro(db):
+    assert "desconhecida" in _erro(FerramentasChat(db).executar("apagar_vendas", {}))
+
+
+class _ClienteFalso:
+    # Pede uma chamada de ferramenta na primeira rodada e responde com texto na segunda
+    def __init__(self):
+        self.enviadas = []
+
+    def chat(self, model, messages, stream, tools, keep_alive, options):
+        self.enviadas.append([dict(m) for m in messages])
+        if len(self.enviadas) == 1:
+            chamada = SimpleNamespace(function=SimpleNamespace(
+                name="consultar_vendas", arguments={"medida": "Total", "agregacao": "sum"}))
+            return iter([{"message": {"content": "", "tool_calls": [chamada]}, "done": True}])
+        return iter([{"message": {"content": "Total calculado."}, "done": True}])
+
+
+def test_resultado_da_ferramenta_vai_no_formato_do_ollama_fixado(db):
+    cliente = _ClienteFalso()
+    resposta = "".join(ChatBackend(client=cliente).conversar("phi3", [{"role": "user", "content": "Total?"}],
+                                                             ferramentas=FerramentasChat(db)))
+    assert resposta == "Total calculado."
+    ferramenta = cliente.enviadas[1][-1]
+    assert set(ferramenta) == {"role", "content"} and ferramenta["role"] == "tool"
+    assert json.loads(ferramenta["content"])[0]["sum_Total"] == pytest.approx(322966.75, abs=0.01)
@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from conftest import BANCO_BASE, RAIZ
+from database_manager import (COLUNAS_CSV, COLUNAS_VENDAS, GRAO_PRECOS, LOTE_MINIMO_CARGA_EM_MASSA, MIGRACOES,
+                              TRIGGERS_CUBO, DatabaseManager, _sql_carga_cubo, get_pool)
+from synthetic_data import gerar_vendas
+
+CSV_BASE = os.path.join(RAIZ, "supermarket_sales.csv")
+
+
+def _tabelas(conn):
+    return {nome for (nome,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+
+
+def test_migracoes_aplicam_no_banco_base(db):
+    original = sqlite3.connect(f"file:{BANCO_BASE}?mode=ro", uri=True)
+    assert original.execute("PRAGMA user_version;").fetchone()[0] == 0
+    linhas = original.execute("SELECT COUNT(*) FROM supermarket_sales;").fetchone()[0]
+
+    with db.pool.leitura() as conn:
+        assert conn.execute("PRAGMA user_version;").fetchone()[0] == len(MIGRACOES)
+        assert {"supermarket_sales", "sales_meta", "demand_curve", "last_price", "recommendation_runs",
+                "recommendation_rules", "price_runs", "best_prices"} <= _tabelas(conn)
+        assert conn.execute("PRAGMA integrity_check;").fetchone()[0] == "ok"
+    assert db.get_fingerprint()[0] == linhas
+
+    # Reabrir o banco já migrado não reaplica nada
+    assert DatabaseManager(db.db_name).get_fingerprint()[0] == linhas
+
+
+def test_date_iso_e_cubo_de_precos_batem_com_as_vendas(db):
+    vendas = db.read_frame(["Date", "Date_iso", "Quantity"] + GRAO_PRECOS)
+    assert (pd.to_datetime(vendas["Date"], format="%m/%d/%Y").dt.strftime("%Y-%m-%d") == vendas["Date_iso"]).all()
+
+    curva = db.read_demand_curve(["Product_line", "City"])
+    esperado = vendas.groupby(["Product_line", "City"])["Quantity"].sum()
+    pd.testing.assert_series_equal(curva.groupby(["Product_line", "City"])["Quantity"].sum(), esperado)
+
+
+def test_triggers_mantem_o_cubo_apos_update_e_delete(db):
+    with db.pool.escrita() as conn:
+        conn.execute("UPDATE supermarket_sales SET Quantity = Quantity + 2 WHERE Branch = 'A';")
+        conn.execute("DELETE FROM supermarket_sales WHERE Payment = 'Cash';")
+
+    vendas = db.read_frame(["Product_line", "Quantity"])
+    curva = db.read_demand_curve(["Product_line"])
+    pd.testing.assert_series_equal(curva.groupby("Product_line")["Quantity"].sum(),
+                                   vendas.groupby("Product_line")["Quantity"].sum())
+    assert db.get_data_version() > 1
+
+
+def _venda(db, invoice_id):
+    return db.read_frame(filtros={"Invoice_ID": invoice_id}).to_dict("records")
+
+
+def test_load_csv_mapeia_cabecalhos_e_grava_em_lotes(tmp_path):
+    db = DatabaseManager(str(tmp_path / "novo.db"))
+    stats = db.load_csv(CSV_BASE, tamanho_lote=300)
+
+    assert stats["linhas"] == stats["inseridas"] == 1000
+    assert stats["linhas_por_segundo"] > 0 and stats["segundos"] >= 0
+    esperado = pd.read_csv(CSV_BASE).rename(columns=COLUNAS_CSV)[COLUNAS_VENDAS]
+    pd.testing.assert_frame_equal(db.read_frame(ordenar_por=["rowid"]), esperado)
+
+
+def test_insert_many_faz_um_commit_por_lote(tmp_path):
+    db = DatabaseManager(str(tmp_path / "novo.db"))
+    registros = pd.read_csv(CSV_BASE).rename(columns=COLUNAS_CSV)[COLUNAS_VENDAS].to_dict("records")
+    registros[450] = dict(registros[450], Invoice_ID=registros[0]["Invoice_ID"])
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert_many(registros, tamanho_lote=300)
+    # O primeiro lote já foi confirmado; o segundo, com o Invoice_ID repetido, voltou inteiro
+    assert db.get_fingerprint()[0] == 300
+
+
+def test_insert_many_trata_invoice_repetido_conforme_conflito(db):
+    registros = db.read_frame(limite=10).assign(Quantity=99)
+    tuplas = list(registros.itertuples(index=False, name=None))
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert_many(tuplas)
+    assert db.insert_many(tuplas, conflito="ignore")["inseridas"] == 0
+    assert (db.read_frame(filtros={"Invoice_ID": list(registros["Invoice_ID"])})["Quantity"] != 99).all()
+
+    assert db.insert_many(tuplas, conflito="replace")["inseridas"] == 10
+    assert db.get_fingerprint()[0] == 1000
+    assert (db.read_frame(filtros={"Invoice_ID": list(registros["Invoice_ID"])})["Quantity"] == 99).all()
+
+    with pytest.raises(ValueError):
+        db.insert_many(tuplas, conflito="upsert")
+    with pytest.raises(ValueError):
+        db.insert_many([(1,)], colunas=["id"])
+
+
+def test_insert_update_e_delete_de_uma_venda(db):
+    venda = dict(_venda(db, "750-67-8428")[0], Invoice_ID="000-00-0001")
+    assert db.insert_data(**venda)["inseridas"] == 1
+    assert _venda(db, "000-00-0001") == [venda]
+
+    assert db.update_data("000-00-0001", Quantity=3, Unit_price=10.0) == 1
+    assert _venda(db, "000-00-0001") == [dict(venda, Quantity=3, Unit_price=10.0)]
+    assert db.update_data("999-99-9999", Quantity=3) == 0
+    with pytest.raises(ValueError):
+        db.update_data("000-00-0001", id=1)
+
+    assert db.delete_data("000-00-0001") == 1
+    assert _venda(db, "000-00-0001") == []
+    assert db.get_fingerprint()[0] == 1000
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert_data(Invoice_ID="000-00-0002", Branch="A")
+
+
+def _cubo_confere_com_as_vendas(db):
+    # demand_curve e last_price têm de ser iguais a uma carga nova a partir de todas as vendas
+    with db.pool.leitura() as conn:
+        for tabela, comando in zip(["demand_curve", "last_price"], _sql_carga_cubo(GRAO_PRECOS)):
+            chaves = GRAO_PRECOS + ["Date_iso"] + (["Unit_price"] if tabela == "demand_curve" else [])
+            ordem = f"ORDER BY {', '.join(chaves)}"
+            atual = pd.read_sql_query(f"SELECT * FROM {tabela} {ordem};", conn)
+            esperado = pd.read_sql_query(f"SELECT * FROM ({comando.split(tabela, 1)[1]}) {ordem};", conn)
+            pd.testing.assert_frame_equal(atual, esperado.set_axis(atual.columns, axis=1), check_dtype=False)
+
+
+def test_cubo_materializado_igual_ao_group_by_apos_cada_escrita(db):
+    vendas = pd.concat(gerar_vendas(3 * LOTE_MINIMO_CARGA_EM_MASSA, primeiro_id=10_000))
+    tuplas = list(vendas.itertuples(index=False, name=None))
+
+    # Poucas linhas: mantidas pelos triggers
+    db.insert_many(tuplas[:10])
+    _cubo_confere_com_as_vendas(db)
+    db.update_data(tuplas[0][0], Unit_price=1.0, Quantity=50)
+    db.delete_data(tuplas[1][0])
+    with db.pool.escrita() as conn:
+        conn.execute("UPDATE supermarket_sales SET City = 'Yangon', Date = '1/1/2019' WHERE Branch = 'B';")
+        conn.execute("DELETE FROM supermarket_sales WHERE Payment = 'Cash' AND rowid % 3 = 0;")
+    _cubo_confere_com_as_vendas(db)
+
+    # Carga em lote: sem triggers, somando só as linhas novas (ou recarregando, com replace)
+    presentes = len(db.read_frame(["Invoice_ID"], filtros={"Invoice_ID": list(vendas["Invoice_ID"][:10])}))
+    stats = db.insert_many(tuplas, tamanho_lote=LOTE_MINIMO_CARGA_EM_MASSA, conflito="ignore")
+    assert stats["inseridas"] == len(tuplas) - presentes
+    _cubo_confere_com_as_vendas(db)
+    substitutas = vendas.iloc[:LOTE_MINIMO_CARGA_EM_MASSA].assign(Quantity=1, Unit_price=2.0)
+    db.insert_many(substitutas.itertuples(index=False, name=None), conflito="replace")
+    _cubo_confere_com_as_vendas(db)
+
+    # Os triggers voltam depois da carga
+    with db.pool.leitura() as conn:
+        nomes = {n for (n,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger';")}
+    assert set(TRIGGERS_CUBO) <= nomes
+    db.delete_data(tuplas[-1][0])
+    _cubo_confere_com_as_vendas(db)
+
+
+def test_carga_em_lote_com_erro_mantem_o_cubo_e_os_triggers(db):
+    repetidas = list(db.read_frame(limite=LOTE_MINIMO_CARGA_EM_MASSA).itertuples(index=False, name=None))
+    with pytest.raises(sqlite3.IntegrityError):
+        db.insert_many(repetidas)
+    with db.pool.leitura() as conn:
+        nomes = {n for (n,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger';")}
+    assert set(TRIGGERS_CUBO) <= nomes
+    _cubo_confere_com_as_vendas(db)
+
+
+def test_conexoes_de_leitura_sao_somente_leitura(db):
+    with db.pool.leitura() as conn:
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("DELETE FROM supermarket_sales;")
+    assert db.get_fingerprint()[0] == 1000
+    assert get_pool(db.db_name) is db.pool
+    assert get_pool(os.path.relpath(db.db_name)) is db.pool
+
+
+def test_escritas_de_threads_diferentes_sao_serializadas(db):
+    eventos, dentro = [], threading.Event()
+
+    def escrever(nome, segurar):
+        with db.pool.escrita() as conn:
+            eventos.append(f"{nome}:inicio")
+            dentro.set()
+            conn.execute("UPDATE supermarket_sales SET Rating = Rating WHERE rowid = 1;")
+            time.sleep(segurar)
+            eventos.append(f"{nome}:fim")
+
+    primeira = threading.Thread(target=escrever, args=("a", 0.3))
+    primeira.start()
+    dentro.wait()
+    segunda = threading.Thread(target=escrever, args=("b", 0))
+    segunda.start()
+    primeira.join()
+    segunda.join()
+    assert eventos == ["a:inicio", "a:fim", "b:inicio", "b:fim"]
+
+
+def test_snapshot_nao_ve_escrita_concorrente(db):
+    venda = dict(_venda(db, "750-67-8428")[0], Invoice_ID="000-00-0001")
+    with db.snapshot():
+        antes = db.get_fingerprint(), db.get_data_version()
+        escritora = threading.Thread(target=lambda: db.insert_data(**venda))
+        escritora.start()
+        escritora.join()
+        assert (db.get_fingerprint(), db.get_data_version()) == antes
+        assert _venda(db, "000-00-0001") == []
+    assert db.get_fingerprint()[0] == antes[0][0] + 1
+    assert db.get_data_version() == antes[1] + 1
+
+
+def test_read_frame_em_partes_igual_a_leitura_inteira(db):
+    argumentos = dict(colunas=["Invoice_ID", "City", "Unit_price", "Date_iso"], filtros={"Branch": ["A", "B"]},
+                      ordenar_por=["Date_iso", "rowid"])
+    inteiro = db.read_frame(**argumentos)
+    partes = list(db.read_frame(**argumentos, chunksize=97))
+    assert len(partes) == -(-len(inteiro) // 97) and all(len(parte) <= 97 for parte in partes)
+    pd.testing.assert_frame_equal(pd.concat(partes, ignore_index=True), inteiro)
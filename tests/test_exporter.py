@@ -0,0 +1,84 @@
+import os
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import exporter
+
+
+@pytest.fixture(autouse=True)
+def diretorio_exportacoes(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "DIRETORIO_EXPORTACOES", str(tmp_path))
+
+
+def _tabela(linhas=2_500):
+    return pd.DataFrame({
+        "Branch": np.resize(["A", "B", "C"], linhas),
+        "antecedente": [f"item {i}" for i in range(linhas)],
+        "confidence": np.linspace(0, 1, linhas),
+        "conviction": np.where(np.arange(linhas) % 7 == 0, np.nan, 1.5),
+    })
+
+
+def test_csv_ida_e_volta():
+    df = _tabela()
+    caminho = exporter.exportar(df, "regras", versao=1, formato="csv", tamanho_parte=1_000)
+    pd.testing.assert_frame_equal(pd.read_csv(caminho, encoding="utf-8-sig"), df)
+
+
+def test_xlsx_ida_e_volta():
+    pytest.importorskip("openpyxl")
+    df = _tabela()
+    caminho = exporter.exportar(df, "regras", versao=1, formato="xlsx", aba="Regras", tamanho_parte=1_000)
+    pd.testing.assert_frame_equal(pd.read_excel(caminho, sheet_name="Regras"), df)
+
+
+def test_tabela_vazia():
+    df = _tabela().iloc[0:0]
+    caminho = exporter.exportar(df, "regras", versao=1, formato="csv")
+    assert list(pd.read_csv(caminho, encoding="utf-8-sig").columns) == list(df.columns)
+
+
+def test_arquivo_reaproveitado_por_versao_e_parametros():
+    df = _tabela(10)
+    caminho = exporter.exportar(df, "precos", versao=1, formato="csv", parametros=["City"])
+    assert exporter.exportar(df.iloc[:1], "precos", versao=1, formato="csv", parametros=["City"]) == caminho
+    assert exporter.exportar(df, "precos", versao=2, formato="csv", parametros=["City"]) != caminho
+    assert exporter.exportar(df, "precos", versao=1, formato="csv", parametros=["Branch"]) != caminho
+
+    with exporter.arquivo_exportado(df, "precos", 1, "csv", parametros=["City"]) as arquivo:
+        assert arquivo.read() == pathlib.Path(caminho).read_bytes()
+    assert arquivo.closed
+
+
+def test_formato_invalido():
+    with pytest.raises(ValueError):
+        exporter.exportar(_tabela(1), "regras", versao=1, formato="parquet")
+    with pytest.raises(ValueError):
+        exporter.gravar(_tabela(1), "saida.txt", formato="txt")
+
+
+def test_versao_nova_apaga_as_anteriores_do_mesmo_nome(tmp_path):
+    df = _tabela(10)
+    v1_city = exporter.exportar(df, "precos", versao=1, formato="csv", parametros=["City"])
+    v1_xlsx = exporter.exportar(df, "precos", versao=1, formato="xlsx")
+    outra = exporter.exportar(df, "precos-cidade", versao=1, formato="csv")
+    regras = exporter.exportar(df, "regras", versao=1, formato="csv")
+
+    v2_city = exporter.exportar(df, "precos", versao=2, formato="csv", parametros=["City"])
+    v2_branch = exporter.exportar(df, "precos", versao=2, formato="csv", parametros=["Branch"])
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        pathlib.Path(c).name for c in (v2_city, v2_branch, outra, regras))
+    assert not pathlib.Path(v1_city).exists() and not pathlib.Path(v1_xlsx).exists()
+
+
+def test_exportacoes_antigas_sao_apagadas(tmp_path):
+    antiga = exporter.exportar(_tabela(10), "regras", versao=1, formato="csv")
+    os.utime(antiga, (time.time() - exporter.IDADE_MAXIMA_EXPORTACOES - 1,) * 2)
+    (tmp_path / "anotacoes.txt").write_text("não é uma exportação")
+
+    nova = exporter.exportar(_tabela(10), "precos", versao=1, formato="csv")
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([pathlib.Path(nova).name, "anotacoes.txt"])
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from inventory import SEM_INFORMACAO, InventoryEngine
+from sales_data import SalesDataset
+
+
+def test_estoque_informado_acompanha_os_segmentos_de_outra_versao(db):
+    dados = SalesDataset(db).get()
+    sem_segmento = (dados["Branch"] == "C") & (dados["Product_line"] == "Health and beauty")
+    anterior = InventoryEngine(dados[~sem_segmento], versao=1)
+    atual = InventoryEngine(dados, versao=2)
+    assert len(anterior.segmentos) == len(atual.segmentos) - 1
+
+    # Estoque informado na tela da versão anterior: um valor distinto por segmento
+    editado = anterior.estoque_atual()
+    editado["Estoque Atual"] = np.arange(len(editado), dtype=float) * 10
+    editado = editado.iloc[::-1]
+
+    alinhado = atual.estoque_atual(editado)
+    pd.testing.assert_frame_equal(alinhado[["Filial", "Produto"]], atual.estoque_atual()[["Filial", "Produto"]])
+    valores = alinhado.set_index(["Filial", "Produto"])["Estoque Atual"]
+    esperado = editado.set_index(["Filial", "Produto"])["Estoque Atual"]
+    pd.testing.assert_series_equal(valores.drop(("C", "Health and beauty")), esperado.reindex(
+        valores.drop(("C", "Health and beauty")).index), check_dtype=False)
+    assert pd.isna(valores[("C", "Health and beauty")])
+
+    situacao = atual.classificar(pd.to_numeric(alinhado["Estoque Atual"], errors="coerce"))
+    assert len(situacao) == len(atual.segmentos)
+    assert situacao.set_index(["Filial", "Produto"]).loc[("C", "Health and beauty"), "Situação"] == SEM_INFORMACAO
+    np.testing.assert_array_equal(situacao["Estoque Atual"], valores.astype(float))
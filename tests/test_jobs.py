@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+from jobs import CONCLUIDO, EXECUTANDO, PENDENTE, JobManager, chave_job
+
+
+def _chaves(jobs):
+    with jobs.pool.leitura() as conn:
+        return {chave for (chave,) in conn.execute("SELECT chave FROM jobs;")}
+
+
+def test_jobs_iguais_compartilham_execucao_e_versoes_antigas_sao_apagadas(tmp_path):
+    jobs = JobManager(str(tmp_path / "jobs.db"))
+    execucoes = []
+    jobs.registrar("dobro", lambda valor, versao, progresso: execucoes.append(valor) or valor * 2)
+
+    v1 = jobs.submeter("dobro", valor=3, versao=1)
+    assert jobs.aguardar(v1, timeout=5)["status"] == CONCLUIDO
+    assert jobs.submeter("dobro", valor=3, versao=1) == v1
+    assert jobs.resultado(v1) == 6 and execucoes == [3]
+
+    v2 = jobs.submeter("dobro", valor=3, versao=2)
+    assert jobs.aguardar(v2, timeout=5)["status"] == CONCLUIDO
+    assert _chaves(jobs) == {v2}
+
+
+def test_limpar_apaga_jobs_antigos(tmp_path):
+    jobs = JobManager(str(tmp_path / "jobs.db"))
+    jobs.registrar("eco", lambda valor, progresso: valor)
+    chave = jobs.submeter("eco", valor=1)
+    jobs.aguardar(chave, timeout=5)
+    jobs.limpar(idade=3600)
+    assert _chaves(jobs) == {chave}
+    jobs.limpar(idade=-1)
+    assert _chaves(jobs) == set()
+
+
+def test_job_anterior_continua_disponivel_ate_o_substituto_concluir(tmp_path):
+    jobs = JobManager(str(tmp_path / "jobs.db"))
+    liberar = threading.Event()
+    jobs.registrar("lento", lambda versao, progresso: liberar.wait(5) and versao * 10)
+
+    v1 = jobs.submeter("lento", versao=1)
+    liberar.set()
+    assert jobs.aguardar(v1, timeout=5)["status"] == CONCLUIDO
+    liberar.clear()
+
+    v2 = jobs.submeter("lento", versao=2)
+    assert jobs.aguardar(v2, timeout=0.2)["status"] in (PENDENTE, EXECUTANDO)
+    # Outra sessão que acabou de ver v1 concluído ainda consegue ler o resultado
+    assert jobs.status(v1)["status"] == CONCLUIDO and jobs.resultado(v1) == 10
+
+    liberar.set()
+    assert jobs.aguardar(v2, timeout=5)["status"] == CONCLUIDO
+    assert _chaves(jobs) == {v2} and jobs.status(v1) is None
+    with pytest.raises(KeyError):
+        jobs.resultado(v1)
+
+
+def test_jobs_de_outro_processo_vivo_nao_sao_interrompidos(tmp_path):
+    caminho = str(tmp_path / "jobs.db")
+    liberar = threading.Event()
+    dono = JobManager(caminho, intervalo_batimento=0.05)
+    dono.registrar("lento", lambda valor, progresso: liberar.wait(5) and valor)
+    chave = dono.submeter("lento", valor=1)
+    assert dono.aguardar(chave, timeout=0.2)["status"] == EXECUTANDO
+    time.sleep(0.2)
+    with dono.pool.leitura() as conn:
+        criado_em, batimento = conn.execute("SELECT criado_em, batimento FROM jobs WHERE chave = ?;",
+                                            (chave,)).fetchone()
+    assert batimento > criado_em
+
+    # Um segundo JobManager (ex.: outro processo) não mexe no job nem o executa de novo
+    execucoes = []
+    outro = JobManager(caminho)
+    outro.registrar("lento", lambda valor, progresso: execucoes.append(valor) or valor)
+    assert outro.status(chave)["status"] == EXECUTANDO
+    assert outro.submeter("lento", valor=1) == chave
+    liberar.set()
+    assert outro.aguardar(chave, timeout=5)["status"] == CONCLUIDO
+    assert outro.resultado(chave) == 1 and execucoes == []
+
+
+def test_jobs_abandonados_sao_interrompidos_e_executados_de_novo(tmp_path):
+    caminho = str(tmp_path / "jobs.db")
+    jobs = JobManager(caminho)
+    jobs.registrar("eco", lambda valor, progresso: valor)
+    abandonado = chave_job("eco", {"valor": 1})
+    with jobs.pool.escrita() as conn:
+        conn.execute("""
+            INSERT INTO jobs (chave, tipo, parametros, status, criado_em, dono, batimento)
+            VALUES (?, 'eco', '{"valor": 1}', ?, ?, 'processo-encerrado', ?);
+        """, (abandonado, EXECUTANDO, time.time() - 3600, time.time() - 3600))
+
+    # Ao submeter de novo, o job sem sinal de vida é executado por este JobManager
+    assert jobs.submeter("eco", valor=1) == abandonado
+    assert jobs.aguardar(abandonado, timeout=5)["status"] == CONCLUIDO and jobs.resultado(abandonado) == 1
+
+    # Ao abrir o jobs.db, os abandonados passam a erro
+    with jobs.pool.escrita() as conn:
+        conn.execute("UPDATE jobs SET status = ?, dono = 'processo-encerrado', batimento = 0;", (PENDENTE,))
+    assert JobManager(caminho).status(abandonado)["erro"] == "Interrompido"
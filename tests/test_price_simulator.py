@@ -0,0 +1,25 @@
+import pandas as pd
+
+from price_simulator import PriceSimulator, obter_simulador
+from pricing_engine import PricingEngine, sincronizar
+
+
+def test_simulador_acompanha_alteracoes_nas_vendas(db):
+    engine = sincronizar(PricingEngine(["Product_line"]), db)
+    antes = obter_simulador(engine)
+    assert obter_simulador(engine) is antes
+
+    with db.pool.escrita() as conn:
+        conn.execute("UPDATE supermarket_sales SET Unit_price = Unit_price * 3;")
+    depois = obter_simulador(sincronizar(engine, db))
+
+    assert depois is not antes
+    novo = PriceSimulator(sincronizar(PricingEngine(["Product_line"]), db))
+    pd.testing.assert_frame_equal(depois.simular(10), novo.simular(10))
+
+
+def test_simulador_sem_vendas(db):
+    with db.pool.escrita() as conn:
+        conn.execute("DELETE FROM supermarket_sales;")
+    simulador = obter_simulador(sincronizar(PricingEngine(["Product_line"]), db))
+    assert simulador.segmentos == [] and simulador.simular(5).empty
@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from database_manager import COLUNAS_VENDAS
+from pricing_engine import PricingEngine, sincronizar
+
+CHAVES = ["Product_line", "City"]
+
+
+def _motor_novo(db, chaves=CHAVES):
+    return sincronizar(PricingEngine(chaves), db).melhores_precos()
+
+
+def _inserir_copias(db, quantidade=20):
+    vendas = db.read_frame(COLUNAS_VENDAS).tail(quantidade)
+    vendas["Invoice_ID"] = [f"TESTE-{i}" for i in range(len(vendas))]
+    db.insert_many(vendas.itertuples(index=False, name=None))
+
+
+@pytest.mark.parametrize("chaves", [CHAVES, ["Product_line", "Month"]])
+def test_sincronizar_apos_insercoes_igual_motor_novo(db, chaves):
+    engine = sincronizar(PricingEngine(chaves), db)
+    revisao = engine.revisao
+    _inserir_copias(db)
+    pd.testing.assert_frame_equal(sincronizar(engine, db).melhores_precos(), _motor_novo(db, chaves))
+    assert engine.revisao == revisao + 1
+
+
+def test_sincronizar_apos_update_igual_motor_novo(db):
+    engine = sincronizar(PricingEngine(CHAVES), db)
+    antes = engine.melhores_precos()
+    with db.pool.escrita() as conn:
+        conn.execute("UPDATE supermarket_sales SET Unit_price = Unit_price * 3;")
+
+    depois = sincronizar(engine, db).melhores_precos()
+    pd.testing.assert_frame_equal(depois, _motor_novo(db))
+    assert not depois["Melhor Preço"].equals(antes["Melhor Preço"])
+
+
+def test_sincronizar_apos_delete_igual_motor_novo(db):
+    engine = sincronizar(PricingEngine(CHAVES), db)
+    with db.pool.escrita() as conn:
+        conn.execute("DELETE FROM supermarket_sales WHERE City = 'Yangon';")
+
+    depois = sincronizar(engine, db).melhores_precos()
+    pd.testing.assert_frame_equal(depois, _motor_novo(db))
+    assert "Yangon" not in set(depois["Cidade"])
+
+
+def test_sincronizar_insercao_depois_de_update_refaz_o_motor(db):
+    # Inserções e uma alteração entre duas sincronizações: o append sozinho perderia a alteração
+    engine = sincronizar(PricingEngine(CHAVES), db)
+    _inserir_copias(db, 5)
+    with db.pool.escrita() as conn:
+        conn.execute("UPDATE supermarket_sales SET Unit_price = Unit_price * 3 WHERE City = 'Mandalay';")
+    pd.testing.assert_frame_equal(sincronizar(engine, db).melhores_precos(), _motor_novo(db))
+
+
+def test_sincronizar_tabela_vazia(db):
+    engine = sincronizar(PricingEngine(CHAVES), db)
+    with db.pool.escrita() as conn:
+        conn.execute("DELETE FROM supermarket_sales;")
+    assert sincronizar(engine, db).melhores_precos().empty
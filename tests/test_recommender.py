@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommender import COLUNAS_RECOMENDADOR, minerar_regras, minerar_regras_pares
+
+CHAVE_REGRA = ["antecedente", "consequente"]
+METRICAS = ["antecedent_support", "consequent_support", "support", "confidence", "lift", "leverage",
+            "conviction"]
+
+
+def _ordenar(regras, colunas):
+    return regras.sort_values(colunas + CHAVE_REGRA).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("colunas", [["Branch"], ["Gender", "Customer_type"],
+                                     ["Branch", "Gender", "Customer_type"]])
+def test_pares_igual_apriori(db, colunas):
+    vendas = db.read_frame(COLUNAS_RECOMENDADOR)
+    apriori, segmentos_apriori = minerar_regras(vendas, colunas)
+    pares, segmentos_pares = minerar_regras_pares(vendas, colunas, tamanho_bloco=50)
+
+    assert segmentos_pares == segmentos_apriori
+    assert len(apriori) > 0
+    apriori, pares = _ordenar(apriori, colunas), _ordenar(pares, colunas)
+    pd.testing.assert_frame_equal(pares[colunas + CHAVE_REGRA], apriori[colunas + CHAVE_REGRA],
+                                  check_dtype=False)
+    for metrica in METRICAS:
+        np.testing.assert_allclose(pares[metrica].to_numpy(float), apriori[metrica].to_numpy(float),
+                                   rtol=1e-9, err_msg=metrica)
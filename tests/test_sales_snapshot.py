@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+
+import sales_snapshot
+from database_manager import COLUNAS_VENDAS
+from sales_snapshot import COLUNAS_SNAPSHOT, SalesSnapshot
+from synthetic_data import gerar_vendas
+
+
+@pytest.fixture
+def snapshot(db, tmp_path):
+    return SalesSnapshot(db, str(tmp_path / "snapshot"))
+
+
+def _confere_com_o_banco(snapshot):
+    # O snapshot tem de ser igual a SELECT * FROM supermarket_sales (na ordem do rowid)
+    esperado = snapshot.db.read_frame(COLUNAS_SNAPSHOT, ordenar_por=["rowid"])
+    pd.testing.assert_frame_equal(snapshot.ler(COLUNAS_SNAPSHOT, ordenar_por=["rowid"]), esperado)
+    with snapshot.db.pool.leitura() as conn:
+        todas = pd.read_sql_query("SELECT * FROM supermarket_sales ORDER BY rowid;", conn)
+    pd.testing.assert_frame_equal(snapshot.ler(ordenar_por=["rowid"]), todas[COLUNAS_VENDAS])
+
+
+def _geracoes(snapshot):
+    return sorted(nome for nome in os.listdir(snapshot.diretorio) if nome.startswith("geracao-"))
+
+
+def _inserir(db, n, primeiro_id):
+    db.insert_many(pd.concat(gerar_vendas(n, primeiro_id=primeiro_id)).itertuples(index=False, name=None))
+
+
+def test_insercoes_atualizam_so_as_linhas_novas(db, snapshot):
+    assert snapshot.atualizar()["modo"] == "completo"
+    _confere_com_o_banco(snapshot)
+    geracao = _geracoes(snapshot)
+
+    for rodada in range(3):
+        _inserir(db, 50, primeiro_id=10_000 + 100 * rodada)
+        resultado = snapshot.atualizar()
+        assert (resultado["modo"], resultado["linhas"]) == ("incremental", 50)
+        _confere_com_o_banco(snapshot)
+    assert snapshot.atualizar()["modo"] == "atual"
+    assert _geracoes(snapshot) == geracao
+    assert snapshot.estado()["linhas"] == 1150
+
+
+@pytest.mark.parametrize("alterar", [
+    lambda db: db.update_data("750-67-8428", Quantity=1),
+    lambda db: db.delete_data("750-67-8428"),
+    lambda db: db.insert_many(db.read_frame(limite=3).assign(Quantity=1).itertuples(index=False, name=None),
+                              conflito="replace"),
+    # Uma inserção e uma exclusão: o número de linhas não muda, mas a versão avança 2
+    lambda db: (_inserir(db, 1, primeiro_id=10_000), db.delete_data("750-67-8428")),
+])
+def test_alteracoes_geram_nova_geracao_completa(db, snapshot, alterar):
+    snapshot.atualizar()
+    anterior = _geracoes(snapshot)
+    alterar(db)
+    assert snapshot.atualizar()["modo"] == "completo"
+    _confere_com_o_banco(snapshot)
+    assert len(_geracoes(snapshot)) == 1 and _geracoes(snapshot) != anterior
+
+
+def test_muitos_arquivos_sao_consolidados(db, snapshot, monkeypatch):
+    snapshot.atualizar()
+    _inserir(db, 10, primeiro_id=10_000)
+    assert snapshot.atualizar()["modo"] == "incremental"
+    monkeypatch.setattr(sales_snapshot, "MAX_ARQUIVOS", len(snapshot.estado()["arquivos"]))
+    _inserir(db, 10, primeiro_id=20_000)
+    assert snapshot.atualizar()["modo"] == "completo"
+    _confere_com_o_banco(snapshot)
+
+
+def test_gravacao_interrompida_e_recuperada(db, snapshot, monkeypatch):
+    snapshot.atualizar()
+
+    # Falha depois de escrever os arquivos novos e antes do _estado.json: os leitores continuam
+    # vendo o estado anterior e a próxima atualização reescreve as mesmas linhas
+    def falhar(estado):
+        raise OSError("disco cheio")
+
+    _inserir(db, 20, primeiro_id=10_000)
+    monkeypatch.setattr(snapshot, "_gravar_estado", falhar)
+    with pytest.raises(OSError):
+        snapshot.atualizar()
+    assert len(snapshot.ler(["rowid"])) == 1000
+    monkeypatch.undo()
+    assert snapshot.atualizar()["modo"] == "incremental"
+    _confere_com_o_banco(snapshot)
+
+    # Sem o _estado.json (ex.: o processo morreu na primeira gravação) tudo é refeito do zero
+    os.remove(os.path.join(snapshot.diretorio, "_estado.json"))
+    assert snapshot.estado() is None and len(snapshot.ler(["rowid"])) == 0
+    assert snapshot.atualizar()["modo"] == "completo"
+    _confere_com_o_banco(snapshot)
+    assert len(_geracoes(snapshot)) == 1
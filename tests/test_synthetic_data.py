@@ -0,0 +1,22 @@
+import pandas as pd
+
+from database_manager import DatabaseManager
+from synthetic_data import criar_banco, gerar_vendas
+
+
+def test_mesma_seed_gera_as_mesmas_vendas():
+    primeira = pd.concat(gerar_vendas(500, seed=3, tamanho_parte=200), ignore_index=True)
+    segunda = pd.concat(gerar_vendas(500, seed=3, tamanho_parte=200), ignore_index=True)
+    pd.testing.assert_frame_equal(primeira, segunda)
+    assert primeira["Invoice_ID"].is_unique
+
+
+def test_completar_banco_nao_repete_invoice_id(tmp_path):
+    caminho = str(tmp_path / "sintetico.db")
+    assert criar_banco(caminho, 300, seed=1, tamanho_parte=100)["inseridas"] == 300
+    assert criar_banco(caminho, 300, seed=1, tamanho_parte=100)["inseridas"] == 300
+
+    vendas = DatabaseManager(caminho).read_frame(["Invoice_ID", "Unit_price"])
+    assert len(vendas) == 600 and vendas["Invoice_ID"].is_unique
+    assert not vendas["Unit_price"].iloc[:300].reset_index(drop=True).equals(
+        vendas["Unit_price"].iloc[300:].reset_index(drop=True))